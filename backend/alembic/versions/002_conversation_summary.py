@@ -0,0 +1,32 @@
+"""Add rolling summary columns to conversations
+
+Revision ID: 002_conversation_summary
+Revises: 001_initial
+Create Date: 2026-10-19 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '002_conversation_summary'
+down_revision: Union[str, None] = '001_initial'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app adds these columns itself at startup when Alembic isn't run
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('conversations')}
+    if 'summary' not in existing:
+        op.add_column('conversations', sa.Column('summary', sa.Text(), nullable=True))
+    if 'summarized_count' not in existing:
+        op.add_column('conversations', sa.Column('summarized_count', sa.Integer(), nullable=True, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('conversations', 'summarized_count')
+    op.drop_column('conversations', 'summary')
@@ -0,0 +1,30 @@
+"""Index messages by conversation and timestamp
+
+Revision ID: 003_messages_conversation_index
+Revises: 002_conversation_summary
+Create Date: 2026-10-19 11:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '003_messages_conversation_index'
+down_revision: Union[str, None] = '002_conversation_summary'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The app creates this index itself at startup when Alembic isn't run
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('messages')}
+    if 'ix_messages_conversation_timestamp' in existing:
+        return
+    op.create_index('ix_messages_conversation_timestamp', 'messages', ['conversation_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_conversation_timestamp', table_name='messages')
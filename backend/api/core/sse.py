@@ -0,0 +1,17 @@
+"""
+Server-Sent Events helpers for streaming endpoints.
+"""
+import json
+from typing import Any, Optional
+
+# Stop proxies (nginx, Render) from buffering the stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(data: Any, event: Optional[str] = None) -> str:
+    """Encode one SSE frame; data is sent as a single line of JSON"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,49 @@
+"""
+Per-stage timing for request pipelines, exported as a Server-Timing header
+and as Prometheus metrics.
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """
+    Records how long each named stage of one request takes.
+
+    Args:
+        histogram: Prometheus histogram with a 'stage' label (optional)
+    """
+
+    def __init__(self, histogram=None):
+        self.histogram = histogram
+        self.durations: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.durations[name] = duration
+            if self.histogram is not None:
+                self.histogram.labels(stage=name).observe(duration)
+
+    async def run(self, name: str, awaitable: Awaitable, timeout: Optional[float] = None,
+                  default: Any = None) -> Any:
+        """Await a stage; if it exceeds timeout, log it and return default instead"""
+        with self.stage(name):
+            try:
+                return await asyncio.wait_for(awaitable, timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Stage '{name}' timed out after {timeout}s, continuing without it")
+                return default
+
+    def header(self) -> str:
+        """Server-Timing header value, e.g. 'retrieval;dur=41.2, llm;dur=880.0'"""
+        return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in self.durations.items())
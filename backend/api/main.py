@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
@@ -13,6 +14,9 @@ from .models.loader import ModelLoader
 from .routers import predict_router, health_router
 from .routers import predict, health
 from .routers.metrics import router as metrics_router
+from .services.llm_clients import aclose_llm_clients
+from .services.sunbird import sunbird_service
+from .services.voice_service import get_voice_service
 from .models import database, user, chat, food
 
 # Create database tables
@@ -21,6 +25,9 @@ try:
     user.Base.metadata.create_all(bind=database.engine)
     chat.Base.metadata.create_all(bind=database.engine)
     food.Base.metadata.create_all(bind=database.engine)
+    # Columns and indexes added to existing tables since they were created (when Alembic isn't run)
+    database.add_missing_columns(database.engine, database.Base.metadata)
+    database.create_missing_indexes(database.engine, database.Base.metadata)
     logger = logging.getLogger(__name__)
     logger.info("Database tables created successfully")
 except Exception as e:
@@ -35,6 +42,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _warm_up_speech_to_text():
+    """Load the local Whisper model in the background when it is enabled"""
+    try:
+        await get_voice_service().warm_up()
+    except Exception as e:
+        logger.warning(f"Speech-to-text warm-up skipped: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
@@ -42,9 +57,14 @@ async def lifespan(app: FastAPI):
     logger.info("Documentation: http://localhost:8000/docs")
     logger.info("Health Check: http://localhost:8000/health")
     logger.info("Prediction: http://localhost:8000/predict")
+    await sunbird_service.start()
+    stt_warm_up = asyncio.create_task(_warm_up_speech_to_text())
     yield
     # Shutdown
     logger.info("MzeeChakula API shutting down...")
+    stt_warm_up.cancel()
+    await aclose_llm_clients()
+    await sunbird_service.aclose()
 
 # Creating FastAPI app
 app = FastAPI(
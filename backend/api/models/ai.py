@@ -33,10 +33,28 @@ class RAGResponse(BaseModel):
     answer: str
     sources: List[Dict]
 
+class AudioPreprocessingStats(BaseModel):
+    applied: bool  # False when the upload was sent unchanged
+    bytes_in: int
+    bytes_out: int
+    duration_in: Optional[float] = None  # seconds
+    duration_out: Optional[float] = None
+    trimmed_seconds: float = 0.0
+    codec: Optional[str] = None
+
+class TranscriptSegment(BaseModel):
+    start: float  # seconds
+    end: float
+    text: str
+
 class VoiceTranscriptionResponse(BaseModel):
     text: str
     language: Optional[str] = None
     duration: Optional[float] = None
+    backend: Optional[str] = None  # Speech-to-text backend that produced the text
+    segments: Optional[List[TranscriptSegment]] = None
+    chunks: Optional[int] = None  # Set when long audio was transcribed in chunks
+    preprocessing: Optional[AudioPreprocessingStats] = None
 
 class VoiceQueryRequest(BaseModel):
     translate_to: Optional[str] = None  # Optional: translate transcribed text
@@ -48,3 +66,4 @@ class VoiceQueryResponse(BaseModel):
     detected_language_name: Optional[str] = None
     translated_text: Optional[str] = None
     translation_target: Optional[str] = None
+    preprocessing: Optional[AudioPreprocessingStats] = None
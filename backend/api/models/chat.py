@@ -1,7 +1,7 @@
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
-from sqlalchemy import Column, ForeignKey, Integer, String, Text, DateTime
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Text, DateTime
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -16,7 +16,7 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     """Chat request schema"""
     message: str = Field(..., description="User message")
-    history: List[ChatMessage] = Field(default=[], description="Conversation history")
+    history: List[ChatMessage] = Field(default=[], description="Conversation history (only used when the conversation has no stored messages)")
     conversation_id: Optional[str] = Field(None, description="Conversation ID")
     language: Optional[str] = Field("en", description="Preferred language code (en, lg, sw)")
     profile: Optional[dict] = Field(None, description="User profile data for context")
@@ -27,6 +27,15 @@ class ChatResponse(BaseModel):
     conversation_id: str = Field(..., description="Conversation ID")
     timestamp: str = Field(..., description="Response timestamp")
 
+class StoredMessage(ChatMessage):
+    """Persisted chat message"""
+    id: int = Field(..., description="Message ID")
+
+class MessagePage(BaseModel):
+    """Page of a conversation's messages, oldest first"""
+    messages: List[StoredMessage] = Field(..., description="Messages in chronological order")
+    next_before: Optional[int] = Field(None, description="Pass as `before` to fetch older messages (null when there are none)")
+
 # --- SQLAlchemy Models ---
 
 class ConversationDB(Base):
@@ -36,12 +45,19 @@ class ConversationDB(Base):
     title = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
+    # Rolling summary of older turns and how many history messages it covers
+    summary = Column(Text, nullable=True)
+    summarized_count = Column(Integer, default=0)
 
     owner = relationship("UserDB", back_populates="conversations")
     messages = relationship("MessageDB", back_populates="conversation")
 
 class MessageDB(Base):
     __tablename__ = "messages"
+    # History is always read per conversation in timestamp order
+    __table_args__ = (
+        Index("ix_messages_conversation_timestamp", "conversation_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(String, ForeignKey("conversations.id"))
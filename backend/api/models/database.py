@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, literal, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -36,6 +36,57 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def add_missing_columns(engine, metadata) -> list:
+    """
+    Add model columns missing from tables that already exist.
+
+    create_all() only creates whole tables, so databases created before a
+    column was added to a model (without running `alembic upgrade head`)
+    would fail every query on that table. Columns are added as nullable,
+    with their scalar default as server default so existing rows get it.
+
+    Returns:
+        The "table.column" names added
+    """
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = (f"ALTER TABLE {preparer.format_table(table)} "
+                       f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}")
+                if column.default is not None and column.default.is_scalar:
+                    value = literal(column.default.arg, column.type)
+                    ddl += f" DEFAULT {value.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})}"
+                connection.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Added missing database columns: {', '.join(added)}")
+    return added
+
+def create_missing_indexes(engine, metadata) -> list:
+    """Create model indexes missing from tables that already exist (create_all skips them)"""
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=connection, checkfirst=True)
+                    added.append(index.name)
+    if added:
+        logger.info(f"Created missing database indexes: {', '.join(added)}")
+    return added
+
 def get_db():
     db = SessionLocal()
     try:
@@ -1,7 +1,7 @@
 import pickle
 import logging
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import pandas as pd
 import numpy as np
 
@@ -383,6 +383,61 @@ class ModelLoader:
             self.models['huggingface'] = {'available': False}
             self.models['ensemble'] = {'available': False}
     
+    def _select_model(self, model_preference: str):
+        """(model key, None), or (None, error response) when no suitable model is loaded"""
+        if model_preference == 'auto':
+            # Priority: HuggingFace > Local XGBoost > Offline
+            for model_key in ('huggingface', 'local_xgboost', 'offline'):
+                if self.models.get(model_key, {}).get('available'):
+                    return model_key, None
+            return None, {
+                'success': False,
+                'error': 'No models available',
+                'status': 'error'
+            }
+
+        if not self.models.get(model_preference, {}).get('available'):
+            return None, {
+                'success': False,
+                'error': f'Model {model_preference} not available',
+                'status': 'error'
+            }
+        return model_preference, None
+
+    def predict_batch(
+        self,
+        inputs: List[Dict],
+        model_preference: str = 'auto'
+    ) -> Dict:
+        """
+        Predict caloric needs for many inputs with a single model call.
+
+        Returns:
+            {'success', 'predictions': [kcal/day per input], 'model', 'status'}
+        """
+        model_key, error = self._select_model(model_preference)
+        if error:
+            return error
+
+        model_info = self.models[model_key]
+        try:
+            df = pd.DataFrame(inputs)[self.feature_names]
+            predictions = np.asarray(model_info['model'].predict(df), dtype=float)
+            status = {'huggingface': 'online', 'local_xgboost': 'local'}.get(model_key, 'offline')
+            return {
+                'success': True,
+                'predictions': predictions.tolist(),
+                'model': f"{model_info['type']} ({status.upper()})",
+                'status': status
+            }
+        except Exception as e:
+            logger.error(f"Batch prediction failed with {model_key}: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'status': 'error'
+            }
+
     def predict(
         self,
         input_data: Dict,
@@ -391,29 +446,9 @@ class ModelLoader:
         """
         Make prediction with specified model preference.
         """
-        # Determine which model to use
-        if model_preference == 'auto':
-            # Priority: HuggingFace > Local XGBoost > Offline
-            if self.models.get('huggingface', {}).get('available'):
-                model_key = 'huggingface'
-            elif self.models.get('local_xgboost', {}).get('available'):
-                model_key = 'local_xgboost'
-            elif self.models.get('offline', {}).get('available'):
-                model_key = 'offline'
-            else:
-                return {
-                    'success': False,
-                    'error': 'No models available',
-                    'status': 'error'
-                }
-        else:
-            model_key = model_preference
-            if not self.models.get(model_key, {}).get('available'):
-                return {
-                    'success': False,
-                    'error': f'Model {model_key} not available',
-                    'status': 'error'
-                }
+        model_key, error = self._select_model(model_preference)
+        if error:
+            return error
         
         # Get model
         model_info = self.models[model_key]
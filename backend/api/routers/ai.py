@@ -1,11 +1,13 @@
-from fastapi import APIRouter, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from api.models.ai import (
     TranslateRequest, TranslateResponse,
     LanguageDetectRequest, LanguageDetectResponse,
     RAGQuery, RAGResponse
 )
 from api.services.sunbird import sunbird_service
-from api.services.rag_service import get_rag_service
+from api.services.rag_service import get_rag_service, user_namespace, can_upload_shared, SHARED_NAMESPACE
+from api.models.user import UserDB
+from api.core.deps import get_current_user
 import PyPDF2
 from io import BytesIO
 import docx
@@ -80,9 +82,13 @@ async def translate_text(request: TranslateRequest):
         )
 
 @router.post("/rag", response_model=RAGResponse)
-async def rag_query(query: RAGQuery):
+async def rag_query(
+    query: RAGQuery,
+    current_user: UserDB = Depends(get_current_user)
+):
     """
     Answer a query using RAG with ChromaDB and Tavily search.
+    Searches the caller's own uploads and the shared curated documents.
     """
     try:
         # Get service instance
@@ -91,7 +97,8 @@ async def rag_query(query: RAGQuery):
         result = await rag_service.answer_query(
             query=query.query,
             chat_history=query.chat_history,
-            use_search=query.use_search
+            use_search=query.use_search,
+            namespaces=[user_namespace(current_user.id), SHARED_NAMESPACE]
         )
 
         return RAGResponse(
@@ -106,11 +113,25 @@ async def rag_query(query: RAGQuery):
         )
 
 @router.post("/rag/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(
+    file: UploadFile = File(...),
+    shared: bool = Form(False),
+    current_user: UserDB = Depends(get_current_user)
+):
     """
     Upload a document (PDF, DOCX, TXT) for RAG processing.
-    The document will be processed and added to the knowledge base.
+    The document will be processed and added to the uploader's own
+    knowledge-base partition, which only their chats search.
+
+    With shared=true it is added to the shared curated documents every
+    user searches instead; only users listed in RAG_SHARED_UPLOADERS may.
     """
+    if shared and not can_upload_shared(current_user.email):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed to upload shared documents"
+        )
+
     try:
         # Validate file type
         allowed_extensions = {'.pdf', '.docx', '.doc', '.txt'}
@@ -187,13 +208,19 @@ async def upload_document(file: UploadFile = File(...)):
         # Create metadata for each chunk
         metadata = [{"source": file.filename, "chunk_index": i} for i in range(len(chunks))]
 
-        # Add to vector store (synchronous operation)
-        rag_service.add_documents(texts=chunks, metadatas=metadata)
+        # Add to vector store (runs off the event loop); duplicate chunks are skipped
+        added = await rag_service.aadd_documents(
+            texts=chunks,
+            metadatas=metadata,
+            namespace=SHARED_NAMESPACE if shared else user_namespace(current_user.id)
+        )
 
         return {
             "message": "Document uploaded and processed successfully",
             "filename": file.filename,
-            "chunks_added": len(chunks),
+            "shared": shared,
+            "chunks_added": added["added"],
+            "duplicates_skipped": added["duplicates"] + added["near_duplicates"],
             "text_length": len(text_content)
         }
 
@@ -13,6 +13,7 @@ from api.models.food import (
 from api.models.database import get_db
 from api.models.user import UserDB
 from api.core.deps import get_current_user
+from api.services.food_catalog import get_food_catalog
 
 router = APIRouter(
     prefix="/foods",
@@ -36,6 +37,7 @@ async def create_food(
     db.add(db_food)
     db.commit()
     db.refresh(db_food)
+    get_food_catalog().invalidate()
     return db_food
 
 
@@ -69,6 +71,7 @@ async def bulk_import_foods(
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Bulk import failed: {str(e)}")
+    get_food_catalog().invalidate()
 
     return {
         "success": True,
@@ -140,6 +143,7 @@ async def import_from_csv(
                 errors.append(f"Row error: {str(e)}")
 
         db.commit()
+        get_food_catalog().invalidate()
 
         return {
             "success": True,
@@ -164,26 +168,10 @@ async def search_foods(
     db: Session = Depends(get_db),
     current_user: UserDB = Depends(get_current_user)
 ):
-    """Search foods in database"""
-    query_obj = db.query(FoodDB)
-
-    if query:
-        query_obj = query_obj.filter(
-            (FoodDB.name.ilike(f"%{query}%")) |
-            (FoodDB.local_name.ilike(f"%{query}%"))
-        )
-
-    if category:
-        query_obj = query_obj.filter(FoodDB.category == category)
-
-    if diabetic_friendly is not None:
-        query_obj = query_obj.filter(FoodDB.is_diabetic_friendly == diabetic_friendly)
-
-    if hypertension_friendly is not None:
-        query_obj = query_obj.filter(FoodDB.is_hypertension_friendly == hypertension_friendly)
-
-    results = query_obj.limit(limit).all()
-    return results
+    """Search foods (served from the in-memory food catalog)"""
+    catalog = get_food_catalog().snapshot(db)
+    matches = catalog.filter(query, category, diabetic_friendly, hypertension_friendly)
+    return catalog.rows(matches[:limit])
 
 
 @router.get("/categories")
@@ -192,8 +180,7 @@ async def get_categories(
     current_user: UserDB = Depends(get_current_user)
 ):
     """Get all food categories"""
-    categories = db.query(FoodDB.category).distinct().all()
-    return {"categories": [c[0] for c in categories]}
+    return {"categories": get_food_catalog().snapshot(db).categories()}
 
 
 @router.get("/{food_id}", response_model=Food)
@@ -222,6 +209,7 @@ async def delete_food(
 
     db.delete(food)
     db.commit()
+    get_food_catalog().invalidate()
     return {"success": True, "message": "Food deleted"}
 
 
@@ -1,10 +1,15 @@
 """
 Meal Plan Generation Router
 """
+import asyncio
+import io
+import json
+import re
+import zipfile
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from api.services.meal_plan_service import get_meal_plan_service
 from api.services.pdf_service import get_pdf_service
 from api.models.user import UserDB
@@ -41,6 +46,30 @@ class MealPlanResponse(BaseModel):
     tips: List[str]
     generated_at: str
     model_used: Optional[str] = None
+    plan_id: Optional[str] = Field(None, description="Id for downloading this plan as PDF")
+
+
+class BatchMealPlanRequest(BaseModel):
+    """Request for the meal plans of many residents (e.g. a care home)"""
+    residents: List[MealPlanRequest] = Field(..., min_length=1, max_length=250)
+    format: Literal["json", "zip"] = Field(
+        "json",
+        description="json: the plans; zip: one PDF per resident"
+    )
+
+
+class BatchMealPlanError(BaseModel):
+    index: int
+    name: str
+    error: str
+
+
+class BatchMealPlanResponse(BaseModel):
+    """Meal plans of a batch, in the order of the residents that succeeded"""
+    success: bool
+    total: int
+    plans: List[MealPlanResponse]
+    errors: List[BatchMealPlanError]
 
 
 @router.post("/generate", response_model=MealPlanResponse)
@@ -56,29 +85,16 @@ async def generate_meal_plan(
     2. Calculates caloric needs based on age and health conditions
     3. Recommends culturally appropriate Ugandan foods
     4. Generates a structured 7-day meal plan
+
+    Identical requests are served from a cache, and the returned plan_id
+    can be passed to GET /meal-plan/{plan_id}/pdf.
     """
     try:
-        service = get_meal_plan_service(model_loader)
-
-        result = service.generate_meal_plan(
-            age=request.age,
-            health_conditions=request.health_conditions,
-            preferred_foods=request.preferred_foods,
-            name=request.name
-        )
+        result = await _generate(request, current_user)
 
         if not result['success']:
             raise HTTPException(status_code=500, detail=result.get('error', 'Generation failed'))
 
-        # Add model info
-        models = model_loader.get_available_models()
-        if models.get('huggingface', {}).get('available'):
-            result['model_used'] = 'HuggingFace Ensemble (Online)'
-        elif models.get('local_xgboost', {}).get('available'):
-            result['model_used'] = 'XGBoost (Local)'
-        else:
-            result['model_used'] = 'Fallback Model'
-
         return result
 
     except HTTPException:
@@ -129,44 +145,132 @@ async def generate_meal_plan_pdf(
     3. Returns the PDF for download
     """
     try:
-        # Generate meal plan
-        service = get_meal_plan_service(model_loader)
-        result = service.generate_meal_plan(
-            age=request.age,
-            health_conditions=request.health_conditions,
-            preferred_foods=request.preferred_foods,
-            name=request.name
-        )
+        # Generate meal plan (cached when the same plan was just generated)
+        result = await _generate(request, current_user)
 
         if not result['success']:
             raise HTTPException(status_code=500, detail=result.get('error', 'Generation failed'))
 
-        # Add model info
-        models = model_loader.get_available_models()
-        if models.get('huggingface', {}).get('available'):
-            result['model_used'] = 'HuggingFace Ensemble (Online)'
-        elif models.get('local_xgboost', {}).get('available'):
-            result['model_used'] = 'XGBoost (Local)'
-        else:
-            result['model_used'] = 'Fallback Model'
+        return await _pdf_response(result)
 
-        # Generate PDF
-        pdf_service = get_pdf_service()
-        pdf_buffer = pdf_service.generate_meal_plan_pdf(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
+
+
+@router.post("/generate/batch", response_model=BatchMealPlanResponse)
+async def generate_meal_plans_batch(
+    request: BatchMealPlanRequest,
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Generate the 7-day meal plans of many residents in one request
 
-        # Create filename
-        filename = f"meal_plan_{request.name.replace(' ', '_')}_{result['generated_at'][:10]}.pdf"
+    Caloric needs are predicted for all residents in one model call and
+    every plan is made from the same food catalog; the plans are optimized
+    in parallel. Residents whose plan fails are listed in errors, the rest
+    are returned in order (each with a plan_id for its PDF).
 
-        # Return as streaming response
+    With format "zip", the response is a ZIP archive with one PDF per
+    resident and errors.json when some failed.
+    """
+    service = get_meal_plan_service(model_loader)
+    try:
+        results = await asyncio.to_thread(
+            service.generate_meal_plans,
+            [resident.model_dump() for resident in request.residents],
+            owner=current_user.id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate meal plans: {str(e)}")
+
+    plans = [result for result in results if result['success']]
+    errors = [
+        {'index': i, 'name': resident.name, 'error': result.get('error', 'Generation failed')}
+        for i, (resident, result) in enumerate(zip(request.residents, results))
+        if not result['success']
+    ]
+    if not plans:
+        raise HTTPException(status_code=500, detail=errors[0]['error'])
+
+    if request.format == "zip":
+        try:
+            archive = await asyncio.to_thread(_pdf_archive, results, errors)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
         return StreamingResponse(
-            pdf_buffer,
-            media_type="application/pdf",
+            archive,
+            media_type="application/zip",
             headers={
-                "Content-Disposition": f"attachment; filename={filename}"
+                "Content-Disposition": f"attachment; filename=meal_plans_{plans[0]['generated_at'][:10]}.zip"
             }
         )
 
-    except HTTPException:
-        raise
+    return {'success': True, 'total': len(results), 'plans': plans, 'errors': errors}
+
+
+@router.get("/{plan_id}/pdf")
+async def get_meal_plan_pdf(
+    plan_id: str,
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Download a plan returned by /meal-plan/generate as PDF, without
+    generating it again. Plans stay available for MEAL_PLAN_CACHE_TTL.
+    """
+    result = get_meal_plan_service(model_loader).get_plan(plan_id, owner=current_user.id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Meal plan not found or expired")
+
+    try:
+        return await _pdf_response(result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
+
+
+async def _generate(request: MealPlanRequest, current_user: UserDB) -> dict:
+    """Generate off the event loop, so identical concurrent requests can share one generation"""
+    service = get_meal_plan_service(model_loader)
+    return await asyncio.to_thread(
+        service.generate_meal_plan,
+        age=request.age,
+        health_conditions=request.health_conditions,
+        preferred_foods=request.preferred_foods,
+        name=request.name,
+        owner=current_user.id
+    )
+
+
+async def _pdf_response(result: dict) -> StreamingResponse:
+    # Generate PDF
+    pdf_service = get_pdf_service()
+    pdf_buffer = await asyncio.to_thread(pdf_service.generate_meal_plan_pdf, result)
+
+    # Create filename
+    filename = f"meal_plan_{result['patient_name'].replace(' ', '_')}_{result['generated_at'][:10]}.pdf"
+
+    # Return as streaming response
+    return StreamingResponse(
+        pdf_buffer,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
+
+
+def _pdf_archive(results: List[dict], errors: List[dict]) -> io.BytesIO:
+    """ZIP of the successful plans' PDFs, numbered in request order"""
+    indexed = [(i, result) for i, result in enumerate(results) if result['success']]
+    pdfs = get_pdf_service().generate_meal_plan_pdfs([result for _, result in indexed])
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for (i, result), pdf in zip(indexed, pdfs):
+            name = re.sub(r"[^\w.-]+", "_", result['patient_name']).strip("_") or "Patient"
+            archive.writestr(f"meal_plan_{i:03d}_{name}.pdf", pdf)
+        if errors:
+            archive.writestr("errors.json", json.dumps(errors, indent=2))
+    buffer.seek(0)
+    return buffer
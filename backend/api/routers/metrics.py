@@ -10,6 +10,66 @@ router = APIRouter(tags=["Metrics"])
 prediction_counter = Counter('predictions_total', 'Total number of predictions', ['model', 'status'])
 prediction_duration = Histogram('prediction_duration_seconds', 'Time spent processing prediction')
 model_accuracy = Gauge('model_accuracy', 'Model accuracy', ['model'])
+chat_time_to_first_token = Histogram(
+    'chat_time_to_first_token_seconds',
+    'Time from the start of a streamed chat reply to its first token',
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+)
+chat_stage_duration = Histogram(
+    'chat_stage_duration_seconds',
+    'Time spent in each stage of a chat request',
+    ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+stt_duration = Histogram(
+    'stt_duration_seconds',
+    'Speech-to-text processing time per request',
+    ['backend'],
+    buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 40.0)
+)
+stt_real_time_factor = Histogram(
+    'stt_real_time_factor',
+    'Speech-to-text processing time divided by audio duration',
+    ['backend'],
+    buckets=(0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0)
+)
+voice_audio_bytes = Counter(
+    'voice_audio_bytes_total',
+    'Voice upload bytes before (in) and after (out) preprocessing',
+    ['direction']
+)
+voice_trimmed_seconds = Histogram(
+    'voice_trimmed_seconds',
+    'Silence trimmed from each voice upload before transcription',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+)
+chat_prompt_tokens = Histogram(
+    'chat_prompt_tokens',
+    'Prompt tokens sent to the LLM per chat request',
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000)
+)
+translation_memory_lookups = Counter(
+    'translation_memory_lookups_total',
+    'Translation memory lookups (text = whole text, segments = assembled from lines/sentences)',
+    ['result']
+)
+language_detection_lookups = Counter(
+    'language_detection_lookups_total',
+    'Sunbird language detections by cache result',
+    ['result']
+)
+translation_segments = Counter(
+    'translation_segments_total',
+    'Response segments translated (ok, retried = succeeded after a retry, failed = left untranslated)',
+    ['result']
+)
+llm_cache_lookups = Counter('llm_cache_lookups_total', 'LLM response cache lookups', ['result'])
+llm_cache_tokens_saved = Counter('llm_cache_tokens_saved_total', 'Groq tokens not spent thanks to cached responses')
+meal_plan_cache_lookups = Counter(
+    'meal_plan_cache_lookups_total',
+    'Meal plan requests by cache result (shared = joined an identical plan in progress)',
+    ['result']
+)
 
 @router.get("/metrics")
 async def metrics():
@@ -1,15 +1,26 @@
 """
 Voice/Speech Recognition API endpoints
 """
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form
+import asyncio
+import json
+import logging
+from fastapi import APIRouter, HTTPException, Query, status, UploadFile, File, Form, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocketDisconnect
 from typing import Optional
+from api.core.sse import format_sse, SSE_HEADERS
 from api.models.ai import (
     VoiceTranscriptionResponse,
     VoiceQueryResponse,
     LanguageDetectResponse
 )
-from api.services.voice_service import get_voice_service
+from api.services.voice_service import get_voice_service, VOICE_MAX_UPLOAD_BYTES
+from api.services.stt_backends import TranscriptionBusyError
 from api.services.sunbird import sunbird_service
+from api.services.audio_processing import encode_wav
+from api.services.voice_stream import StreamingVAD
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/voice",
@@ -17,24 +28,48 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+async def _read_audio(audio: UploadFile) -> bytes:
+    """
+    Read an upload in chunks, refusing it (413) as soon as it exceeds
+    VOICE_MAX_UPLOAD_BYTES instead of loading an oversized file whole.
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Audio file exceeds {VOICE_MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    )
+    if audio.size is not None and audio.size > VOICE_MAX_UPLOAD_BYTES:
+        raise too_large
+
+    buffer = bytearray()
+    while chunk := await audio.read(UPLOAD_CHUNK_BYTES):
+        buffer.extend(chunk)
+        if len(buffer) > VOICE_MAX_UPLOAD_BYTES:
+            raise too_large
+    if not buffer:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Audio file is empty")
+    return bytes(buffer)
+
 
 @router.post("/transcribe", response_model=VoiceTranscriptionResponse)
 async def transcribe_audio(
     audio: UploadFile = File(..., description="Audio file (mp3, wav, m4a, ogg, webm, etc.)"),
     language: Optional[str] = Form(None, description="ISO-639-1 language code (e.g., 'en', 'lg', 'sw')"),
-    temperature: float = Form(0.0, description="Sampling temperature (0-1). Lower is more deterministic.")
+    temperature: float = Form(0.0, description="Sampling temperature (0-1). Lower is more deterministic."),
+    backend: Optional[str] = Form(None, description="Speech-to-text backend: 'groq', 'local' (offline) or 'auto'")
 ):
     """
-    Transcribe audio to text using Groq Whisper API.
+    Transcribe audio to text using Groq Whisper API or the local Whisper model.
 
     Supported audio formats: mp3, mp4, mpeg, mpga, m4a, wav, webm, ogg
 
     The endpoint automatically detects the language if not specified.
     """
-    try:
-        # Read audio file
-        audio_bytes = await audio.read()
+    audio_bytes = await _read_audio(audio)
 
+    try:
         # Get voice service
         voice_service = get_voice_service()
 
@@ -43,15 +78,25 @@ async def transcribe_audio(
             audio_file=audio_bytes,
             filename=audio.filename,
             language=language,
-            temperature=temperature
+            temperature=temperature,
+            backend=backend
         )
 
         return VoiceTranscriptionResponse(
             text=result["text"],
             language=result.get("language"),
-            duration=result.get("duration")
+            duration=result.get("duration"),
+            backend=result.get("backend"),
+            segments=result.get("segments"),
+            chunks=result.get("chunks"),
+            preprocessing=result.get("preprocessing")
         )
 
+    except TranscriptionBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -64,69 +109,153 @@ async def transcribe_audio(
         )
 
 
+@router.post("/transcribe/stream")
+async def transcribe_audio_stream(
+    audio: UploadFile = File(..., description="Audio file (mp3, wav, m4a, ogg, webm, etc.)"),
+    language: Optional[str] = Form(None, description="ISO-639-1 language code (e.g., 'en', 'lg', 'sw')"),
+    temperature: float = Form(0.0, description="Sampling temperature (0-1). Lower is more deterministic."),
+    backend: Optional[str] = Form(None, description="Speech-to-text backend: 'groq', 'local' (offline) or 'auto'")
+):
+    """
+    Transcribe audio and stream progress as Server-Sent Events.
+
+    Long recordings are split at pauses and the chunks transcribed in
+    parallel; each chunk's text is sent as soon as it is ready.
+
+    Events:
+    - `start`: `{"chunks", "duration"}` (long audio only)
+    - `partial`: `{"index", "start", "end", "text"}` per chunk, in completion order
+    - `done`: the same body as `/voice/transcribe`
+    - `error`: `{"detail"}`
+    """
+    audio_bytes = await _read_audio(audio)
+
+    events = get_voice_service().transcribe_stream(
+        audio_file=audio_bytes,
+        filename=audio.filename,
+        language=language,
+        temperature=temperature,
+        backend=backend
+    )
+    # Run up to the first event here, so invalid input still gets a 4xx status
+    try:
+        first = await events.__anext__()
+    except TranscriptionBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Transcription failed: {str(e)}"
+        )
+
+    async def event_stream():
+        event, data = first
+        try:
+            while True:
+                if event == "done":
+                    data = VoiceTranscriptionResponse(**data).model_dump()
+                yield format_sse(data, event=event)
+                event, data = await events.__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            logger.error(f"Transcription stream failed: {e}")
+            yield format_sse({"detail": f"Transcription failed: {str(e)}"}, event="error")
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.post("/transcribe-and-translate", response_model=VoiceQueryResponse)
 async def transcribe_and_translate(
     audio: UploadFile = File(..., description="Audio file"),
     translate_to: Optional[str] = Form(None, description="Target language code (e.g., 'eng', 'lug')"),
-    detect_language: bool = Form(True, description="Detect the source language")
+    detect_language: bool = Form(True, description="Detect the source language"),
+    language: Optional[str] = Form(None, description="Spoken language, ISO-639-1 (e.g., 'en', 'lg'); detected if omitted"),
+    backend: Optional[str] = Form(None, description="Speech-to-text backend: 'groq', 'local' (offline) or 'auto'")
 ):
     """
     Transcribe audio and optionally translate to target language.
 
     Workflow:
     1. Transcribe audio to text using Whisper
-    2. Detect language if requested
-    3. Translate to target language if specified
+    2. Detect the language with Sunbird AI, once: the result is reported and
+       used as the translation source. For long recordings detection starts
+       on the first transcribed chunk while the rest are still in progress.
+    3. Translate to target language if specified. When the spoken language
+       is given, translation runs alongside detection.
 
     Useful for multilingual applications where you want both transcription and translation.
     """
-    try:
-        # Read audio file
-        audio_bytes = await audio.read()
+    audio_bytes = await _read_audio(audio)
+    source_lang = sunbird_service.to_sunbird_code(language)
+    needs_detection = detect_language or (translate_to and not source_lang)
 
-        # Get services
+    detection = None
+    try:
         voice_service = get_voice_service()
 
-        # Transcribe
-        transcription_result = await voice_service.transcribe_audio(
-            audio_file=audio_bytes,
-            filename=audio.filename
-        )
+        transcription_result = None
+        async for event, data in voice_service.transcribe_stream(
+            audio_bytes, audio.filename, language=language, backend=backend
+        ):
+            if event == "partial" and needs_detection and detection is None and data["text"]:
+                detection = asyncio.create_task(sunbird_service.detect_language(data["text"]))
+            elif event == "done":
+                transcription_result = data
 
         transcribed_text = transcription_result["text"]
-        detected_language = transcription_result.get("language")
-
         response = VoiceQueryResponse(
             transcribed_text=transcribed_text,
-            detected_language=detected_language
+            detected_language=transcription_result.get("language"),
+            preprocessing=transcription_result.get("preprocessing")
         )
+        if not transcribed_text:
+            return response
+
+        if needs_detection and detection is None:
+            detection = asyncio.create_task(sunbird_service.detect_language(transcribed_text))
+
+        async def translate() -> str:
+            source = source_lang or (await detection)["language"]
+            if source == translate_to:
+                return transcribed_text
+            result = await sunbird_service.translate(
+                text=transcribed_text,
+                source_lang=source,
+                target_lang=translate_to
+            )
+            return result["translated_text"]
+
+        translation = asyncio.create_task(translate()) if translate_to else None
 
-        # Detect language if requested and not already detected
-        if detect_language and transcribed_text:
+        if detection is not None:
             try:
-                lang_result = await sunbird_service.detect_language(transcribed_text)
+                lang_result = await detection
                 response.detected_language = lang_result["language"]
                 response.detected_language_name = lang_result["language_name"]
-            except:
-                # If detection fails, use Whisper's detected language
-                pass
+            except Exception as e:
+                # Keep Whisper's detected language
+                logger.warning(f"Language detection failed: {e}")
 
-        # Translate if target language specified
-        if translate_to and transcribed_text:
+        if translation is not None:
             try:
-                translation_result = await sunbird_service.translate(
-                    text=transcribed_text,
-                    source_lang=detected_language,
-                    target_lang=translate_to
-                )
-                response.translated_text = translation_result["translated_text"]
+                response.translated_text = await translation
                 response.translation_target = translate_to
             except Exception as e:
                 # Log but don't fail the whole request
-                print(f"Translation failed: {e}")
+                logger.warning(f"Translation failed: {e}")
 
         return response
 
+    except TranscriptionBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -137,6 +266,167 @@ async def transcribe_and_translate(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Voice query failed: {str(e)}"
         )
+    finally:
+        if detection is not None and not detection.done():
+            detection.cancel()
+
+
+@router.websocket("/stream")
+async def voice_stream(
+    websocket: WebSocket,
+    sample_rate: int = Query(16000, ge=8000, le=48000, description="Sample rate of the PCM frames"),
+    language: Optional[str] = Query(None, description="ISO-639-1 language code; detected if omitted"),
+    backend: Optional[str] = Query(None, description="Speech-to-text backend: 'groq', 'local' or 'auto'"),
+    translate_to: Optional[str] = Query(None, description="Translate each utterance to this language (e.g. 'eng')"),
+    chat: bool = Query(False, description="Send each utterance to the chat assistant (needs token)"),
+    token: Optional[str] = Query(None, description="JWT access token, required when chat is true"),
+    conversation_id: Optional[str] = Query(None, description="Chat conversation to continue")
+):
+    """
+    Real-time transcription over WebSocket.
+
+    Send binary frames of 16-bit little-endian mono PCM at `sample_rate`,
+    and the text frame `{"type": "end"}` when done. The server cuts the
+    stream into utterances at pauses and replies with JSON messages:
+
+    - `{"type": "partial", "text"}`: the utterance in progress so far
+    - `{"type": "final", "index", "text", "language", "start", "end"}`: a finished utterance
+    - `{"type": "translation", "index", "text", "target"}`: when translate_to is set
+    - `{"type": "chat", "index", "response", "conversation_id"}`: when chat is true
+    - `{"type": "error", "detail"}`, and `{"type": "end"}` once everything sent is processed
+
+    Finished utterances are processed in order while the speaker keeps talking.
+    """
+    await websocket.accept()
+
+    user = None
+    if chat:
+        from api.core.deps import get_current_user
+        from api.models.database import SessionLocal
+
+        if not token:
+            await websocket.send_json({"type": "error", "detail": "Not authenticated"})
+            await websocket.close(code=1008)
+            return
+
+        db = SessionLocal()
+        try:
+            user = await get_current_user(token, db)
+        except Exception as e:
+            # Malformed tokens can fail inside jose with other errors than JWTError
+            if not isinstance(e, HTTPException):
+                logger.warning(f"WebSocket token validation failed: {e}")
+            await websocket.send_json({"type": "error", "detail": "Could not validate credentials"})
+            await websocket.close(code=1008)
+            return
+        finally:
+            db.close()
+
+    voice_service = get_voice_service()
+    vad = StreamingVAD(sample_rate=sample_rate)
+    utterances: asyncio.Queue = asyncio.Queue()
+    partial_task: Optional[asyncio.Task] = None
+
+    async def transcribe(samples) -> dict:
+        return await voice_service.transcribe_audio(
+            audio_file=encode_wav(samples),
+            filename="utterance.wav",
+            language=language,
+            backend=backend
+        )
+
+    async def send_partial(samples):
+        try:
+            result = await transcribe(samples)
+            if vad.in_speech:  # not superseded by the final transcript
+                await websocket.send_json({"type": "partial", "text": result["text"]})
+        except Exception as e:
+            logger.warning(f"Partial transcription failed: {e}")
+
+    async def chat_reply(text: str) -> dict:
+        from api.core.timing import StageTimer
+        from api.models.chat import ChatRequest
+        from api.models.database import SessionLocal
+        from api.routers.metrics import chat_stage_duration
+        from api.services.chat_service import run_chat_turn
+
+        nonlocal conversation_id
+        db = SessionLocal()
+        try:
+            reply = await run_chat_turn(
+                ChatRequest(message=text, conversation_id=conversation_id, language=translate_to or "eng"),
+                user,
+                db,
+                StageTimer(chat_stage_duration)
+            )
+        finally:
+            db.close()
+        conversation_id = reply.conversation_id
+        return {"response": reply.response, "conversation_id": conversation_id}
+
+    async def process_utterances():
+        # One at a time, so translations and chat turns stay in spoken order
+        index = 0
+        while (item := await utterances.get()) is not None:
+            samples, (start, end) = item
+            try:
+                result = await transcribe(samples)
+                text = result["text"].strip()
+                await websocket.send_json({"type": "final", "index": index, "text": text,
+                                           "language": result.get("language"), "start": start, "end": end})
+                if text and translate_to:
+                    translation = await sunbird_service.translate(text=text, target_lang=translate_to)
+                    await websocket.send_json({"type": "translation", "index": index,
+                                               "text": translation["translated_text"], "target": translate_to})
+                if text and chat:
+                    await websocket.send_json({"type": "chat", "index": index, **await chat_reply(text)})
+            except WebSocketDisconnect:
+                return
+            except Exception as e:
+                logger.warning(f"Streaming utterance {index} failed: {e}")
+                await websocket.send_json({"type": "error", "index": index, "detail": str(e)})
+            index += 1
+
+    worker = asyncio.create_task(process_utterances())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes"):
+                events = vad.feed(message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if control.get("type") != "end":
+                    await websocket.send_json({"type": "error", "detail": "Expected binary PCM frames or {\"type\": \"end\"}"})
+                    continue
+                last = vad.flush()
+                if last is not None:
+                    await utterances.put(last[1:])
+                await utterances.put(None)
+                await worker
+                await websocket.send_json({"type": "end"})
+                await websocket.close()
+                break
+            else:
+                continue
+
+            for kind, samples, span in events:
+                if kind == "final":
+                    await utterances.put((samples, span))
+                elif partial_task is None or partial_task.done():
+                    # Skip this partial if the previous one is still running
+                    partial_task = asyncio.create_task(send_partial(samples))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        worker.cancel()
+        if partial_task is not None:
+            partial_task.cancel()
 
 
 @router.get("/supported-formats")
@@ -147,5 +437,6 @@ async def get_supported_formats():
     voice_service = get_voice_service()
     return {
         "formats": list(voice_service.supported_formats),
-        "recommended": ["mp3", "wav", "m4a", "ogg"]
+        "recommended": ["mp3", "wav", "m4a", "ogg"],
+        "backends": voice_service.available_backends
     }
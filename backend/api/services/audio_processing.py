@@ -0,0 +1,327 @@
+"""
+Audio preprocessing before speech-to-text.
+
+Uploads are decoded, downmixed to mono, resampled to 16 kHz (what Whisper
+uses internally), trimmed of silence with a simple energy-based voice
+activity detector and re-encoded compactly. WAV is handled with the
+standard library; other containers (m4a, webm, ogg, mp3) need ffmpeg on
+the PATH, and are passed through unchanged without it.
+"""
+import io
+import logging
+import os
+import shutil
+import subprocess
+import wave
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VOICE_PREPROCESS = os.getenv("VOICE_PREPROCESS", "true").lower() == "true"
+# auto = Opus when ffmpeg is available, otherwise 16-bit PCM WAV
+VOICE_PREPROCESS_CODEC = os.getenv("VOICE_PREPROCESS_CODEC", "auto").lower()
+
+TARGET_RATE = 16000
+FRAME_SECONDS = 0.03
+# Silence kept at the edges and in place of long pauses, so words are not clipped
+SPEECH_PADDING_SECONDS = 0.2
+MAX_PAUSE_SECONDS = 0.6
+
+FFMPEG = shutil.which("ffmpeg")
+
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """PCM WAV -> (float32 samples shaped (frames, channels), sample rate)"""
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        bytes24 = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        ints = (bytes24[:, 0].astype(np.int32) | (bytes24[:, 1].astype(np.int32) << 8)
+                | (bytes24[:, 2].astype(np.int32) << 16))
+        samples = (np.where(ints >= 1 << 23, ints - (1 << 24), ints)).astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / (1 << 31)
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+    return samples.reshape(-1, channels), rate
+
+
+def decode_with_ffmpeg(data: bytes) -> Tuple[np.ndarray, int]:
+    """Any container ffmpeg reads -> mono 16 kHz float32 samples"""
+    result = subprocess.run(
+        [FFMPEG, "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(TARGET_RATE), "pipe:1"],
+        input=data, capture_output=True, check=True
+    )
+    samples = np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768
+    return samples.reshape(-1, 1), TARGET_RATE
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int = TARGET_RATE) -> np.ndarray:
+    if rate == target_rate:
+        return samples
+    from math import gcd
+    from scipy.signal import resample_poly
+
+    divisor = gcd(rate, target_rate)
+    return resample_poly(samples, target_rate // divisor, rate // divisor).astype(np.float32)
+
+
+def speech_frames(samples: np.ndarray, rate: int = TARGET_RATE) -> np.ndarray:
+    """
+    Boolean mask of FRAME_SECONDS frames that contain speech. A frame is
+    speech when its energy is well above the recording's noise floor
+    (estimated from its quietest frames), so the threshold adapts to
+    background noise.
+    """
+    frame = int(rate * FRAME_SECONDS)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=bool)
+
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    noise_floor = np.percentile(energy_db, 10)
+    peak = np.percentile(energy_db, 99)
+    threshold = max(noise_floor + 0.25 * (peak - noise_floor), noise_floor + 6, -55)
+    return energy_db > threshold
+
+
+def speech_mask(samples: np.ndarray, rate: int = TARGET_RATE) -> Optional[np.ndarray]:
+    """
+    Per-sample mask of what trim_silence keeps: speech with padding, and
+    pauses shortened to MAX_PAUSE_SECONDS. None when no speech is found.
+    """
+    speech = speech_frames(samples, rate)
+    if not speech.any():
+        return None
+
+    # Keep padding around speech so word onsets and endings survive
+    pad = int(SPEECH_PADDING_SECONDS / FRAME_SECONDS)
+    keep = np.convolve(speech.astype(int), np.ones(2 * pad + 1, dtype=int), mode="same") > 0
+
+    # Pauses that remain longer than MAX_PAUSE_SECONDS are cut down to it
+    max_pause = int(MAX_PAUSE_SECONDS / FRAME_SECONDS)
+    kept = np.flatnonzero(keep)
+    gap = 0
+    for i in range(kept[0], kept[-1] + 1):
+        if keep[i]:
+            gap = 0
+        else:
+            gap += 1
+            keep[i] = gap <= max_pause
+    frame = int(rate * FRAME_SECONDS)
+    mask = np.repeat(keep, frame)
+    return np.concatenate([mask, np.full(len(samples) - len(mask), bool(keep[-1]))])
+
+
+def trim_silence(samples: np.ndarray, rate: int = TARGET_RATE) -> np.ndarray:
+    """
+    Drop leading and trailing silence and shorten pauses longer than
+    MAX_PAUSE_SECONDS. Returns the input unchanged when no speech is found.
+    """
+    mask = speech_mask(samples, rate)
+    return samples if mask is None else samples[mask]
+
+
+class TrimmedTimeline:
+    """
+    Maps times on silence-trimmed audio back to the original recording.
+
+    Args:
+        mask: Per-sample mask the trimmed audio was cut with (None: nothing was cut)
+        rate: Sample rate of the mask
+    """
+
+    def __init__(self, mask: Optional[np.ndarray], rate: int = TARGET_RATE):
+        self.rate = rate
+        if mask is None or mask.all():
+            self._trimmed_starts = self._original_starts = self._lengths = None
+            return
+        # Runs of kept samples: where each starts in the original and in the trimmed audio
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+        self._original_starts, ends = edges[::2], edges[1::2]
+        self._lengths = ends - self._original_starts
+        self._trimmed_starts = np.concatenate([[0], np.cumsum(self._lengths)[:-1]])
+
+    def to_original(self, seconds: float, end: bool = False) -> float:
+        """
+        Seconds on the trimmed audio -> seconds on the original. An end time
+        on a removed pause stays with the speech before it, a start time
+        moves to the speech after it.
+        """
+        if self._trimmed_starts is None:
+            return seconds
+        position = seconds * self.rate
+        run = np.searchsorted(self._trimmed_starts, position, side="left" if end else "right") - 1
+        run = min(max(int(run), 0), len(self._trimmed_starts) - 1)
+        offset = min(max(position - self._trimmed_starts[run], 0), self._lengths[run])
+        return float(self._original_starts[run] + offset) / self.rate
+
+
+def encode_wav(samples: np.ndarray, rate: int = TARGET_RATE) -> bytes:
+    """Mono float samples -> 16-bit PCM WAV"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def encode_opus(samples: np.ndarray, rate: int = TARGET_RATE) -> bytes:
+    """Mono float samples -> Opus in an Ogg container (speech bitrate)"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    result = subprocess.run(
+        [FFMPEG, "-nostdin", "-loglevel", "error", "-f", "s16le", "-ac", "1", "-ar", str(rate), "-i", "pipe:0",
+         "-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg", "pipe:1"],
+        input=pcm.tobytes(), capture_output=True, check=True
+    )
+    return result.stdout
+
+
+def _codec() -> str:
+    if VOICE_PREPROCESS_CODEC == "auto":
+        return "opus" if FFMPEG else "wav"
+    return VOICE_PREPROCESS_CODEC
+
+
+def decode_audio(data: bytes) -> Optional[np.ndarray]:
+    """Mono 16 kHz float32 samples, or None if the format can't be decoded here"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            samples, rate = decode_wav(data)
+            return resample(to_mono(samples), rate)
+        except (wave.Error, ValueError, EOFError):
+            if not FFMPEG:
+                raise
+    if FFMPEG:
+        return to_mono(decode_with_ffmpeg(data)[0])
+    return None
+
+
+def encode_audio(samples: np.ndarray) -> Tuple[bytes, str]:
+    """Mono 16 kHz samples -> (encoded bytes, codec) using VOICE_PREPROCESS_CODEC"""
+    codec = _codec()
+    if codec == "opus":
+        try:
+            return encode_opus(samples), "opus"
+        except Exception as e:
+            logger.warning(f"Opus encoding failed, using WAV: {e}")
+    return encode_wav(samples), "wav"
+
+
+def file_extension(codec: str) -> str:
+    return "ogg" if codec == "opus" else "wav"
+
+
+def prepare_samples(data: bytes, filename: str) -> Tuple[Optional[np.ndarray], Dict, TrimmedTimeline]:
+    """
+    Decode, downmix, resample and trim silence.
+
+    Returns:
+        (mono 16 kHz samples, or None if the upload can't be decoded here,
+        stats, timeline mapping times on the samples back to the upload)
+    """
+    stats = {"applied": False, "bytes_in": len(data), "bytes_out": len(data),
+             "duration_in": None, "duration_out": None, "trimmed_seconds": 0.0, "codec": None}
+    try:
+        samples = decode_audio(data)
+    except Exception as e:
+        logger.warning(f"Could not decode {filename} for preprocessing, sending it unchanged: {e}")
+        return None, stats, TrimmedTimeline(None)
+    if samples is None or len(samples) == 0:
+        return None, stats, TrimmedTimeline(None)
+
+    mask = speech_mask(samples)
+    trimmed = samples if mask is None else samples[mask]
+    duration_in, duration_out = len(samples) / TARGET_RATE, len(trimmed) / TARGET_RATE
+    stats.update(duration_in=round(duration_in, 3), duration_out=round(duration_out, 3),
+                 trimmed_seconds=round(duration_in - duration_out, 3))
+    return trimmed, stats, TrimmedTimeline(mask)
+
+
+def preprocess_audio(data: bytes, filename: str) -> Tuple[bytes, str, Dict]:
+    """
+    Decode, downmix, resample, trim silence and re-encode an upload.
+
+    Returns:
+        (audio bytes, filename matching the new encoding, stats). When the
+        audio can't be decoded, or the result would be larger, the original
+        upload is returned with stats["applied"] False.
+    """
+    samples, stats, _ = prepare_samples(data, filename)
+    return encode_prepared(data, filename, samples, stats)
+
+
+def encode_prepared(data: bytes, filename: str, samples: Optional[np.ndarray], stats: Dict) -> Tuple[bytes, str, Dict]:
+    """Second half of preprocess_audio, for samples from prepare_samples()"""
+    if samples is None:
+        return data, filename, stats
+
+    encoded, codec = encode_audio(samples)
+    if len(encoded) >= len(data):
+        return data, filename, stats
+
+    stats.update(applied=True, bytes_out=len(encoded), codec=codec)
+    stem = filename.rsplit(".", 1)[0]
+    return encoded, f"{stem}.{file_extension(codec)}", stats
+
+
+def split_on_silence(
+    samples: np.ndarray,
+    chunk_seconds: float,
+    overlap_seconds: float,
+    rate: int = TARGET_RATE,
+    search_seconds: float = 5.0
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Split long audio into chunks of about chunk_seconds, cutting at the
+    quietest frame in the last search_seconds (at most half a chunk)
+    before each boundary so cuts fall in pauses rather than mid-word.
+    Each chunk is widened by overlap_seconds on both sides, so a word at
+    a cut is heard whole by at least one chunk.
+
+    Returns:
+        [(start, end, own_start, own_end)] sample indices: the chunk to
+        transcribe, and the part of the timeline it is responsible for
+
+    Raises:
+        ValueError: If chunk_seconds is shorter than two frames
+    """
+    frame = int(rate * FRAME_SECONDS)
+    chunk, overlap = int(chunk_seconds * rate), int(overlap_seconds * rate)
+    if chunk < 2 * frame:
+        raise ValueError(f"chunk_seconds must be at least {2 * FRAME_SECONDS} s, got {chunk_seconds}")
+    # The search window stays within the second half of the chunk, so every cut moves forward
+    search = min(int(search_seconds * rate), chunk // 2)
+
+    cuts = [0]
+    while len(samples) - cuts[-1] > chunk * 1.25:
+        window_start = cuts[-1] + chunk - search
+        window = samples[window_start:cuts[-1] + chunk]
+        n_frames = len(window) // frame
+        energy = np.mean(window[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1)
+        cut = window_start + int(np.argmin(energy)) * frame + frame // 2
+        assert cut > cuts[-1], "split_on_silence must advance"
+        cuts.append(cut)
+    cuts.append(len(samples))
+
+    return [
+        (max(own_start - overlap, 0), min(own_end + overlap, len(samples)), own_start, own_end)
+        for own_start, own_end in zip(cuts, cuts[1:])
+    ]
@@ -0,0 +1,198 @@
+"""
+Local inverted-index BM25 retriever for knowledge-base chunks.
+
+Complements the Chroma vector search with exact-term matching, which matters
+for food names like "matooke" or "nakati" that TF-IDF embeddings blur.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Knowledge-base partition holding curated documents visible to every user;
+# chunks without a namespace (uploaded before partitions existed) belong here
+SHARED_NAMESPACE = "shared"
+
+# Bump when the on-disk layout or id scheme changes; older files are rebuilt
+INDEX_FORMAT = 3
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "was", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an in-memory inverted index, optionally persisted as JSON.
+
+    Documents are keyed by the same content-hash ids used in Chroma, so
+    re-adding a chunk replaces its postings instead of double counting.
+    Postings are split by namespace, so a search scoped to a few
+    namespaces only visits their documents.
+    """
+
+    def __init__(self, persist_path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.persist_path = persist_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        self.documents: Dict[str, Dict] = {}  # id -> {"content", "metadata", "length"}
+        self.postings: Dict[str, Dict[str, Dict[str, int]]] = {}  # term -> {namespace: {id: term frequency}}
+        self.doc_freq: Counter = Counter()  # term -> documents containing it (all namespaces)
+        self.namespace_counts: Counter = Counter()
+        self._total_length = 0
+
+        if persist_path and os.path.exists(persist_path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _load(self):
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") != INDEX_FORMAT:
+                logger.info("BM25 index on disk uses an older format, rebuilding")
+                return
+            self.documents = data.get("documents", {})
+            self.postings = data.get("postings", {})
+            self.doc_freq = Counter({
+                term: sum(len(docs) for docs in by_namespace.values())
+                for term, by_namespace in self.postings.items()
+            })
+            self.namespace_counts = Counter(doc["namespace"] for doc in self.documents.values())
+            self._total_length = sum(doc["length"] for doc in self.documents.values())
+            logger.info(f"Loaded BM25 index with {len(self.documents)} chunks")
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index from {self.persist_path}: {e}")
+            self.documents, self.postings, self._total_length = {}, {}, 0
+            self.doc_freq, self.namespace_counts = Counter(), Counter()
+
+    def save(self):
+        """Write the index to disk (atomically, via a temp file)"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            data = {"format": INDEX_FORMAT, "documents": self.documents, "postings": self.postings}
+            tmp_path = f"{self.persist_path}.tmp"
+            os.makedirs(os.path.dirname(os.path.abspath(self.persist_path)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.persist_path)
+
+    def _remove(self, doc_id: str):
+        doc = self.documents.pop(doc_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc["length"]
+        namespace = doc["namespace"]
+        self.namespace_counts[namespace] -= 1
+        for term in set(tokenize(doc["content"])):
+            by_namespace = self.postings.get(term, {})
+            postings = by_namespace.get(namespace)
+            if postings is not None and postings.pop(doc_id, None) is not None:
+                self.doc_freq[term] -= 1
+                if not postings:
+                    del by_namespace[namespace]
+                if not by_namespace:
+                    del self.postings[term]
+                    del self.doc_freq[term]
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict]] = None):
+        """Add or replace documents in the index"""
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self._remove(doc_id)
+                tokens = tokenize(text)
+                metadata = metadata or {}
+                namespace = metadata.get("namespace", SHARED_NAMESPACE)
+                self.documents[doc_id] = {
+                    "content": text,
+                    "metadata": metadata,
+                    "namespace": namespace,
+                    "length": len(tokens),
+                }
+                self._total_length += len(tokens)
+                self.namespace_counts[namespace] += 1
+                for term, tf in Counter(tokens).items():
+                    self.postings.setdefault(term, {}).setdefault(namespace, {})[doc_id] = tf
+                    self.doc_freq[term] += 1
+
+    def count(self, namespaces: Iterable[str]) -> int:
+        """Number of chunks stored in the given namespaces"""
+        return sum(self.namespace_counts[ns] for ns in namespaces)
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        namespaces: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Score documents containing any query term.
+
+        Args:
+            query: Search query
+            k: Number of results to return
+            namespaces: Only score chunks in these namespaces (None = all)
+
+        Returns:
+            List of (id, score) pairs, best first
+        """
+        allowed = list(dict.fromkeys(namespaces)) if namespaces is not None else None
+
+        scores: Dict[str, float] = {}
+        with self._lock:
+            n_docs = len(self.documents)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+
+            for term in set(tokenize(query)):
+                by_namespace = self.postings.get(term)
+                if not by_namespace:
+                    continue
+                # Corpus-wide document frequency, so scores don't depend on the scope
+                df = self.doc_freq[term]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                scoped = by_namespace.values() if allowed is None else (
+                    by_namespace[ns] for ns in allowed if ns in by_namespace
+                )
+                for postings in scoped:
+                    for doc_id, tf in postings.items():
+                        length = self.documents[doc_id]["length"]
+                        norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                        scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked id lists; each list contributes 1 / (k + rank).
+
+    Returns:
+        List of (id, fused score) pairs, best first
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
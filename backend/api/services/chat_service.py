@@ -0,0 +1,458 @@
+"""
+Chat turn service: one question/answer turn shared by the HTTP and WebSocket routes
+"""
+import os
+import asyncio
+import uuid
+import json
+import logging
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+
+from api.models.chat import ChatRequest, ChatResponse, ConversationDB, MessageDB
+from api.models.user import UserDB
+from api.core.timing import StageTimer
+from api.services.llm_service import get_llm_service
+from api.services.context_manager import get_context_manager
+from api.services.meal_plan_service import get_meal_plan_service
+from api.services.translation_pipeline import TranslationFailedError, translate_markdown
+
+logger = logging.getLogger(__name__)
+
+# Optional stages give up after these many seconds (no documents / LLM reply instead)
+CHAT_RETRIEVAL_TIMEOUT = float(os.getenv("CHAT_RETRIEVAL_TIMEOUT", "3"))
+CHAT_MEAL_PLAN_TIMEOUT = float(os.getenv("CHAT_MEAL_PLAN_TIMEOUT", "10"))
+
+
+def _get_or_create_conversation(db: Session, current_user: UserDB, request: ChatRequest) -> ConversationDB:
+    """Return the request's conversation, creating one if it is missing or not owned"""
+    if request.conversation_id:
+        # Verify conversation belongs to user
+        conversation = db.query(ConversationDB).filter(
+            ConversationDB.id == request.conversation_id,
+            ConversationDB.user_id == current_user.id
+        ).first()
+        if conversation:
+            return conversation
+
+    # Create new conversation
+    conversation_id = str(uuid.uuid4())
+    new_conversation = ConversationDB(
+        id=conversation_id,
+        user_id=current_user.id,
+        title=request.message[:30] + "..." # Simple title from first message
+    )
+    # Written in the same transaction as the turn's messages
+    db.add(new_conversation)
+    return new_conversation
+
+
+def save_pending(db: Session):
+    """Commit the pending conversation and user message after a failed turn, so the question is not lost"""
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not save chat message: {e}")
+
+
+@lru_cache(maxsize=256)
+def _system_prompt(profile_key: str) -> str:
+    """
+    System prompt for a profile (given as sorted JSON). Memoized: it is the
+    same on every turn of a conversation, and an identical prefix keeps the
+    response-cache keys stable.
+    """
+    # Check user's profile status
+    profile = json.loads(profile_key)
+    has_profile = bool(profile.get('name') and profile.get('ageRange'))
+    
+    # Build profile context for the AI
+    if has_profile:
+        profile_summary = f"""
+CURRENT USER PROFILE:
+- Elder's Name: {profile.get('name', 'Not set')}
+- Age Range: {profile.get('ageRange', 'Not set')}
+- Gender: {profile.get('gender', 'Not set')}
+- Health Conditions: {', '.join(profile.get('healthConditions', [])) or 'None specified'}
+- Medications: {', '.join(profile.get('medications', [])) or 'None specified'}
+- Dietary Preferences: {', '.join(profile.get('dietaryPreferences', [])) or 'None specified'}
+- Allergies: {', '.join(profile.get('allergies', [])) or 'None specified'}
+- Region: {profile.get('region', 'Not set')}
+
+The user has already set up their profile. Start by greeting them and summarizing the profile above.
+Then ask: "What would you like to do today? I can help with:
+- Generate a personalized meal plan
+- Answer nutrition questions
+- Suggest local food alternatives
+- Update your profile"
+"""
+    else:
+        profile_summary = """
+NO PROFILE SET UP YET.
+
+Start by welcoming the user and explain you'd like to learn about the elderly person they're caring for.
+Ask ONE question at a time in this order:
+1. First, ask for the elderly person's NAME only.
+2. Wait for response, then ask about their AGE RANGE (60-70, 70-80, 80+).
+3. Wait for response, then ask about any HEALTH CONDITIONS (diabetes, hypertension, heart issues, etc.)
+4. Wait for response, then ask about FOOD PREFERENCES (favorite Ugandan foods they enjoy)
+5. After collecting info, summarize what you learned and ask if it's correct.
+
+IMPORTANT: Ask ONLY ONE question per message. Be patient and conversational.
+"""
+
+    return f"""You are Mzee Chakula, a warm and caring nutritional assistant for elderly care in Uganda.
+
+{profile_summary}
+
+CONVERSATION RULES:
+1. Be warm, friendly, and patient - like a caring family member
+2. Ask ONE question at a time, never multiple questions in one message
+3. Listen to the user's response before moving to the next question
+4. Use simple, clear language
+5. When ready to generate a meal plan, ask for confirmation first
+6. Use local Ugandan foods: matooke, beans, nakati, posho, cassava, sweet potatoes, groundnuts, millet, fish, sukuma wiki
+
+WHEN USER CONFIRMS TO GENERATE MEAL PLAN (says "yes", "please", "go ahead", "ready", "generate"):
+Create a 7-day meal plan in this format:
+
+**7-Day Meal Plan for [Name]**
+**Daily Caloric Target:** ~[calories] kcal based on age and conditions
+
+**Monday:**
+- Breakfast: [Meal]
+- Lunch: [Meal]
+- Dinner: [Meal]
+[Continue for all 7 days...]
+
+**Shopping List:**
+[List of items needed]
+
+**Health Tips:**
+[3-4 relevant tips based on their conditions]
+
+Be conversational, ask one thing at a time, and make the user feel comfortable!"""
+
+
+async def _build_messages(
+    request: ChatRequest,
+    conversation: ConversationDB,
+    db: Session,
+    user_msg: MessageDB
+) -> list:
+    """System prompt (with profile context), windowed history and the new user message"""
+    profile_key = json.dumps(request.profile or {}, sort_keys=True, default=str)
+    messages = [{"role": "system", "content": _system_prompt(profile_key)}]
+
+    # Load history from the database (the client's copy only for conversations
+    # with nothing stored): recent turns verbatim, older ones as a rolling summary
+    context_manager = get_context_manager()
+    offset, history = context_manager.load_history(db, conversation, exclude_id=user_msg.id)
+    if offset == 0 and not history:
+        history = [{"role": msg.role, "content": msg.content} for msg in request.history]
+    messages.extend(await context_manager.window(history, conversation, offset=offset))
+
+    messages.append({"role": "user", "content": request.message})
+    return messages
+
+
+async def _search_documents(request: ChatRequest, current_user: UserDB) -> str:
+    """Search uploaded documents; returns the context block to prepend to the question ('' if none)"""
+    document_context = ""
+    try:
+        from api.services.rag_service import get_rag_service, user_namespace, SHARED_NAMESPACE
+        rag_service = get_rag_service()
+
+        # Search the user's own uploads plus the shared curated documents
+        # (skipped for "ok", greetings and empty partitions)
+        namespaces = [user_namespace(current_user.id), SHARED_NAMESPACE]
+        search_results = []
+        if rag_service.should_search(request.message, namespaces):
+            search_results = await rag_service.search_knowledge_base(request.message, k=3, namespaces=namespaces)
+
+        if search_results:
+            document_context = "\n\n---UPLOADED DOCUMENT CONTEXT---\n"
+            document_context += "The user has uploaded documents. Here are relevant excerpts:\n\n"
+            for i, result in enumerate(search_results, 1):
+                source = result.get('metadata', {}).get('source', 'Unknown document')
+                content = result.get('content', '')[:500]  # Limit content length
+                document_context += f"[Document: {source}]\n{content}\n\n"
+            document_context += "---END DOCUMENT CONTEXT---\n"
+            document_context += "\nUse this document information to help answer the user's question. "
+            document_context += "If they ask about the document, summarize what you see and explain how it could be used for meal planning.\n"
+    except Exception as e:
+        # If RAG search fails, continue without document context
+        logger.warning(f"RAG search failed: {e}")
+    return document_context
+
+
+def _generate_meal_plan_reply(messages: list) -> Optional[str]:
+    """Formatted ML meal plan when the user has confirmed, otherwise None (use the LLM)"""
+    should_generate_plan, extracted_info = _should_generate_meal_plan(messages)
+    if not (should_generate_plan and extracted_info):
+        return None
+
+    # Generate meal plan using ML models
+    from api.main import model_loader
+    meal_plan_service = get_meal_plan_service(model_loader)
+
+    result = meal_plan_service.generate_meal_plan(
+        age=extracted_info.get('age', 75),
+        health_conditions=extracted_info.get('conditions', []),
+        preferred_foods=extracted_info.get('foods', []),
+        name=extracted_info.get('name', 'Patient')
+    )
+
+    if result['success']:
+        # Format meal plan as readable text
+        return format_meal_plan_response(result)
+    return None
+
+
+async def prepare_turn(
+    request: ChatRequest,
+    current_user: UserDB,
+    db: Session,
+    timer: StageTimer
+) -> Tuple[ConversationDB, list, Optional[str]]:
+    """
+    Run the stages before the LLM call as a small DAG:
+
+        context (history, summary) -> meal_plan (extraction + ML plan)
+        retrieval (document search)
+
+    The two branches run concurrently. Retrieval and the meal plan have
+    timeouts and fall back to no documents / the LLM. Nothing is committed
+    here; the conversation and user message are pending in the session.
+
+    Returns:
+        (conversation, prompt messages, meal plan reply or None)
+    """
+    conversation = _get_or_create_conversation(db, current_user, request)
+
+    # Save User Message (committed with the reply, or by save_pending on failure)
+    user_msg = MessageDB(
+        conversation_id=conversation.id,
+        role="user",
+        content=request.message,
+        timestamp=datetime.utcnow()
+    )
+    db.add(user_msg)
+
+    async def context_then_meal_plan():
+        messages = await timer.run("context", _build_messages(request, conversation, db, user_msg))
+        meal_plan_reply = await timer.run(
+            "meal_plan",
+            asyncio.to_thread(_generate_meal_plan_reply, [dict(m) for m in messages]),
+            timeout=CHAT_MEAL_PLAN_TIMEOUT
+        )
+        return messages, meal_plan_reply
+
+    (messages, meal_plan_reply), document_context = await asyncio.gather(
+        context_then_meal_plan(),
+        timer.run("retrieval", _search_documents(request, current_user),
+                  timeout=CHAT_RETRIEVAL_TIMEOUT, default="")
+    )
+
+    if document_context:
+        # Add document context to the last user message
+        messages[-1]["content"] = document_context + "\nUser question: " + request.message
+
+    # Keep the prompt within the token budget
+    get_context_manager().fit_to_budget(messages)
+    return conversation, messages, meal_plan_reply
+
+
+async def translate_response(response_content: str, language: Optional[str]) -> str:
+    """Translate the English response into the requested language (original text on failure)"""
+    # Map language codes; replies are generated in English, so 'en'/'eng' need no translation
+    lang_code_map = {'lg': 'lug', 'sw': 'swh', 'en': 'eng'}
+    target_lang = lang_code_map.get(language.lower(), language.lower()) if language else None
+    logger.info(f"Language requested: '{language}' (will translate: {bool(target_lang) and target_lang != 'eng'})")
+    if not target_lang or target_lang == 'eng':
+        return response_content
+
+    try:
+        logger.info(f"Translating to: {target_lang}")
+
+        # Long replies (meal plans) are translated as concurrent segments
+        translated_text = await translate_markdown(response_content, source_lang='eng', target_lang=target_lang)
+
+        # Ensure we get a string result
+        if isinstance(translated_text, str):
+            logger.info(f"Using translated response")
+            return translated_text
+        logger.warning(f"Translation returned non-string: {type(translated_text)}")
+        return response_content
+    except TranslationFailedError as e:
+        # Nothing could be translated: say so and serve the English original
+        logger.error(f"Translation to {language} failed, serving the English response: {e}")
+        return response_content
+    except Exception as e:
+        # If translation fails, return original response
+        logger.warning(f"Translation failed: {str(e)}")
+        return response_content
+
+
+async def run_chat_turn(
+    request: ChatRequest,
+    current_user: UserDB,
+    db: Session,
+    timer: StageTimer
+) -> ChatResponse:
+    """
+    Answer one chat message: prepare the prompt, generate the reply (ML meal
+    plan or LLM), translate it and commit the turn. Stage timings go to `timer`.
+
+    On failure the conversation and user message are still saved and the
+    exception is re-raised for the caller to report.
+    """
+    try:
+        # Get service instance
+        llm_service = get_llm_service()
+
+        # 1-3. Conversation, user message, prompt (history, documents) and
+        # the meal plan decision; independent stages run concurrently
+        conversation, messages, meal_plan_reply = await prepare_turn(request, current_user, db, timer)
+        conversation_id = conversation.id
+
+        # 4. Use the ML meal plan when the user confirms, otherwise call Groq via the LLM service
+        response_content = meal_plan_reply
+        if response_content is None:
+            with timer.stage("llm"):
+                # An opening question (system prompt + message, no history) is FAQ-like:
+                # identical ones share a cached answer even though chat replies are sampled
+                opening_question = len(messages) == 2
+                response_content = await llm_service.generate_response(
+                    messages, use_cache=True if opening_question else None
+                )
+
+        # 5. Translate response if needed
+        with timer.stage("translate"):
+            final_response = await translate_response(response_content, request.language)
+
+        # 6. Save Assistant Response (save original English for consistency);
+        # one commit writes the conversation and both messages
+        with timer.stage("persist"):
+            assistant_msg = MessageDB(
+                conversation_id=conversation_id,
+                role="assistant",
+                content=response_content  # Save English version
+            )
+            db.add(assistant_msg)
+            db.commit()
+    except Exception:
+        save_pending(db)
+        raise
+
+    return ChatResponse(
+        response=final_response,  # Return translated version to user
+        conversation_id=conversation_id,
+        timestamp=datetime.now().isoformat()
+    )
+
+
+def _should_generate_meal_plan(messages: list) -> tuple[bool, dict]:
+    """
+    Determine if we should generate a meal plan based on conversation history
+    
+    Only triggers when user CONFIRMS they want the plan generated.
+    Returns: (should_generate, extracted_info_dict)
+    """
+    # Get the last user message
+    last_user_msg = ""
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            last_user_msg = msg.get("content", "").lower()
+            break
+    
+    # Check for EXPLICIT confirmation in the LAST message only
+    confirmation_phrases = [
+        "yes", "go ahead", "generate now", "create it", "make it",
+        "please do", "yes please", "sure", "ready", "proceed",
+        "generate the plan", "create the plan", "make the plan"
+    ]
+    
+    has_confirmation = any(phrase in last_user_msg for phrase in confirmation_phrases)
+    
+    if not has_confirmation:
+        return False, {}
+    
+    # Join all conversation text for info extraction
+    conversation_text = " ".join([m.get("content", "") for m in messages]).lower()
+
+    # Extract information from conversation
+    extracted = {
+        'age': None,
+        'conditions': [],
+        'foods': [],
+        'name': None
+    }
+
+    # Extract age
+    age_match = re.search(r'(\d+)\s*(years?|yrs?)\s*old', conversation_text)
+    if not age_match:
+        age_match = re.search(r'age[:\s]*(\d+)', conversation_text)
+    if not age_match:
+        age_match = re.search(r'(\d+)\s*-\s*(\d+)', conversation_text)  # Age range like 70-80
+        if age_match:
+            extracted['age'] = (int(age_match.group(1)) + int(age_match.group(2))) // 2
+    if age_match and extracted['age'] is None:
+        extracted['age'] = int(age_match.group(1))
+
+    # Extract health conditions
+    if 'diabetes' in conversation_text or 'diabetic' in conversation_text:
+        extracted['conditions'].append('diabetes')
+    if 'hypertension' in conversation_text or 'high blood pressure' in conversation_text or 'bp' in conversation_text:
+        extracted['conditions'].append('hypertension')
+    if 'heart' in conversation_text:
+        extracted['conditions'].append('heart condition')
+
+    # Extract preferred foods
+    ugandan_foods = ['matooke', 'beans', 'nakati', 'posho', 'cassava', 'sweet potato', 'groundnut', 'fish', 'sukuma']
+    for food in ugandan_foods:
+        if food in conversation_text:
+            extracted['foods'].append(food.replace(' ', '_'))
+
+    # Extract name if mentioned
+    name_match = re.search(r'(?:name|called|grandfather|grandpa|granny|grandmother)(?:\s+is)?\s+([A-Z][a-z]+)', " ".join([m.get("content", "") for m in messages]))
+    if name_match:
+        extracted['name'] = name_match.group(1)
+
+    return True, extracted
+
+
+def format_meal_plan_response(result: dict) -> str:
+    """Format meal plan result as readable text"""
+    name = result.get('patient_name', 'Patient')
+    calories = result.get('caloric_needs', 1800)
+    meal_plan = result.get('meal_plan', {})
+    shopping_list = result.get('shopping_list', [])
+    tips = result.get('tips', [])
+
+    response = f"**7-Day Meal Plan for {name}**\n\n"
+    response += f"Daily Caloric Target: ~{calories} kcal\n\n"
+
+    # Add meal plan
+    for day, meals in meal_plan.items():
+        response += f"**{day}:**\n"
+        response += f"- Breakfast: {meals.get('breakfast', 'N/A')}\n"
+        response += f"- Lunch: {meals.get('lunch', 'N/A')}\n"
+        response += f"- Dinner: {meals.get('dinner', 'N/A')}\n\n"
+
+    # Add shopping list
+    response += "**Shopping List:**\n"
+    for item in shopping_list:
+        response += f"- {item}\n"
+
+    response += "\n**Health Tips:**\n"
+    for tip in tips:
+        response += f"- {tip}\n"
+
+    response += "\n---\n*Generated using ML models for personalized nutrition*"
+
+    return response
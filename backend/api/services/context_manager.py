@@ -0,0 +1,190 @@
+"""
+Bounded chat context: recent turns verbatim, older turns folded into a
+rolling summary stored on the conversation, and a prompt token budget.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from api.models.chat import ConversationDB, MessageDB
+from api.routers.metrics import chat_prompt_tokens
+from api.services.llm_cache import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Turns (user + assistant message pairs) kept verbatim in the prompt
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+# Older messages are summarized in batches, so summarization is not an
+# extra LLM call on every turn
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "6"))
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "6000"))
+# A slow summary call must not hold up the turn; the batch is retried next turn
+CHAT_SUMMARY_TIMEOUT = float(os.getenv("CHAT_SUMMARY_TIMEOUT", "8"))
+
+SUMMARY_PROMPT = """Summarize this conversation between a caregiver and Mzee Chakula, a nutrition assistant for elderly care in Uganda.
+Keep every fact needed to continue it: the elder's name, age, gender, health conditions, medications, allergies,
+food preferences, region, and any decisions or plans already agreed. Write at most 150 words in plain sentences."""
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token estimate for budgeting. Groq serves Llama models, whose tokenizer
+    is not available offline, so a character estimate is used throughout.
+    """
+    return estimate_tokens(text)
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    # ~4 tokens of per-message overhead for role and separators
+    return sum(count_tokens(m.get("content", "")) + 4 for m in messages)
+
+
+class ContextManager:
+    """
+    Args:
+        history_turns: Turns kept verbatim
+        summary_batch: Messages that must age out of the window before they are summarized
+        token_budget: Maximum prompt tokens sent to the model
+    """
+
+    def __init__(
+        self,
+        history_turns: int = CHAT_HISTORY_TURNS,
+        summary_batch: int = CHAT_SUMMARY_BATCH,
+        token_budget: int = CHAT_PROMPT_TOKEN_BUDGET
+    ):
+        self.history_turns = history_turns
+        self.summary_batch = summary_batch
+        self.token_budget = token_budget
+
+    def load_history(
+        self,
+        db: Session,
+        conversation: ConversationDB,
+        exclude_id: Optional[int] = None
+    ) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        Read the stored messages window() needs: everything the summary does
+        not cover yet, capped at the window plus two summary batches. Uses the
+        (conversation_id, timestamp) index.
+
+        Returns:
+            (position of the first returned message in the conversation, messages)
+        """
+        query = db.query(MessageDB.role, MessageDB.content).filter(MessageDB.conversation_id == conversation.id)
+        if exclude_id is not None:
+            query = query.filter(MessageDB.id != exclude_id)
+
+        total = query.count()
+        limit = self.history_turns * 2 + self.summary_batch * 2
+        start = max(conversation.summarized_count or 0, total - limit)
+        if start >= total:
+            return total, []
+
+        rows = query.order_by(MessageDB.timestamp.desc(), MessageDB.id.desc()).limit(total - start).all()
+        return start, [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    async def window(
+        self,
+        history: List[Dict[str, str]],
+        conversation: Optional[ConversationDB],
+        offset: int = 0
+    ) -> List[Dict[str, str]]:
+        """
+        Messages to send in place of the full history: the conversation
+        summary (if any) followed by the most recent turns.
+
+        Once at least summary_batch messages have aged out of the window they
+        are folded into conversation.summary; conversation.summarized_count
+        records how many messages of the conversation the summary covers.
+        history may be a tail of the conversation starting at position offset.
+        """
+        keep = self.history_turns * 2
+        total = offset + len(history)
+        summarized = (conversation.summarized_count or 0) if conversation is not None else 0
+        if summarized > total:
+            # The client started over with a shorter history
+            summarized = 0
+            if conversation is not None:
+                conversation.summary, conversation.summarized_count = None, 0
+
+        aged_out = max(total - keep, 0)
+        if conversation is not None and aged_out - summarized >= self.summary_batch:
+            # Messages before offset were beyond the load limit and are skipped
+            first = max(summarized, offset)
+            if await self._fold(conversation, history[first - offset:aged_out - offset]):
+                # Committed with the rest of the turn
+                conversation.summarized_count = aged_out
+                summarized = aged_out
+
+        messages = []
+        if conversation is not None and conversation.summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{conversation.summary}"
+            })
+        # Aged-out messages not yet summarized stay verbatim until the next batch
+        messages.extend(history[max(summarized - offset, 0):])
+        return messages
+
+    async def _fold(self, conversation: ConversationDB, messages: List[Dict[str, str]]) -> bool:
+        """Merge messages into the rolling summary; False (summary unchanged) on failure"""
+        from api.services.llm_service import get_llm_service
+
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if conversation.summary:
+            transcript = f"Summary so far:\n{conversation.summary}\n\nNew messages:\n{transcript}"
+        try:
+            summary = await asyncio.wait_for(
+                get_llm_service().generate_response(
+                    [{"role": "user", "content": transcript}],
+                    system_prompt=SUMMARY_PROMPT,
+                    temperature=0.2,
+                    max_tokens=300
+                ),
+                CHAT_SUMMARY_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning(f"Conversation summary failed, keeping history verbatim: {e}")
+            return False
+
+        conversation.summary = summary.strip()
+        return True
+
+    def fit_to_budget(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Enforce the token budget in place before the LLM call. Drops the
+        oldest history messages first (never system messages or the new user
+        message), then trims the front of the user message, which is where
+        document context is prepended. Records the final prompt size.
+        """
+        tokens = count_message_tokens(messages)
+        while tokens > self.token_budget:
+            droppable = [i for i, m in enumerate(messages[:-1]) if m.get("role") != "system"]
+            if not droppable:
+                break
+            tokens -= count_tokens(messages.pop(droppable[0]).get("content", "")) + 4
+
+        if tokens > self.token_budget:
+            last = messages[-1]
+            content = last.get("content", "")
+            keep_chars = max(len(content) - (tokens - self.token_budget) * 4, 0)
+            last["content"] = content[len(content) - keep_chars:]
+            tokens = count_message_tokens(messages)
+
+        chat_prompt_tokens.observe(tokens)
+        return messages
+
+
+# Singleton pattern with lazy loading
+_context_manager_instance = None
+
+def get_context_manager() -> ContextManager:
+    """Get or create the context manager singleton instance"""
+    global _context_manager_instance
+    if _context_manager_instance is None:
+        _context_manager_instance = ContextManager()
+    return _context_manager_instance
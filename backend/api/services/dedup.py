@@ -0,0 +1,90 @@
+"""
+Content-addressed chunk ids and near-duplicate detection for the knowledge base.
+
+Exact duplicates are caught by deriving the Chroma id from a hash of the
+normalized chunk text, so re-uploading a document upserts the same ids.
+Lightly edited re-uploads are caught with 64-bit SimHash fingerprints.
+"""
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+SIMHASH_BITS = 64
+# Fingerprints within this Hamming distance are treated as near-duplicates
+NEAR_DUPLICATE_DISTANCE = 7
+# 8 bands of 8 bits: by pigeonhole, two fingerprints within distance 7
+# must agree exactly on at least one band
+_BANDS = 8
+_BAND_BITS = SIMHASH_BITS // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so formatting changes hash the same"""
+    return " ".join(text.lower().split())
+
+
+def chunk_id(text: str, namespace: str) -> str:
+    """
+    Stable id for a chunk, derived from its namespace and normalized text.
+    The same text uploaded by two users gets two ids, one per partition.
+    """
+    key = f"{namespace}\x00{normalize_text(text)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _features(text: str) -> List[str]:
+    """
+    Words used as SimHash features. Chunks are paragraph-sized, so longer
+    shingles let a single edited word flip too many bits.
+    """
+    return _WORD_RE.findall(text.lower())
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash fingerprint of the text"""
+    weights = [0] * SIMHASH_BITS
+    for feature in _features(text):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """
+    In-memory index of SimHash fingerprints with banded lookup,
+    so near-duplicate checks don't scan every stored chunk.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE):
+        self.max_distance = max_distance
+        self._bands: List[Dict[int, Set[int]]] = [{} for _ in range(_BANDS)]
+
+    @staticmethod
+    def _band_keys(fingerprint: int) -> Iterable[int]:
+        for band in range(_BANDS):
+            yield (fingerprint >> (band * _BAND_BITS)) & _BAND_MASK
+
+    def add(self, fingerprint: int):
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            self._bands[band].setdefault(key, set()).add(fingerprint)
+
+    def find_near_duplicate(self, fingerprint: int) -> Optional[int]:
+        """Return a stored fingerprint within max_distance, if any"""
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for candidate in self._bands[band].get(key, ()):
+                if hamming_distance(candidate, fingerprint) <= self.max_distance:
+                    return candidate
+        return None
@@ -0,0 +1,162 @@
+"""
+In-memory food catalogue shared by meal planning and food search.
+
+The foods table is small (a few hundred rows) and read far more often than
+it is written, so it is loaded once per process into columnar NumPy arrays
+and served from memory. The food router invalidates it when foods are
+created, deleted or imported; FOOD_CATALOG_TTL bounds how long a worker
+can miss writes made by another process (other workers, import scripts).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.models.database import SessionLocal
+from api.models.food import FoodDB
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the catalogue is reloaded even without an invalidation (0 = never)
+FOOD_CATALOG_TTL = float(os.getenv("FOOD_CATALOG_TTL", "300"))
+
+NUMERIC_COLUMNS = ('calories', 'protein', 'carbs', 'fats', 'fiber', 'sodium', 'potassium', 'glycemic_index')
+
+
+class FoodSnapshot:
+    """
+    Immutable view of the foods table.
+
+    Numeric columns are float arrays (NaN where unknown), flags are bool
+    arrays, and records holds each row as a dict (shared: don't modify).
+    Rows are ordered by id. fingerprint is a hash of the rows: snapshots
+    with the same foods have the same fingerprint.
+    """
+
+    def __init__(self, records: List[Dict]):
+        self.records = records
+        self.fingerprint = hashlib.sha256(
+            json.dumps(records, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        self.ids = np.array([r['id'] for r in records], dtype=np.int64)
+        self.columns = {
+            column: np.array([np.nan if r[column] is None else r[column] for r in records], dtype=float)
+            for column in NUMERIC_COLUMNS
+        }
+        self.category = np.array([r['category'] for r in records], dtype=object)
+        self.is_diabetic_friendly = np.array([bool(r['is_diabetic_friendly']) for r in records], dtype=bool)
+        self.is_hypertension_friendly = np.array([bool(r['is_hypertension_friendly']) for r in records], dtype=bool)
+
+        self.by_name = {r['name'].lower(): i for i, r in enumerate(records)}
+        self.by_local_name: Dict[str, List[int]] = {}
+        for i, r in enumerate(records):
+            if r['local_name']:
+                self.by_local_name.setdefault(r['local_name'].lower(), []).append(i)
+        # "name\0local name", lowercased, for substring search
+        self._search_text = np.array(
+            [f"{r['name']}\x00{r['local_name'] or ''}".lower() for r in records], dtype=str
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def filter(
+        self,
+        query: Optional[str] = None,
+        category: Optional[str] = None,
+        diabetic_friendly: Optional[bool] = None,
+        hypertension_friendly: Optional[bool] = None
+    ) -> np.ndarray:
+        """Indices of the foods matching every given filter (query matches name or local name)"""
+        mask = np.ones(len(self.records), dtype=bool)
+        if query:
+            mask &= np.char.find(self._search_text, query.lower()) >= 0
+        if category:
+            mask &= self.category == category
+        if diabetic_friendly is not None:
+            mask &= self.is_diabetic_friendly == diabetic_friendly
+        if hypertension_friendly is not None:
+            mask &= self.is_hypertension_friendly == hypertension_friendly
+        return np.flatnonzero(mask)
+
+    def rows(self, indices) -> List[Dict]:
+        return [self.records[i] for i in indices]
+
+    def find(self, name: str) -> Optional[Dict]:
+        """Food by name or local name (case-insensitive)"""
+        key = name.lower().strip()
+        if key in self.by_name:
+            return self.records[self.by_name[key]]
+        matches = self.by_local_name.get(key)
+        return self.records[matches[0]] if matches else None
+
+    def categories(self) -> List[str]:
+        return list(dict.fromkeys(self.category))
+
+
+class FoodCatalog:
+    """Process-wide, lazily loaded FoodSnapshot"""
+
+    def __init__(self, ttl: float = FOOD_CATALOG_TTL):
+        self.ttl = ttl
+        self._snapshot: Optional[FoodSnapshot] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _stale(self) -> bool:
+        return self._snapshot is None or (self.ttl > 0 and time.monotonic() - self._loaded_at > self.ttl)
+
+    def snapshot(self, db: Optional[Session] = None) -> FoodSnapshot:
+        """
+        Current snapshot, loading it if needed with the given session (or a
+        new one). Callers keep using the snapshot they got even if the
+        catalogue is invalidated meanwhile.
+        """
+        if not self._stale():
+            return self._snapshot
+
+        with self._lock:
+            if not self._stale():
+                return self._snapshot
+            generation = self._generation
+            snapshot = self._load(db)
+            # A write during the load invalidated it again; serve it, but don't keep it
+            if generation == self._generation:
+                self._snapshot, self._loaded_at = snapshot, time.monotonic()
+            return snapshot
+
+    def _load(self, db: Optional[Session]) -> FoodSnapshot:
+        started = time.perf_counter()
+        session = db or SessionLocal()
+        try:
+            rows = session.execute(select(FoodDB.__table__).order_by(FoodDB.id)).mappings().all()
+        finally:
+            if db is None:
+                session.close()
+        snapshot = FoodSnapshot([dict(row) for row in rows])
+        logger.info(f"Loaded food catalog: {len(snapshot)} foods in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return snapshot
+
+    def invalidate(self):
+        """Drop the snapshot; the next reader reloads it (after foods change)"""
+        self._generation += 1
+        self._snapshot = None
+
+
+# Singleton pattern with lazy loading
+_food_catalog_instance = None
+
+def get_food_catalog() -> FoodCatalog:
+    """Get or create the food catalog singleton"""
+    global _food_catalog_instance
+    if _food_catalog_instance is None:
+        _food_catalog_instance = FoodCatalog()
+    return _food_catalog_instance
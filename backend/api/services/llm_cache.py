@@ -0,0 +1,189 @@
+"""
+Response cache for Groq completions.
+
+Exact lookups are keyed by a hash of (model, params, normalized messages).
+An opt-in semantic lookup also matches a repeated question with different
+wording, as long as everything before the last user message is identical.
+Similarity is measured with the knowledge-base embeddings.
+
+Only deterministic calls (temperature 0) are cached unless the caller opts
+in with allow_sampled: serving a stored answer to a sampled prompt would
+hand every user the same "random" reply.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from api.services.cache import LRUCache
+from api.services.dedup import normalize_text
+from api.routers.metrics import llm_cache_lookups, llm_cache_tokens_saved
+
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))  # 0 disables the cache
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_SEMANTIC_CACHE = os.getenv("LLM_SEMANTIC_CACHE", "false").lower() in ("1", "true", "yes")
+LLM_SEMANTIC_THRESHOLD = float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.95"))
+
+# Semantic candidates kept per conversation prefix
+_MAX_SEMANTIC_ENTRIES = 128
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def is_deterministic(params: Dict) -> bool:
+    # ChatGroq sends temperature 0 as 1e-8
+    return (params.get("temperature") or 0) <= 1e-6
+
+
+def _normalize_messages(messages: List[Dict[str, str]]) -> List[List[str]]:
+    return [[m.get("role", ""), normalize_text(m.get("content", ""))] for m in messages]
+
+
+class LLMResponseCache:
+    """
+    Exact plus (optional) semantic cache of LLM responses.
+
+    Args:
+        maxsize: Maximum number of exact entries
+        ttl: Seconds a response stays valid
+        embed: Text -> vector function; enables semantic lookup when given
+        embedding_version: Returns the current embedding space id; semantic
+            entries from another space are ignored (TF-IDF vocabularies change)
+        similarity_threshold: Minimum cosine similarity for a semantic hit
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 512,
+        ttl: float = 3600,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        embedding_version: Optional[Callable[[], Hashable]] = None,
+        similarity_threshold: float = 0.95
+    ):
+        self.ttl = ttl
+        self.embed = embed
+        self.embedding_version = embedding_version or (lambda: None)
+        self.similarity_threshold = similarity_threshold
+        self._exact = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._semantic = LRUCache(maxsize=maxsize, ttl=ttl)  # scope -> [(stored_at, vector, response, tokens)]
+        self._lock = threading.Lock()
+
+    def _semantic_scope(self, model: str, params: Dict, messages: List[Dict[str, str]]) -> str:
+        return _digest({"model": model, "params": params, "prefix": _normalize_messages(messages[:-1]),
+                        "space": repr(self.embedding_version())})
+
+    def _embed(self, messages: List[Dict[str, str]]) -> Optional[np.ndarray]:
+        if self.embed is None or not messages or messages[-1].get("role") != "user":
+            return None
+        vector = np.asarray(self.embed(normalize_text(messages[-1].get("content", ""))), dtype=float)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def get(self, model: str, params: Dict, messages: List[Dict[str, str]],
+            allow_sampled: bool = False) -> Optional[str]:
+        """
+        Cached response for this call, or None. Records hit/miss metrics.
+        Calls with temperature > 0 bypass the cache unless allow_sampled.
+        """
+        if self.ttl <= 0:
+            return None
+        if not (allow_sampled or is_deterministic(params)):
+            llm_cache_lookups.labels(result="bypass").inc()
+            return None
+
+        entry = self._exact.get(_digest({"model": model, "params": params, "messages": _normalize_messages(messages)}))
+        if entry is not None:
+            llm_cache_lookups.labels(result="exact").inc()
+            llm_cache_tokens_saved.inc(entry[1])
+            return entry[0]
+
+        vector = self._embed(messages)
+        if vector is not None:
+            now = time.monotonic()
+            candidates = self._semantic.get(self._semantic_scope(model, params, messages), [])
+            best, best_similarity = None, self.similarity_threshold
+            for stored_at, stored_vector, response, tokens in candidates:
+                if now - stored_at >= self.ttl or stored_vector.shape != vector.shape:
+                    continue
+                similarity = float(stored_vector @ vector)
+                if similarity >= best_similarity:
+                    best, best_similarity = (response, tokens), similarity
+            if best is not None:
+                llm_cache_lookups.labels(result="semantic").inc()
+                llm_cache_tokens_saved.inc(best[1])
+                return best[0]
+
+        llm_cache_lookups.labels(result="miss").inc()
+        return None
+
+    def set(self, model: str, params: Dict, messages: List[Dict[str, str]], response: str,
+            tokens: Optional[int] = None, allow_sampled: bool = False):
+        """Store a response; tokens is what the call cost (estimated when unknown)"""
+        if self.ttl <= 0 or not (allow_sampled or is_deterministic(params)):
+            return
+        if tokens is None:
+            tokens = estimate_tokens("".join(m.get("content", "") for m in messages) + response)
+
+        self._exact.set(_digest({"model": model, "params": params, "messages": _normalize_messages(messages)}),
+                        (response, tokens))
+
+        vector = self._embed(messages)
+        if vector is not None:
+            scope = self._semantic_scope(model, params, messages)
+            with self._lock:
+                entries = self._semantic.get(scope, [])
+                entries = (entries + [(time.monotonic(), vector, response, tokens)])[-_MAX_SEMANTIC_ENTRIES:]
+                self._semantic.set(scope, entries)
+
+    async def aget(self, *args, **kwargs) -> Optional[str]:
+        """get() for async callers: the semantic tier embeds (TF-IDF) off the event loop"""
+        if self.embed is None:
+            return self.get(*args, **kwargs)
+        return await asyncio.to_thread(self.get, *args, **kwargs)
+
+    async def aset(self, *args, **kwargs):
+        """set() for async callers, embedding off the event loop like aget()"""
+        if self.embed is None:
+            return self.set(*args, **kwargs)
+        return await asyncio.to_thread(self.set, *args, **kwargs)
+
+    def clear(self):
+        self._exact.clear()
+        self._semantic.clear()
+
+
+def _rag_embeddings():
+    """Embed with the knowledge-base embeddings, versioned by the collection"""
+    from api.services.rag_service import get_rag_service
+    rag_service = get_rag_service()
+    return rag_service._embed_query, lambda: rag_service.collection_version
+
+
+# Singleton pattern with lazy loading
+_llm_cache_instance = None
+
+def get_llm_cache() -> LLMResponseCache:
+    """Get or create the shared LLM response cache"""
+    global _llm_cache_instance
+    if _llm_cache_instance is None:
+        embed, embedding_version = _rag_embeddings() if LLM_SEMANTIC_CACHE else (None, None)
+        _llm_cache_instance = LLMResponseCache(
+            maxsize=LLM_CACHE_SIZE,
+            ttl=LLM_CACHE_TTL,
+            embed=embed,
+            embedding_version=embedding_version,
+            similarity_threshold=LLM_SEMANTIC_THRESHOLD
+        )
+    return _llm_cache_instance
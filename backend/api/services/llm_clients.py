@@ -0,0 +1,80 @@
+"""
+Shared Groq chat clients.
+
+ChatGroq instances are pooled by (model, temperature, max_tokens) and all of
+them share one pair of httpx clients, so LLMService and RAGService reuse the
+same keep-alive connections (and TLS sessions) to the Groq API.
+"""
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from langchain_groq import ChatGroq
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+_limits = httpx.Limits(
+    max_connections=int(os.getenv("GROQ_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.getenv("GROQ_MAX_KEEPALIVE", "10")),
+)
+_timeout = httpx.Timeout(60.0, connect=10.0)
+
+_lock = threading.Lock()
+_models: Dict[Tuple, ChatGroq] = {}
+_http_client: Optional[httpx.Client] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _shared_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    global _http_client, _http_async_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits, timeout=_timeout)
+    if _http_async_client is None:
+        _http_async_client = httpx.AsyncClient(limits=_limits, timeout=_timeout)
+    return _http_client, _http_async_client
+
+
+def get_chat_model(
+    api_key: str,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.7,
+    max_tokens: Optional[int] = None
+) -> ChatGroq:
+    """
+    Get the pooled ChatGroq client for these parameters, creating it on first use.
+
+    Args:
+        api_key: Groq API key
+        model: Groq model name
+        temperature: Sampling temperature
+        max_tokens: Completion token limit (None = model default)
+    """
+    key = (api_key, model, temperature, max_tokens)
+    with _lock:
+        llm = _models.get(key)
+        if llm is None:
+            http_client, http_async_client = _shared_http_clients()
+            llm = ChatGroq(
+                api_key=api_key,
+                model_name=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            _models[key] = llm
+        return llm
+
+
+async def aclose_llm_clients():
+    """Close the shared connections (called on application shutdown)"""
+    global _http_client, _http_async_client
+    with _lock:
+        _models.clear()
+        http_client, http_async_client = _http_client, _http_async_client
+        _http_client = _http_async_client = None
+    if http_async_client is not None:
+        await http_async_client.aclose()
+    if http_client is not None:
+        http_client.close()
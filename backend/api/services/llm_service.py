@@ -2,9 +2,10 @@
 LLM Service using LangChain with Groq
 """
 import os
-from typing import List, Dict, Optional
-from langchain_groq import ChatGroq
+from typing import AsyncIterator, List, Dict, Optional
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from api.services.llm_clients import get_chat_model
+from api.services.llm_cache import get_llm_cache
 
 
 class LLMService:
@@ -12,6 +13,7 @@ class LLMService:
     def __init__(self):
         self.api_key = os.getenv("GROQ_API_KEY")
         self._llm = None
+        self.cache = get_llm_cache()
 
     @property
     def llm(self):
@@ -19,52 +21,97 @@ class LLMService:
         if self._llm is None:
             if not self.api_key:
                 raise ValueError("GROQ_API_KEY not found in environment variables")
-            self._llm = ChatGroq(
-                api_key=self.api_key,
-                model_name="llama-3.3-70b-versatile",
-                temperature=0.7,
-                max_tokens=1024,
-            )
+            self._llm = get_chat_model(self.api_key, temperature=0.7, max_tokens=1024)
         return self._llm
     
-    async def generate_response(
-        self,
-        messages: List[Dict[str, str]],
-        system_prompt: Optional[str] = None,
-        temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
-    ) -> str:
+    def _llm_for(self, temperature: Optional[float] = None, max_tokens: Optional[int] = None):
+        """Default client, or the pooled one for overridden parameters"""
+        if temperature is None and max_tokens is None:
+            return self.llm
+        if not self.api_key:
+            raise ValueError("GROQ_API_KEY not found in environment variables")
+        return get_chat_model(
+            self.api_key,
+            temperature=temperature if temperature is not None else 0.7,
+            max_tokens=max_tokens if max_tokens is not None else 1024,
+        )
 
+    @staticmethod
+    def _to_langchain_messages(
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None
+    ) -> list:
         langchain_messages = []
-        
+
         if system_prompt:
             langchain_messages.append(SystemMessage(content=system_prompt))
-        
+
         for msg in messages:
             role = msg.get("role")
             content = msg.get("content", "")
-            
+
             if role == "user":
                 langchain_messages.append(HumanMessage(content=content))
             elif role == "assistant":
                 langchain_messages.append(AIMessage(content=content))
             elif role == "system":
                 langchain_messages.append(SystemMessage(content=content))
-        
+
+        return langchain_messages
+
+    async def generate_response(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: Optional[bool] = None
+    ) -> str:
+        """
+        Complete the conversation.
+
+        use_cache: None caches only deterministic calls (temperature 0),
+        True also caches sampled ones (the caller accepts repeated answers),
+        False never uses the cache.
+        """
+
+        langchain_messages = self._to_langchain_messages(messages, system_prompt)
+
         # Create LLM with optional overrides
-        llm = self.llm
-        if temperature is not None or max_tokens is not None:
-            llm = ChatGroq(
-                api_key=self.api_key,
-                model_name="llama-3.3-70b-versatile",
-                temperature=temperature if temperature is not None else 0.7,
-                max_tokens=max_tokens if max_tokens is not None else 1024,
-            )
+        llm = self._llm_for(temperature, max_tokens)
+
+        # Identical prompts (FAQ-style first questions) are answered from the cache
+        cache_messages = ([{"role": "system", "content": system_prompt}] if system_prompt else []) + list(messages)
+        params = {"temperature": llm.temperature, "max_tokens": llm.max_tokens}
+        allow_sampled = use_cache is True
+        if use_cache is not False:
+            cached = await self.cache.aget(llm.model_name, params, cache_messages, allow_sampled=allow_sampled)
+            if cached is not None:
+                return cached
 
         # Generate response
         response = await llm.ainvoke(langchain_messages)
+        if use_cache is not False:
+            usage = getattr(response, "usage_metadata", None) or {}
+            await self.cache.aset(llm.model_name, params, cache_messages, response.content, usage.get("total_tokens"),
+                           allow_sampled=allow_sampled)
         return response.content
 
+    async def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Yield the response text in pieces as the model produces it"""
+        langchain_messages = self._to_langchain_messages(messages, system_prompt)
+        llm = self._llm_for(temperature, max_tokens)
+
+        async for chunk in llm.astream(langchain_messages):
+            if chunk.content:
+                yield chunk.content
+
 
 # Singleton pattern with lazy loading
 _llm_service_instance = None
@@ -0,0 +1,226 @@
+"""
+Meal plan optimizer.
+
+Every meal of the week (7 days x breakfast, lunch, dinner) is a staple, a
+protein and a vegetable. Candidate meals, meaning all combinations of the best
+suited foods for each role, are scored together on a NumPy nutrient matrix:
+
+- portions are scaled so the meal hits its share of the daily kcal target
+- sodium and glycemic load over the limits for the patient's conditions,
+  and meals too high in fat or too low in protein, are penalized
+- foods already served that day or that week are penalized (diversity)
+- preferred and recommended foods get a small bonus
+
+Meals are picked greedily in order, so the diversity penalty sees the
+earlier picks. A plan takes a few milliseconds for a catalogue of a few
+hundred foods.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+# Share of the daily kcal target per meal (dinner lighter than lunch)
+MEAL_SHARES = {'breakfast': 0.3, 'lunch': 0.4, 'dinner': 0.3}
+
+ROLES = ('staple', 'protein', 'vegetable')
+# Portions (g) before scaling to the kcal target, and the scaling range
+BASE_PORTIONS = np.array([150.0, 80.0, 80.0])
+PORTION_SCALE = (0.5, 2.0)
+# Foods per role considered for each plan (CANDIDATES_PER_ROLE^3 candidate meals),
+# and at most this many preparations of one food ('Beans (boiled)', 'Beans (fried)')
+CANDIDATES_PER_ROLE = 16
+PREPARATIONS_PER_FOOD = 2
+
+# Daily sodium limits (mg)
+SODIUM_LIMIT = 2300
+SODIUM_LIMIT_HYPERTENSION = 1500
+# Glycemic load (GI x carbs / 100) allowed at lunch with diabetes; other meals by their share
+GLYCEMIC_LOAD_LIMIT = 20
+# GI assumed when a food has none recorded
+DEFAULT_GLYCEMIC_INDEX = 55
+# Share of meal energy from fat above which a meal is penalized, and the
+# protein share below which it is (older adults need more protein per kcal)
+FAT_ENERGY_LIMIT = 0.35
+PROTEIN_ENERGY_MIN = 0.15
+
+# Score weights
+KCAL_WEIGHT = 4.0
+SODIUM_WEIGHT = 2.0
+GLYCEMIC_WEIGHT = 2.0
+MACRO_WEIGHT = 2.0
+WEEK_REPEAT_WEIGHT = 0.3
+DAY_REPEAT_WEIGHT = 1.0
+PREFERRED_BONUS = 0.1
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fats', 'sodium')
+
+
+def food_role(category: Optional[str]) -> Optional[str]:
+    """Meal role for a food category ('Staples', 'protein', 'sauce', ...), None if not used"""
+    category = (category or '').lower()
+    if category.startswith(('staple', 'grain', 'cereal')):
+        return 'staple'
+    if category.startswith(('protein', 'legume', 'meat', 'fish', 'sauce')):
+        return 'protein'
+    if category.startswith('vegetable'):
+        return 'vegetable'
+    return None
+
+
+def _key(name: str) -> str:
+    return name.lower().strip().replace(' ', '_')
+
+
+def _base_name(name: str) -> str:
+    """Food without its preparation: 'Matooke (green banana) (boiled)' -> 'matooke'"""
+    return name.split(' (')[0].lower().strip()
+
+
+def _matches(food: Dict, keys: set) -> bool:
+    """Whether a preferred name appears in the food's name or local name ('beans' matches 'Beans (boiled)')"""
+    names = [_key(food['name']), _key(food.get('local_name') or '')]
+    return any(key in name for key in keys for name in names if key and name)
+
+
+def _display(name: str) -> str:
+    name = name.replace('_', ' ')
+    return name[:1].upper() + name[1:]
+
+
+def _round_portion(grams: float) -> int:
+    return int(round(grams / 10.0) * 10)
+
+
+class MealPlanOptimizer:
+    """
+    Weekly plan for one patient.
+
+    Args:
+        foods: Food rows with name, category and per-100g calories, protein,
+            carbs, fats and, when known, sodium and glycemic_index
+        conditions: Health conditions (diabetes and hypertension set limits)
+        preferred: Foods to favour (names, matched case-insensitively)
+    """
+
+    def __init__(self, foods: List[Dict], conditions: Iterable[str] = (), preferred: Iterable[str] = ()):
+        conditions = {c.lower() for c in conditions}
+        self.diabetes = 'diabetes' in conditions
+        self.sodium_limit = SODIUM_LIMIT_HYPERTENSION if 'hypertension' in conditions else SODIUM_LIMIT
+        preferred_keys = {_key(food) for food in preferred}
+
+        self.names: List[List[str]] = []
+        groups, nutrients, glycemic, bonus = [], [], [], []
+        for role in ROLES:
+            rows = [food for food in foods if food_role(food.get('category')) == role]
+            if not rows:
+                # A meal without this component
+                self.names.append([''])
+                groups.append(np.zeros(1, dtype=int))
+                nutrients.append(np.zeros((1, len(NUTRIENTS))))
+                glycemic.append(np.zeros(1))
+                bonus.append(np.zeros(1))
+                continue
+
+            matrix = np.array([[food.get(n) or 0.0 for n in NUTRIENTS] for food in rows], dtype=float)
+            gi = np.array([food.get('glycemic_index') or DEFAULT_GLYCEMIC_INDEX for food in rows], dtype=float)
+            liked = np.array([_matches(food, preferred_keys) for food in rows], dtype=float)
+            base_names = [_base_name(food['name']) for food in rows]
+            group = np.array([base_names.index(name) for name in base_names])
+
+            keep = self._shortlist(matrix, gi, liked, group)
+            self.names.append([rows[i]['name'] for i in keep])
+            groups.append(np.unique(group[keep], return_inverse=True)[1])
+            nutrients.append(matrix[keep])
+            glycemic.append(gi[keep])
+            bonus.append(liked[keep])
+
+        # Candidate meals: one food per role. idx[r][m] is meal m's food for role r,
+        # and meal_groups[r][m] that food without its preparation (for diversity)
+        sizes = [len(names) for names in self.names]
+        self.idx = [i.ravel() for i in np.meshgrid(*[np.arange(n) for n in sizes], indexing='ij')]
+        self.meal_groups = [groups[r][self.idx[r]] for r in range(len(ROLES))]
+        self.group_counts = [int(g.max()) + 1 for g in groups]
+
+        # Nutrients of each meal at the base portions
+        self.base = sum(BASE_PORTIONS[r] / 100 * nutrients[r][self.idx[r]] for r in range(len(ROLES)))
+        glycemic_load = [gi * nutrients[r][:, NUTRIENTS.index('carbs')] / 100 for r, gi in enumerate(glycemic)]
+        self.base_glycemic_load = sum(BASE_PORTIONS[r] / 100 * glycemic_load[r][self.idx[r]] for r in range(len(ROLES)))
+        self.bonus = sum(bonus[r][self.idx[r]] for r in range(len(ROLES)))
+
+        # Energy shares don't change with portion size, so the balance score is computed once
+        kcal = np.maximum(self.base[:, NUTRIENTS.index('calories')], 1.0)
+        fat_share = 9 * self.base[:, NUTRIENTS.index('fats')] / kcal
+        protein_share = 4 * self.base[:, NUTRIENTS.index('protein')] / kcal
+        self.balance = (np.maximum(fat_share - FAT_ENERGY_LIMIT, 0) / FAT_ENERGY_LIMIT
+                        + np.maximum(PROTEIN_ENERGY_MIN - protein_share, 0) / PROTEIN_ENERGY_MIN)
+
+    def _shortlist(self, matrix: np.ndarray, gi: np.ndarray, liked: np.ndarray, group: np.ndarray) -> np.ndarray:
+        """Indices of the CANDIDATES_PER_ROLE best suited foods for one role"""
+        suitability = liked.copy()
+        suitability -= matrix[:, NUTRIENTS.index('sodium')] / self.sodium_limit * 10
+        if self.diabetes:
+            suitability -= gi * matrix[:, NUTRIENTS.index('carbs')] / 100 / GLYCEMIC_LOAD_LIMIT
+        order = np.argsort(-suitability, kind='stable')
+
+        keep, taken = [], {}
+        for i in order:
+            if taken.get(group[i], 0) < PREPARATIONS_PER_FOOD:
+                taken[group[i]] = taken.get(group[i], 0) + 1
+                keep.append(i)
+                if len(keep) == CANDIDATES_PER_ROLE:
+                    break
+        return np.array(keep)
+
+    def _meal_scores(self, target_kcal: float, share: float):
+        """Portion scale and condition score of every candidate meal for one meal slot"""
+        base_kcal = self.base[:, NUTRIENTS.index('calories')]
+        scale = np.clip(target_kcal / np.maximum(base_kcal, 1.0), *PORTION_SCALE)
+
+        score = KCAL_WEIGHT * np.abs(scale * base_kcal - target_kcal) / target_kcal
+        sodium_limit = self.sodium_limit * share
+        score += SODIUM_WEIGHT * np.maximum(scale * self.base[:, NUTRIENTS.index('sodium')] - sodium_limit, 0) / sodium_limit
+        if self.diabetes:
+            load_limit = GLYCEMIC_LOAD_LIMIT * share / MEAL_SHARES['lunch']
+            score += GLYCEMIC_WEIGHT * np.maximum(scale * self.base_glycemic_load - load_limit, 0) / load_limit
+        score += MACRO_WEIGHT * self.balance
+        score -= PREFERRED_BONUS * self.bonus
+        return scale, score
+
+    def plan(self, daily_calories: float) -> Dict:
+        """
+        Returns:
+            {'meal_plan': {day: {'breakfast', 'lunch', 'dinner': description,
+            'totals': daily nutrients}}, 'quantities': {food: grams for the week}}
+        """
+        slots = {meal: self._meal_scores(daily_calories * share, share) for meal, share in MEAL_SHARES.items()}
+        week_uses = [np.zeros(n) for n in self.group_counts]
+
+        meal_plan, quantities = {}, {}
+        for day in DAYS:
+            day_uses = [np.zeros(n) for n in self.group_counts]
+            totals = np.zeros(len(NUTRIENTS))
+            meals = {}
+            for meal, (scale, score) in slots.items():
+                repeats = sum(WEEK_REPEAT_WEIGHT * week_uses[r][self.meal_groups[r]]
+                              + DAY_REPEAT_WEIGHT * day_uses[r][self.meal_groups[r]] for r in range(len(ROLES)))
+                best = int(np.argmin(score + repeats))
+
+                parts = []
+                for r in range(len(ROLES)):
+                    food = self.idx[r][best]
+                    name = self.names[r][food]
+                    if not name:
+                        continue
+                    week_uses[r][self.meal_groups[r][best]] += 1
+                    day_uses[r][self.meal_groups[r][best]] += 1
+                    grams = _round_portion(BASE_PORTIONS[r] * scale[best])
+                    quantities[name] = quantities.get(name, 0) + grams
+                    parts.append(f"{_display(name) if not parts else name.replace('_', ' ')} ({grams} g)")
+                meals[meal] = f"{', '.join(parts[:-1])} and {parts[-1]}" if len(parts) > 1 else ''.join(parts)
+                totals += scale[best] * self.base[best]
+
+            meals['totals'] = {n: int(round(v)) for n, v in zip(NUTRIENTS, totals)}
+            meal_plan[day] = meals
+
+        return {'meal_plan': meal_plan, 'quantities': quantities}
@@ -1,16 +1,32 @@
 """
 Meal Plan Generation Service using ML Models
 """
+import hashlib
+import json
 import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, List, Optional
 from datetime import datetime
+import numpy as np
 from sqlalchemy.orm import Session
 from api.models.loader import ModelLoader
-from api.models.food import FoodDB
-from api.models.database import get_db
+from api.routers.metrics import meal_plan_cache_lookups
+from api.services.cache import LRUCache
+from api.services.dedup import normalize_text
+from api.services.food_catalog import FoodSnapshot, get_food_catalog
+from api.services.meal_optimizer import MealPlanOptimizer
 
 logger = logging.getLogger(__name__)
 
+# Generated plans are reused for identical inputs (MEAL_PLAN_CACHE_TTL=0 disables it)
+MEAL_PLAN_CACHE_TTL = float(os.getenv("MEAL_PLAN_CACHE_TTL", "3600"))
+MEAL_PLAN_CACHE_SIZE = int(os.getenv("MEAL_PLAN_CACHE_SIZE", "512"))
+# Threads optimizing the plans of a batch (care home) request
+MEAL_PLAN_BATCH_WORKERS = int(os.getenv("MEAL_PLAN_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
 
 class MealPlanService:
     """Generate personalized meal plans using ML models"""
@@ -19,57 +35,45 @@ class MealPlanService:
         self.model_loader = model_loader
         self.db = db
 
+        # Plans by inputs (without patient details), and issued plans by id for PDF downloads
+        self._plans = LRUCache(maxsize=MEAL_PLAN_CACHE_SIZE, ttl=MEAL_PLAN_CACHE_TTL)
+        self._issued = LRUCache(maxsize=MEAL_PLAN_CACHE_SIZE * 4, ttl=MEAL_PLAN_CACHE_TTL)
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=MEAL_PLAN_BATCH_WORKERS, thread_name_prefix="meal-plan")
+
         # Fallback food database (used if DB is empty)
         self.fallback_foods_db = {
-            'matooke': {'calories': 122, 'category': 'staple', 'protein': 1.3, 'carbs': 31},
-            'beans': {'calories': 127, 'category': 'protein', 'protein': 8.7, 'carbs': 22.8},
-            'nakati': {'calories': 23, 'category': 'vegetable', 'protein': 2.6, 'carbs': 3.7},
-            'posho': {'calories': 96, 'category': 'staple', 'protein': 2, 'carbs': 21},
-            'cassava': {'calories': 160, 'category': 'staple', 'protein': 1.4, 'carbs': 38},
-            'sweet_potatoes': {'calories': 86, 'category': 'staple', 'protein': 1.6, 'carbs': 20},
-            'groundnuts': {'calories': 567, 'category': 'protein', 'protein': 25.8, 'carbs': 16.1},
-            'fish': {'calories': 206, 'category': 'protein', 'protein': 22, 'carbs': 0},
-            'sukuma_wiki': {'calories': 50, 'category': 'vegetable', 'protein': 4.3, 'carbs': 10},
-            'g_nut_sauce': {'calories': 188, 'category': 'sauce', 'protein': 7.6, 'carbs': 7.2},
+            'matooke': {'calories': 122, 'category': 'staple', 'protein': 1.3, 'carbs': 31, 'fats': 0.4, 'sodium': 4, 'glycemic_index': 55},
+            'beans': {'calories': 127, 'category': 'protein', 'protein': 8.7, 'carbs': 22.8, 'fats': 0.5, 'sodium': 2, 'glycemic_index': 29},
+            'nakati': {'calories': 23, 'category': 'vegetable', 'protein': 2.6, 'carbs': 3.7, 'fats': 0.3, 'sodium': 20, 'glycemic_index': 15},
+            'posho': {'calories': 96, 'category': 'staple', 'protein': 2, 'carbs': 21, 'fats': 0.5, 'sodium': 1, 'glycemic_index': 70},
+            'cassava': {'calories': 160, 'category': 'staple', 'protein': 1.4, 'carbs': 38, 'fats': 0.3, 'sodium': 14, 'glycemic_index': 46},
+            'sweet_potatoes': {'calories': 86, 'category': 'staple', 'protein': 1.6, 'carbs': 20, 'fats': 0.1, 'sodium': 27, 'glycemic_index': 63},
+            'groundnuts': {'calories': 567, 'category': 'protein', 'protein': 25.8, 'carbs': 16.1, 'fats': 49, 'sodium': 18, 'glycemic_index': 14},
+            'fish': {'calories': 206, 'category': 'protein', 'protein': 22, 'carbs': 0, 'fats': 12, 'sodium': 60, 'glycemic_index': 0},
+            'sukuma_wiki': {'calories': 50, 'category': 'vegetable', 'protein': 4.3, 'carbs': 10, 'fats': 0.6, 'sodium': 43, 'glycemic_index': 15},
+            'g_nut_sauce': {'calories': 188, 'category': 'sauce', 'protein': 7.6, 'carbs': 7.2, 'fats': 14, 'sodium': 250, 'glycemic_index': 14},
         }
 
-    def _get_db_session(self) -> Session:
-        """Get database session"""
-        if self.db is None:
-            return next(get_db())
-        return self.db
-
-    def _get_foods_from_db(self, conditions: List[str]) -> List[Dict]:
-        """Get foods from database based on conditions"""
+    def _get_catalog_foods(self, conditions: List[str], catalog: Optional[FoodSnapshot] = None) -> List[Dict]:
+        """Get foods suited to the conditions from the in-memory food catalog"""
         try:
-            db = self._get_db_session()
-            query = db.query(FoodDB)
+            if catalog is None:
+                catalog = get_food_catalog().snapshot(self.db)
+            lowered = [c.lower() for c in conditions]
 
             # Filter by health conditions
-            if 'diabetes' in [c.lower() for c in conditions]:
-                query = query.filter(FoodDB.is_diabetic_friendly == True)
-            if 'hypertension' in [c.lower() for c in conditions]:
-                query = query.filter(FoodDB.is_hypertension_friendly == True)
-
-            foods = query.limit(20).all()
+            matches = catalog.filter(
+                diabetic_friendly=True if 'diabetes' in lowered else None,
+                hypertension_friendly=True if 'hypertension' in lowered else None
+            )
 
-            if not foods:
+            if len(matches) == 0:
                 logger.warning("No foods found in database, using fallback")
                 return []
 
-            # Convert to dict format
-            return [
-                {
-                    'name': food.name,
-                    'local_name': food.local_name,
-                    'category': food.category,
-                    'calories': food.calories,
-                    'protein': food.protein,
-                    'carbs': food.carbs,
-                    'fats': food.fats
-                }
-                for food in foods
-            ]
+            return catalog.rows(matches)
 
         except Exception as e:
             logger.error(f"Failed to get foods from database: {e}")
@@ -80,51 +84,205 @@ class MealPlanService:
         age: int,
         health_conditions: List[str],
         preferred_foods: List[str],
-        name: str = "Patient"
+        name: str = "Patient",
+        owner: Optional[int] = None,
+        *,
+        caloric_needs: Optional[int] = None,
+        catalog: Optional[FoodSnapshot] = None
     ) -> Dict:
         """
         Generate a 7-day meal plan using ML models
 
+        Identical requests (same age, conditions and preferred foods, with the
+        same models and food catalog) reuse the cached plan, and concurrent
+        identical requests share one generation.
+
         Args:
             age: Patient age
             health_conditions: List of conditions (e.g., ['diabetes', 'hypertension'])
             preferred_foods: List of preferred foods
             name: Patient name
+            owner: User id allowed to fetch the plan again with get_plan()
+            caloric_needs: Daily kcal already predicted for this patient (batches)
+            catalog: Food catalog snapshot to plan from (batches share one)
+
+        Returns:
+            Dict with meal plan, shopping list, tips and a plan_id
+        """
+        if MEAL_PLAN_CACHE_TTL <= 0:
+            plan = self._generate(age, health_conditions, preferred_foods, caloric_needs, catalog)
+        else:
+            # The cache key and the plan come from the same catalog snapshot
+            if catalog is None:
+                try:
+                    catalog = get_food_catalog().snapshot(self.db)
+                except Exception as e:
+                    logger.error(f"Failed to load food catalog: {e}")
+            key = self.plan_key(age, health_conditions, preferred_foods, catalog)
+            plan = self._cached_plan(key, age, health_conditions, preferred_foods, caloric_needs, catalog)
+
+        if not plan['success']:
+            return plan
+
+        plan_id = uuid.uuid4().hex
+        result = {**plan, 'patient_name': name, 'plan_id': plan_id}
+        self._issued.set(plan_id, (owner, result))
+        return result
+
+    def generate_meal_plans(self, patients: List[Dict], owner: Optional[int] = None) -> List[Dict]:
+        """
+        Plans for many patients at once (a care home's residents).
+
+        Caloric needs are predicted for everyone in one model call, all plans
+        are made from one food catalog snapshot, and the per-patient
+        optimization runs on MEAL_PLAN_BATCH_WORKERS threads. Patients with
+        identical inputs share a generation like single requests do.
+
+        Args:
+            patients: Dicts with age, health_conditions, preferred_foods and name
+            owner: User id allowed to fetch the plans again with get_plan()
 
         Returns:
-            Dict with meal plan, shopping list, and tips
+            One generate_meal_plan() result per patient, in order
         """
+        if not patients:
+            return []
+
+        caloric_needs = self._calculate_caloric_needs_batch(
+            [p['age'] for p in patients],
+            [p.get('health_conditions', []) for p in patients]
+        )
         try:
-            # 1. Calculate caloric needs using ML model
-            caloric_needs = self._calculate_caloric_needs(age, health_conditions)
+            catalog = get_food_catalog().snapshot(self.db)
+        except Exception as e:
+            logger.error(f"Failed to load food catalog: {e}")
+            catalog = None
+
+        futures = [
+            self._executor.submit(
+                self.generate_meal_plan,
+                patient['age'],
+                patient.get('health_conditions', []),
+                patient.get('preferred_foods', []),
+                patient.get('name', 'Patient'),
+                owner,
+                caloric_needs=kcal,
+                catalog=catalog
+            )
+            for patient, kcal in zip(patients, caloric_needs)
+        ]
+        return [future.result() for future in futures]
+
+    def get_plan(self, plan_id: str, owner: Optional[int] = None) -> Optional[Dict]:
+        """A plan returned earlier by generate_meal_plan(), if still cached and issued to owner"""
+        entry = self._issued.get(plan_id)
+        if entry is None or entry[0] != owner:
+            return None
+        return entry[1]
+
+    def plan_key(
+        self,
+        age: int,
+        health_conditions: List[str],
+        preferred_foods: List[str],
+        catalog: Optional[FoodSnapshot] = None
+    ) -> str:
+        """Cache key: normalized inputs plus the models and food catalog (snapshot contents) that shape the plan"""
+        models = self.model_loader.get_available_models()
+        payload = {
+            'age': age,
+            'conditions': sorted({normalize_text(c) for c in health_conditions}),
+            'foods': sorted({normalize_text(f) for f in preferred_foods}),
+            'models': {key: [info.get('available'), info.get('type')] for key, info in models.items()},
+            'catalog': catalog.fingerprint if catalog is not None else None,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _cached_plan(self, key: str, *args) -> Dict:
+        plan = self._plans.get(key)
+        if plan is not None:
+            meal_plan_cache_lookups.labels(result="hit").inc()
+            return plan
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            meal_plan_cache_lookups.labels(result="shared").inc()
+            return future.result()
+
+        meal_plan_cache_lookups.labels(result="miss").inc()
+        try:
+            plan = self._generate(*args)
+            if plan['success']:
+                self._plans.set(key, plan)
+            future.set_result(plan)
+            return plan
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def model_used(self) -> str:
+        """Which model estimated the caloric needs"""
+        models = self.model_loader.get_available_models()
+        if models.get('huggingface', {}).get('available'):
+            return 'HuggingFace Ensemble (Online)'
+        elif models.get('local_xgboost', {}).get('available'):
+            return 'XGBoost (Local)'
+        return 'Fallback Model'
+
+    def _generate(
+        self,
+        age: int,
+        health_conditions: List[str],
+        preferred_foods: List[str],
+        caloric_needs: Optional[int] = None,
+        catalog: Optional[FoodSnapshot] = None
+    ) -> Dict:
+        """Generate a plan without patient details (shared by identical requests)"""
+        try:
+            # 1. Calculate caloric needs using ML model (unless predicted with the batch)
+            if caloric_needs is None:
+                caloric_needs = self._calculate_caloric_needs(age, health_conditions)
 
             # 2. Get food recommendations based on conditions
+            db_foods = self._get_catalog_foods(health_conditions, catalog)
             recommended_foods = self._get_food_recommendations(
                 health_conditions,
-                preferred_foods
+                preferred_foods,
+                db_foods,
+                catalog
             )
 
-            # 3. Generate 7-day meal plan
-            meal_plan = self._create_weekly_plan(
+            # 3. Optimize portions over the 7-day plan
+            plan = self._create_weekly_plan(
                 caloric_needs,
-                recommended_foods,
-                health_conditions
+                db_foods or self._fallback_food_rows(),
+                health_conditions,
+                preferred_foods + recommended_foods
             )
+            meal_plan = plan['meal_plan']
 
             # 4. Generate shopping list
-            shopping_list = self._generate_shopping_list(meal_plan)
+            shopping_list = self._generate_shopping_list(plan['quantities'])
 
             # 5. Generate health tips
             tips = self._generate_health_tips(health_conditions)
 
             return {
                 'success': True,
-                'patient_name': name,
                 'caloric_needs': caloric_needs,
                 'meal_plan': meal_plan,
                 'shopping_list': shopping_list,
                 'tips': tips,
-                'generated_at': datetime.now().isoformat()
+                'generated_at': datetime.now().isoformat(),
+                'model_used': self.model_used()
             }
 
         except Exception as e:
@@ -136,42 +294,47 @@ class MealPlanService:
 
     def _calculate_caloric_needs(self, age: int, conditions: List[str]) -> int:
         """Use ML model to calculate daily caloric needs"""
+        return self._calculate_caloric_needs_batch([age], [conditions])[0]
+
+    def _calculate_caloric_needs_batch(self, ages: List[int], conditions_list: List[List[str]]) -> List[int]:
+        """Daily caloric needs for many patients with a single model prediction"""
         try:
             # Prepare input for model
-            input_data = {
-                'age': age,
-                'has_diabetes': 1 if 'diabetes' in [c.lower() for c in conditions] else 0,
-                'has_hypertension': 1 if 'hypertension' in [c.lower() for c in conditions] else 0,
-                # Add default values for other required features
-            }
-
-            # Get prediction from model (HF -> XGBoost -> offline)
-            result = self.model_loader.predict(input_data, model_preference='auto')
+            inputs = []
+            for age, conditions in zip(ages, conditions_list):
+                lowered = [c.lower() for c in conditions]
+                inputs.append({
+                    'age': age,
+                    'has_diabetes': 1 if 'diabetes' in lowered else 0,
+                    'has_hypertension': 1 if 'hypertension' in lowered else 0,
+                    # Add default values for other required features
+                })
+
+            # Get predictions from model (HF -> XGBoost -> offline)
+            result = self.model_loader.predict_batch(inputs, model_preference='auto')
 
             if result['success']:
-                return int(result['prediction']['caloric_needs'])
+                return [int(kcal) for kcal in result['predictions']]
             else:
                 # Fallback calculation
-                return self._fallback_caloric_calculation(age)
+                return self._fallback_caloric_calculation(ages)
 
         except Exception as e:
             logger.warning(f"Model prediction failed, using fallback: {e}")
-            return self._fallback_caloric_calculation(age)
+            return self._fallback_caloric_calculation(ages)
 
-    def _fallback_caloric_calculation(self, age: int) -> int:
+    def _fallback_caloric_calculation(self, ages: List[int]) -> List[int]:
         """Simple fallback caloric calculation"""
         # Elderly baseline: 1600-2000 kcal/day
-        if age >= 80:
-            return 1600
-        elif age >= 70:
-            return 1800
-        else:
-            return 2000
+        ages = np.asarray(ages)
+        return np.select([ages >= 80, ages >= 70], [1600, 1800], default=2000).tolist()
 
     def _get_food_recommendations(
         self,
         conditions: List[str],
-        preferred: List[str]
+        preferred: List[str],
+        db_foods: Optional[List[Dict]] = None,
+        catalog: Optional[FoodSnapshot] = None
     ) -> List[str]:
         """Get food recommendations using ensemble ML models"""
         
@@ -219,17 +382,25 @@ class MealPlanService:
             logger.error(f"Error using ensemble models for recommendations: {e}")
         
         # Fallback: Try database first
-        db_foods = self._get_foods_from_db(conditions)
+        if db_foods is None:
+            db_foods = self._get_catalog_foods(conditions, catalog)
 
         if db_foods:
-            # Use database foods
-            recommended = [food['name'].lower().replace(' ', '_') for food in db_foods[:8]]
-
-            # Add preferred foods if mentioned
+            # Preferred foods first, by their catalog name when known
+            # ("posho" -> "Posho (maize meal)"), then database foods
+            if catalog is None:
+                catalog = get_food_catalog().snapshot(self.db)
+            recommended = []
             for food in preferred:
-                food_lower = food.lower().strip()
-                if food_lower not in recommended:
-                    recommended.append(food_lower)
+                match = catalog.find(food)
+                food_key = (match['name'] if match else food).lower().strip().replace(' ', '_')
+                if food_key not in recommended:
+                    recommended.append(food_key)
+
+            for food in db_foods:
+                food_key = food['name'].lower().replace(' ', '_')
+                if food_key not in recommended:
+                    recommended.append(food_key)
 
             return recommended[:8]
 
@@ -262,78 +433,31 @@ class MealPlanService:
 
         return recommended[:8]  # Return top 8 foods
 
+    def _fallback_food_rows(self) -> List[Dict]:
+        """Fallback food database as food rows"""
+        return [{'name': name, **values} for name, values in self.fallback_foods_db.items()]
+
     def _create_weekly_plan(
         self,
         daily_calories: int,
-        foods: List[str],
-        conditions: List[str]
+        foods: List[Dict],
+        conditions: List[str],
+        preferred: List[str]
     ) -> Dict:
-        """Create 7-day meal plan"""
-        has_diabetes = 'diabetes' in [c.lower() for c in conditions]
-
-        # Meal templates
-        meal_plan = {}
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-
-        for i, day in enumerate(days):
-            meal_plan[day] = self._generate_day_meals(foods, has_diabetes, i)
-
-        return meal_plan
-
-    def _generate_day_meals(self, foods: List[str], has_diabetes: bool, day_index: int) -> Dict:
-        """Generate meals for one day"""
-        # Rotate foods across the week
-        primary_staple = foods[day_index % len(foods)] if foods else 'matooke'
-
-        # Breakfast templates
-        breakfasts = [
-            f"Sweet potatoes with beans",
-            f"Porridge (millet) with groundnuts",
-            f"Cassava with g-nut sauce",
-        ]
-
-        # Lunch templates
-        lunches = [
-            f"Steamed {primary_staple} with beans and nakati",
-            f"{primary_staple.capitalize()} with fish and sukuma wiki",
-            f"Beans with {primary_staple} and steamed vegetables",
-        ]
-
-        # Dinner templates (lighter)
-        dinners = [
-            f"Light soup with vegetables and small portion of {primary_staple}",
-            f"Steamed fish with nakati",
-            f"Bean stew with vegetables",
-        ]
-
-        return {
-            'breakfast': breakfasts[day_index % len(breakfasts)],
-            'lunch': lunches[day_index % len(lunches)],
-            'dinner': dinners[day_index % len(dinners)]
-        }
-
-    def _generate_shopping_list(self, meal_plan: Dict) -> List[str]:
-        """Generate shopping list from meal plan"""
-        items = set()
-
-        # Extract all foods mentioned in the meal plan
-        common_items = [
-            'Matooke (bunch)',
-            'Beans (2 kg)',
-            'Nakati (greens)',
-            'Sweet potatoes (2 kg)',
-            'Fish (fresh, 1 kg)',
-            'Sukuma wiki (greens)',
-            'Groundnuts (500g)',
-            'Cassava',
-            'Millet flour',
-            'Cooking oil',
-            'Salt (minimal for hypertension)',
-            'Onions',
-            'Tomatoes'
-        ]
-
-        return common_items
+        """Create 7-day meal plan with portions that meet the caloric and condition targets"""
+        optimizer = MealPlanOptimizer(foods, conditions, preferred)
+        return optimizer.plan(daily_calories)
+
+    def _generate_shopping_list(self, quantities: Dict[str, float]) -> List[str]:
+        """Generate shopping list from the week's portions"""
+        items = []
+        for name, grams in sorted(quantities.items(), key=lambda item: -item[1]):
+            amount = f"{grams / 1000:.1f} kg" if grams >= 1000 else f"{int(round(grams, -1))} g"
+            items.append(f"{name.replace('_', ' ').capitalize()} ({amount})")
+
+        # Cooking basics
+        items.extend(['Cooking oil', 'Salt (minimal for hypertension)', 'Onions', 'Tomatoes'])
+        return items
 
     def _generate_health_tips(self, conditions: List[str]) -> List[str]:
         """Generate health tips based on conditions"""
@@ -2,13 +2,57 @@
 RAG Service using LangChain, ChromaDB, and Tavily for internet search
 """
 import os
-from typing import List, Dict, Optional
-from langchain_groq import ChatGroq
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Dict, Optional
 from langchain_chroma import Chroma
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langgraph.prebuilt import create_react_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from api.services.dedup import SimHashIndex, chunk_id, normalize_text, simhash
+from api.services.bm25_index import BM25Index, SHARED_NAMESPACE, reciprocal_rank_fusion
+from api.services.cache import LRUCache
+from api.services.llm_clients import get_chat_model
+from api.services.llm_cache import get_llm_cache
+
+logger = logging.getLogger(__name__)
+
+# Chunks shorter than this are only deduplicated exactly; SimHash is too
+# coarse on a handful of words to call them near-duplicates
+MIN_NEAR_DUPLICATE_WORDS = 8
+
+# Chroma and the TF-IDF embeddings are synchronous; they run on a bounded
+# thread pool so they never block the event loop. The work is CPU-bound, so
+# more workers than cores only adds GIL contention.
+RAG_MAX_WORKERS = int(os.getenv("RAG_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Searches allowed in flight (running + queued) before callers wait
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "16"))
+# Emails of the users allowed to upload curated documents to the shared namespace
+RAG_SHARED_UPLOADERS = {
+    email.strip().lower() for email in os.getenv("RAG_SHARED_UPLOADERS", "").split(",") if email.strip()
+}
+
+
+def user_namespace(user_id: int) -> str:
+    """Knowledge-base partition holding one user's uploads"""
+    return f"user:{user_id}"
+
+
+def can_upload_shared(email: Optional[str]) -> bool:
+    """Whether a user may add documents to the shared namespace (RAG_SHARED_UPLOADERS)"""
+    return bool(email) and email.lower() in RAG_SHARED_UPLOADERS
+
+
+# Chat turns that carry no searchable content
+SKIP_RETRIEVAL_MESSAGES = {
+    "yes", "yes please", "no", "ok", "okay", "sure", "thanks", "thank you",
+    "hi", "hello", "hey", "good morning", "good afternoon", "good evening",
+    "go ahead", "please do", "proceed", "ready", "alright", "fine", "great",
+}
 
 class RAGService:
     """
@@ -26,6 +70,30 @@ class RAGService:
         self._tools = None
         self._agent_executor = None
         self._prompt = None
+        self._simhash_indexes = None
+        self._bm25_index = None
+
+        # Bumped on every upload; cached embeddings and results from an older
+        # version are stale (the TF-IDF vocabulary is refit on each upload)
+        self.collection_version = 0
+        self._query_cache = LRUCache(maxsize=256)
+
+        # Use in-memory storage for production (Render), persistent for local
+        self.is_production = bool(os.getenv("RENDER", "") or os.getenv("PRODUCTION", ""))
+        self.persist_directory = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+
+        self._executor = ThreadPoolExecutor(max_workers=RAG_MAX_WORKERS, thread_name_prefix="rag")
+        self._limiter = None
+        # Uploads refit the embeddings and rewrite the indexes; one at a time
+        self._write_lock = threading.Lock()
+
+    async def _run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a synchronous vector-store call on the RAG thread pool"""
+        if self._limiter is None:
+            self._limiter = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+        async with self._limiter:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
 
     @property
     def llm(self):
@@ -33,11 +101,9 @@ class RAGService:
         if self._llm is None:
             if not self.groq_api_key:
                 raise ValueError("GROQ_API_KEY not found in environment variables")
-            self._llm = ChatGroq(
-                api_key=self.groq_api_key,
-                model_name="llama-3.3-70b-versatile",
-                temperature=0.7,
-            )
+            # Deterministic: answers are grounded in the retrieved documents, and
+            # repeated questions are served from the LLM response cache
+            self._llm = get_chat_model(self.groq_api_key, temperature=0)
         return self._llm
 
     @property
@@ -52,11 +118,7 @@ class RAGService:
     def vector_store(self):
         """Lazy load the vector store"""
         if self._vector_store is None:
-            import os
-            # Use in-memory storage for production (Render), persistent for local
-            is_production = os.getenv("RENDER", "") or os.getenv("PRODUCTION", "")
-            
-            if is_production:
+            if self.is_production:
                 # In-memory mode for production (no persistent storage on Render)
                 import chromadb
                 client = chromadb.Client()
@@ -70,10 +132,50 @@ class RAGService:
                 self._vector_store = Chroma(
                     collection_name="mzeechakula_knowledge",
                     embedding_function=self.embeddings,
-                    persist_directory="./chroma_db"
+                    persist_directory=self.persist_directory
                 )
         return self._vector_store
 
+    def backfill_namespaces(self) -> int:
+        """
+        Move chunks uploaded before partitions existed into the shared
+        namespace (one-off migration, see scripts/migrate_rag_namespaces.py).
+        Until then the vector search skips them; keyword search already
+        treats them as shared.
+
+        Returns:
+            Number of chunks updated
+        """
+        stored = self.vector_store.get(include=["metadatas"])
+        ids, metadatas = [], []
+        for doc_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            metadata = metadata or {}
+            if "namespace" not in metadata:
+                ids.append(doc_id)
+                metadatas.append({**metadata, "namespace": SHARED_NAMESPACE})
+        if ids:
+            self._vector_store._collection.update(ids=ids, metadatas=metadatas)
+        return len(ids)
+
+    @property
+    def bm25_index(self) -> BM25Index:
+        """Lazy load the BM25 keyword index kept alongside the vector store"""
+        if self._bm25_index is None:
+            persist_path = None if self.is_production else os.path.join(self.persist_directory, "bm25_index.json")
+            self._bm25_index = BM25Index(persist_path=persist_path)
+
+            if len(self._bm25_index) == 0:
+                # Build from chunks uploaded before the keyword index existed
+                stored = self.vector_store.get(include=["documents", "metadatas"])
+                if stored.get("ids"):
+                    ids = [
+                        chunk_id(text, (metadata or {}).get("namespace", SHARED_NAMESPACE))
+                        for text, metadata in zip(stored["documents"], stored["metadatas"])
+                    ]
+                    self._bm25_index.add(ids, stored["documents"], stored["metadatas"])
+                    self._bm25_index.save()
+        return self._bm25_index
+
     @property
     def tools(self):
         """Lazy load the search tools"""
@@ -122,42 +224,194 @@ Be friendly, informative, and focus on practical nutrition guidance."""),
             )
         return self._agent_executor
     
-    def add_documents(self, texts: List[str], metadatas: Optional[List[Dict]] = None):
+    def simhash_index(self, namespace: str) -> SimHashIndex:
+        """SimHash fingerprints of the chunks already stored in a namespace"""
+        if self._simhash_indexes is None:
+            self._simhash_indexes = {}
+            stored = self.vector_store.get(include=["metadatas"])
+            for metadata in stored.get("metadatas") or []:
+                metadata = metadata or {}
+                fingerprint = metadata.get("simhash")
+                if fingerprint:
+                    stored_namespace = metadata.get("namespace", SHARED_NAMESPACE)
+                    self._simhash_indexes.setdefault(stored_namespace, SimHashIndex()).add(int(fingerprint, 16))
+        return self._simhash_indexes.setdefault(namespace, SimHashIndex())
+
+    def add_documents(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict]] = None,
+        namespace: str = SHARED_NAMESPACE
+    ) -> Dict[str, int]:
         """
-        Add documents to the vector store.
+        Add documents to the vector store, skipping duplicates.
+        
+        Chunk ids are content hashes, so exact re-uploads upsert in place;
+        lightly edited chunks are dropped by the SimHash near-duplicate check.
+        Both checks are scoped to the target namespace.
         
         Args:
             texts: List of text documents to add
             metadatas: Optional list of metadata dicts for each document
+            namespace: Knowledge-base partition (user_namespace(id) or the shared one)
+            
+        Returns:
+            Dict with 'added', 'duplicates' and 'near_duplicates' counts
         """
-        self.vector_store.add_texts(texts=texts, metadatas=metadatas)
+        with self._write_lock:
+            return self._add_documents(texts, metadatas or [{} for _ in texts], namespace)
+
+    async def aadd_documents(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict]] = None,
+        namespace: str = SHARED_NAMESPACE
+    ) -> Dict[str, int]:
+        """Non-blocking add_documents for async routes"""
+        return await self._run_blocking(self.add_documents, texts, metadatas, namespace)
+
+    def _add_documents(self, texts: List[str], metadatas: List[Dict], namespace: str) -> Dict[str, int]:
+        ids, new_texts, new_metadatas = [], [], []
+        seen = set()
+        duplicates = near_duplicates = 0
+
+        candidate_ids = [chunk_id(t, namespace) for t in texts]
+        existing_ids = set(self.vector_store.get(ids=candidate_ids, include=[])["ids"])
+        simhash_index = self.simhash_index(namespace)
+
+        for doc_id, text, metadata in zip(candidate_ids, texts, metadatas):
+            if doc_id in seen or doc_id in existing_ids:
+                duplicates += 1
+                continue
+            seen.add(doc_id)
+
+            fingerprint = simhash(text)
+            if len(normalize_text(text).split()) >= MIN_NEAR_DUPLICATE_WORDS:
+                if simhash_index.find_near_duplicate(fingerprint) is not None:
+                    near_duplicates += 1
+                    continue
+                simhash_index.add(fingerprint)
+
+            ids.append(doc_id)
+            new_texts.append(text)
+            new_metadatas.append({**metadata, "namespace": namespace, "simhash": f"{fingerprint:016x}"})
+
+        if new_texts:
+            # Chroma's add_texts upserts when ids are given
+            self.vector_store.add_texts(texts=new_texts, metadatas=new_metadatas, ids=ids)
+            self.bm25_index.add(ids, new_texts, new_metadatas)
+            self.bm25_index.save()
+            self.collection_version += 1
+            self._query_cache.clear()
+
+        return {
+            "added": len(new_texts),
+            "duplicates": duplicates,
+            "near_duplicates": near_duplicates,
+        }
     
-    async def search_knowledge_base(self, query: str, k: int = 3) -> List[Dict]:
+    def should_search(self, query: str, namespaces: Optional[List[str]] = None) -> bool:
+        """Cheap pre-filter: skip retrieval for confirmations, greetings and empty partitions"""
+        normalized = normalize_text(query).strip(" .!?,")
+        if not normalized or normalized in SKIP_RETRIEVAL_MESSAGES:
+            return False
+        if self._bm25_index is None:
+            # Not loaded yet; search_knowledge_base loads it off the event loop
+            return True
+        return self.bm25_index.count(namespaces or [SHARED_NAMESPACE]) > 0
+
+    def _embed_query(self, normalized_query: str) -> List[float]:
+        key = ("embedding", normalized_query, self.collection_version)
+        embedding = self._query_cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(normalized_query)
+            self._query_cache.set(key, embedding)
+        return embedding
+
+    async def search_knowledge_base(
+        self,
+        query: str,
+        k: int = 3,
+        namespaces: Optional[List[str]] = None
+    ) -> List[Dict]:
         """
         Search the knowledge base for relevant documents.
         
+        Runs vector similarity and BM25 keyword search and fuses the two
+        rankings with reciprocal-rank fusion. Both retrievers only look at the
+        requested partitions (the namespace filter is pushed into the Chroma
+        query). Query embeddings and results are cached until the next upload.
+        The synchronous Chroma/TF-IDF work runs on a bounded thread pool.
+        
         Args:
             query: Search query
             k: Number of results to return
+            namespaces: Partitions to search (default: the shared one only)
             
         Returns:
-            List of relevant documents with metadata
+            List of relevant documents with metadata and 'rrf_score', the
+            fused reciprocal-rank score (higher is better, unlike the Chroma
+            distance previously returned as 'score')
         """
-        results = self.vector_store.similarity_search_with_score(query, k=k)
+        namespaces = sorted(set(namespaces or [SHARED_NAMESPACE]))
+        normalized_query = normalize_text(query)
+        if self._bm25_index is None:
+            # First use opens Chroma and may rebuild the keyword index
+            await self._run_blocking(lambda: self.bm25_index)
+        if self.bm25_index.count(namespaces) == 0:
+            return []
+
+        key = ("results", normalized_query, k, tuple(namespaces), self.collection_version)
+        cached = self._query_cache.get(key)
+        if cached is None:
+            cached = await self._run_blocking(self._search, normalized_query, k, namespaces)
+            self._query_cache.set(key, cached)
+        return [dict(result) for result in cached]
+
+    def _search(self, normalized_query: str, k: int, namespaces: List[str]) -> List[Dict]:
+        """Synchronous hybrid search; runs on the RAG thread pool"""
+        # Over-fetch from each retriever so fusion has candidates to reorder
+        fetch_k = max(k * 3, 10)
+
+        documents = {}
+        vector_ranking = []
+        try:
+            embedding = self._embed_query(normalized_query)
+            vector_results = self.vector_store.similarity_search_by_vector_with_relevance_scores(
+                embedding,
+                k=fetch_k,
+                filter={"namespace": {"$in": namespaces}}
+            )
+        except Exception as e:
+            # e.g. the TF-IDF vocabulary isn't fitted yet after a restart; keyword results still apply
+            logger.warning(f"Vector search failed, using keyword results only: {e}")
+            vector_results = []
+        for doc, _ in vector_results:
+            # Collections populated before content-addressed ids may still hold copies
+            doc_id = chunk_id(doc.page_content, doc.metadata.get("namespace", SHARED_NAMESPACE))
+            if doc_id in documents:
+                continue
+            documents[doc_id] = {"content": doc.page_content, "metadata": doc.metadata}
+            vector_ranking.append(doc_id)
+
+        keyword_ranking = []
+        for doc_id, _ in self.bm25_index.search(normalized_query, k=fetch_k, namespaces=namespaces):
+            stored = self.bm25_index.documents[doc_id]
+            documents.setdefault(doc_id, {"content": stored["content"], "metadata": stored["metadata"]})
+            keyword_ranking.append(doc_id)
+
+        fused = reciprocal_rank_fusion([vector_ranking, keyword_ranking])
         return [
-            {
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "score": score
-            }
-            for doc, score in results
+            {**documents[doc_id], "rrf_score": score}
+            for doc_id, score in fused[:k]
         ]
     
     async def answer_query(
         self,
         query: str,
         chat_history: Optional[List[Dict[str, str]]] = None,
-        use_search: bool = True
+        use_search: bool = True,
+        namespaces: Optional[List[str]] = None
     ) -> Dict:
         """
         Answer a query using RAG with optional internet search.
@@ -166,12 +420,17 @@ Be friendly, informative, and focus on practical nutrition guidance."""),
             query: User query
             chat_history: Optional chat history
             use_search: Whether to use internet search
+            namespaces: Knowledge-base partitions to search (default: the shared one only)
             
         Returns:
             Dict with 'answer' and 'sources'
         """
         # Search knowledge base
-        kb_results = await self.search_knowledge_base(query)
+        kb_results = await self.search_knowledge_base(query, namespaces=namespaces)
+
+        # Repeated questions are answered from the shared LLM response cache
+        llm_cache = get_llm_cache()
+        params = {"temperature": self.llm.temperature, "max_tokens": self.llm.max_tokens}
         
         # If agent is available and search is enabled, use it
         if use_search and self.tools and self.agent_executor:
@@ -192,11 +451,15 @@ Provide accurate, helpful, and culturally relevant nutrition advice for elderly
             # Add current query
             messages.append(HumanMessage(content=query))
 
-            # Run agent - langgraph returns a state dict with 'messages'
-            result = await self.agent_executor.ainvoke({"messages": messages})
+            cache_messages = [{"role": m.type, "content": m.content} for m in messages]
+            last_message = await llm_cache.aget(f"agent:{self.llm.model_name}", params, cache_messages)
+            if last_message is None:
+                # Run agent - langgraph returns a state dict with 'messages'
+                result = await self.agent_executor.ainvoke({"messages": messages})
 
-            # Extract the last AI message
-            last_message = result["messages"][-1].content if result.get("messages") else query
+                # Extract the last AI message
+                last_message = result["messages"][-1].content if result.get("messages") else query
+                await llm_cache.aset(f"agent:{self.llm.model_name}", params, cache_messages, last_message)
 
             return {
                 "answer": last_message,
@@ -218,10 +481,16 @@ Question: {query}
 
 Answer:"""
             
-            response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+            cache_messages = [{"role": "user", "content": prompt}]
+            answer = await llm_cache.aget(self.llm.model_name, params, cache_messages)
+            if answer is None:
+                response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+                answer = response.content
+                usage = getattr(response, "usage_metadata", None) or {}
+                await llm_cache.aset(self.llm.model_name, params, cache_messages, answer, usage.get("total_tokens"))
             
             return {
-                "answer": response.content,
+                "answer": answer,
                 "sources": [
                     {"type": "knowledge_base", "content": doc["content"]} 
                     for doc in kb_results
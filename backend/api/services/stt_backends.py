@@ -0,0 +1,195 @@
+"""
+Speech-to-text backends used by VoiceService.
+
+- groq: Whisper large-v3-turbo on the Groq API (default)
+- local: faster-whisper (CTranslate2, int8 on CPU), which works offline.
+  Optional dependency: pip install faster-whisper
+"""
+import asyncio
+import io
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from groq import AsyncGroq
+
+from api.routers.metrics import stt_duration, stt_real_time_factor
+
+logger = logging.getLogger(__name__)
+
+# Groq transcriptions in flight per worker; further requests wait their turn
+VOICE_MAX_CONCURRENCY = int(os.getenv("VOICE_MAX_CONCURRENCY", "4"))
+
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base")
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+# Local transcriptions run one at a time by default: each one already uses
+# LOCAL_WHISPER_CPU_THREADS cores, and parallel runs only contend for them
+LOCAL_STT_WORKERS = int(os.getenv("LOCAL_STT_WORKERS", "1"))
+LOCAL_WHISPER_CPU_THREADS = int(os.getenv("LOCAL_WHISPER_CPU_THREADS", "0"))  # 0 = all cores
+# Requests allowed to wait for a local worker before new ones are refused
+LOCAL_STT_MAX_QUEUE = int(os.getenv("LOCAL_STT_MAX_QUEUE", "8"))
+
+
+class TranscriptionBusyError(Exception):
+    """The local transcription queue is full"""
+
+
+def _observe(backend: str, started: float, duration: Optional[float]):
+    elapsed = time.perf_counter() - started
+    stt_duration.labels(backend=backend).observe(elapsed)
+    if duration:
+        stt_real_time_factor.labels(backend=backend).observe(elapsed / duration)
+
+
+def _segments(segments) -> Optional[List[Dict]]:
+    """Timestamped segments as [{"start", "end", "text"}] (SDK objects or dicts)"""
+    if segments is None:
+        return None
+    result = []
+    for segment in segments:
+        get = segment.get if isinstance(segment, dict) else lambda key: getattr(segment, key)
+        result.append({"start": float(get("start")), "end": float(get("end")), "text": get("text").strip()})
+    return result
+
+
+class GroqWhisperBackend:
+    """Whisper on the Groq API"""
+
+    name = "groq"
+
+    def __init__(self, api_key: str, model: str = "whisper-large-v3-turbo"):
+        self.client = AsyncGroq(api_key=api_key)
+        self.model = model
+        self._limiter = None
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    async def transcribe(
+        self,
+        audio: bytes,
+        filename: str,
+        language: Optional[str] = None,
+        prompt: Optional[str] = None,
+        temperature: float = 0.0
+    ) -> Dict:
+        if self._limiter is None:
+            self._limiter = asyncio.Semaphore(VOICE_MAX_CONCURRENCY)
+
+        # The SDK accepts (filename, bytes) directly, and the async client
+        # keeps the event loop free while Whisper runs
+        async with self._limiter:
+            started = time.perf_counter()
+            transcription = await self.client.audio.transcriptions.create(
+                file=(filename, audio),
+                model=self.model,
+                language=language,
+                prompt=prompt,
+                temperature=temperature,
+                response_format="verbose_json"  # Get detailed response with metadata
+            )
+
+        duration = getattr(transcription, 'duration', None)
+        _observe(self.name, started, duration)
+        return {
+            "text": transcription.text,
+            "language": getattr(transcription, 'language', language),
+            "duration": duration,
+            "segments": _segments(getattr(transcription, 'segments', None)),
+        }
+
+
+class LocalWhisperBackend:
+    """
+    faster-whisper on CPU. Transcriptions run on a small dedicated thread
+    pool (the queue), so they neither block the event loop nor compete with
+    each other for cores.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_size: str = LOCAL_WHISPER_MODEL,
+        compute_type: str = LOCAL_WHISPER_COMPUTE_TYPE,
+        workers: int = LOCAL_STT_WORKERS,
+        max_queue: int = LOCAL_STT_MAX_QUEUE
+    ):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stt")
+        self._workers = workers
+        self._model = None
+        self._pending = 0
+
+    @property
+    def available(self) -> bool:
+        try:
+            import faster_whisper  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @property
+    def model(self):
+        """Lazy load the Whisper model (downloaded to the Hugging Face cache on first use)"""
+        if self._model is None:
+            from faster_whisper import WhisperModel
+            logger.info(f"Loading local Whisper model '{self.model_size}' ({self.compute_type})")
+            self._model = WhisperModel(
+                self.model_size,
+                device="cpu",
+                compute_type=self.compute_type,
+                cpu_threads=LOCAL_WHISPER_CPU_THREADS
+            )
+        return self._model
+
+    def _transcribe(self, audio, language, prompt, temperature) -> Dict:
+        segments, info = self.model.transcribe(
+            audio,
+            language=language,
+            initial_prompt=prompt,
+            temperature=temperature,
+            beam_size=1,  # greedy decoding; beam search costs ~2x on CPU for little gain on short clips
+            vad_filter=True
+        )
+        # segments is a generator: decoding happens while it is consumed
+        segments = _segments(segments)
+        text = " ".join(segment["text"] for segment in segments)
+        return {"text": text, "language": info.language, "duration": info.duration, "segments": segments}
+
+    async def _run(self, *args) -> Dict:
+        if self._pending >= self._workers + self.max_queue:
+            raise TranscriptionBusyError("Local transcription queue is full, try again shortly")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._transcribe, *args)
+        finally:
+            self._pending -= 1
+
+    async def transcribe(
+        self,
+        audio: bytes,
+        filename: str,
+        language: Optional[str] = None,
+        prompt: Optional[str] = None,
+        temperature: float = 0.0
+    ) -> Dict:
+        started = time.perf_counter()
+        # faster-whisper decodes any container PyAV can read from a file object
+        result = await self._run(io.BytesIO(audio), language, prompt, temperature)
+        _observe(self.name, started, result["duration"])
+        return result
+
+    async def warm_up(self):
+        """Load the model and run one second of silence through it"""
+        import numpy as np
+
+        started = time.perf_counter()
+        await self._run(np.zeros(16000, dtype=np.float32), "en", None, 0.0)
+        logger.info(f"Local Whisper model ready in {time.perf_counter() - started:.1f}s")
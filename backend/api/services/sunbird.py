@@ -2,13 +2,21 @@
 Sunbird AI Service for translation and language detection.
 Supports 200+ African languages via Sunflower model.
 """
+import hashlib
 import os
 import httpx
 import logging
 from typing import Optional, Dict, Any, List
+from api.routers.metrics import language_detection_lookups
+from api.services.cache import LRUCache
+from api.services.dedup import normalize_text
+from api.services.translation_memory import TranslationMemory, get_translation_memory
 
 logger = logging.getLogger(__name__)
 
+# Detections kept per worker, keyed by a hash of the normalized text
+LANGUAGE_DETECTION_CACHE_SIZE = int(os.getenv("LANGUAGE_DETECTION_CACHE_SIZE", "2048"))
+
 class SunbirdService:
 
     # Ugandan languages supported by Sunbird AI
@@ -77,16 +85,104 @@ class SunbirdService:
         "Portuguese": "por",
         "Afrikaans": "afr",
     }
+
+    # ISO-639-1 codes (as used by Whisper) of the languages above
+    ISO_639_1 = {
+        "en": "eng", "lg": "lug", "sw": "swh", "rw": "kin", "ki": "kik", "so": "som",
+        "yo": "yor", "ig": "ibo", "ha": "hau", "tw": "twi", "ak": "aka", "ee": "ewe",
+        "wo": "wol", "bm": "bam", "zu": "zul", "xh": "xho", "sn": "sna", "st": "sot",
+        "tn": "tsn", "ny": "nya", "ln": "lin", "ar": "ara", "am": "amh", "ti": "tir",
+        "om": "orm", "rn": "run", "kg": "kon", "ss": "ssw", "fr": "fra", "pt": "por",
+        "af": "afr",
+    }
     
-    def __init__(self):
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        memory: Optional[TranslationMemory] = None
+    ):
         self.api_key = os.getenv("SUNBIRD_API_KEY")
-        self.base_url = "https://api.sunbird.ai"
+        # Overridable so latency tests can point at a local stub server
+        self.base_url = os.getenv("SUNBIRD_BASE_URL", "https://api.sunbird.ai")
         self.headers = {
             "accept": "application/json",
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._memory = memory
+        self._detections = LRUCache(maxsize=LANGUAGE_DETECTION_CACHE_SIZE)
+
+    @property
+    def memory(self) -> TranslationMemory:
+        """Translation memory consulted before calling the API"""
+        if self._memory is None:
+            self._memory = get_translation_memory()
+        return self._memory
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = os.getenv("SUNBIRD_HTTP2", "true").lower() in ("1", "true", "yes")
+        if http2 and self._transport is None:
+            try:
+                import h2  # noqa: F401 (httpx needs it for HTTP/2)
+            except ImportError:
+                logger.info("h2 not installed, using HTTP/1.1 for Sunbird AI")
+                http2 = False
+
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            http2=http2 and self._transport is None,
+            transport=self._transport,
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("SUNBIRD_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("SUNBIRD_MAX_KEEPALIVE", "10")),
+                keepalive_expiry=float(os.getenv("SUNBIRD_KEEPALIVE_EXPIRY", "60")),
+            ),
+            timeout=httpx.Timeout(
+                float(os.getenv("SUNBIRD_TIMEOUT", "30")),
+                connect=float(os.getenv("SUNBIRD_CONNECT_TIMEOUT", "5")),
+            ),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Long-lived pooled client. Opened by start() in the app lifespan;
+        created on first use when running outside the app (scripts, tests).
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def start(self):
+        """Open the pooled client (application startup)"""
+        self.client
+
+    async def aclose(self):
+        """Close the pooled client and its connections (application shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
+    @classmethod
+    def to_sunbird_code(cls, language: Optional[str]) -> Optional[str]:
+        """
+        Sunbird code for a language given as a Sunbird code, an ISO-639-1
+        code or a name ("lug", "lg", "luganda"); None if unknown.
+        """
+        if not language:
+            return None
+        code = language.strip().lower()
+        if code in cls.LANGUAGE_CODES.values():
+            return code
+        return cls.ISO_639_1.get(code) or cls.LANGUAGE_CODES.get(code.title())
+
+    @staticmethod
+    def detection_key(text: str) -> str:
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
     async def detect_language(self, text: str) -> Dict[str, Any]:
         """
         Detect the language of the given text.
@@ -104,36 +200,41 @@ class SunbirdService:
                 "language_name": "English",
                 "confidence": 0.95
             }
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                payload = {"text": text}
-                
-                response = await client.post(
-                    f"{self.base_url}/tasks/language_id",
-                    json=payload,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                # Parse response and add language name
-                detected_code = result.get("language", "eng")
-                return {
-                    "language": detected_code,
-                    "language_name": self.UGANDAN_LANGUAGES.get(detected_code, "Unknown"),
-                    "confidence": result.get("confidence", 0.0)
-                }
-                
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Sunbird AI language detection error: {e.response.text}")
-                # Fallback to English
-                return {"language": "eng", "language_name": "English", "confidence": 0.0}
-            except Exception as e:
-                logger.error(f"Language detection error: {str(e)}")
-                return {"language": "eng", "language_name": "English", "confidence": 0.0}
+
+        # The same transcript is often detected for the response and again
+        # before translating it; serve repeats from the cache
+        key = self.detection_key(text)
+        cached = self._detections.get(key)
+        language_detection_lookups.labels(result="hit" if cached else "miss").inc()
+        if cached is not None:
+            return dict(cached)
+
+        try:
+            payload = {"text": text}
+            
+            response = await self.client.post("/tasks/language_id", json=payload)
+            
+            response.raise_for_status()
+            result = response.json()
+            
+            # Parse response and add language name
+            detected_code = result.get("language", "eng")
+            detection = {
+                "language": detected_code,
+                "language_name": self.UGANDAN_LANGUAGES.get(detected_code, "Unknown"),
+                "confidence": result.get("confidence", 0.0)
+            }
+            # Fallbacks below are not cached, so a failed call is retried next time
+            self._detections.set(key, detection)
+            return dict(detection)
+            
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Sunbird AI language detection error: {e.response.text}")
+            # Fallback to English
+            return {"language": "eng", "language_name": "English", "confidence": 0.0}
+        except Exception as e:
+            logger.error(f"Language detection error: {str(e)}")
+            return {"language": "eng", "language_name": "English", "confidence": 0.0}
     
     async def translate(
         self, 
@@ -150,48 +251,53 @@ class SunbirdService:
                 "target_language": target_lang
             }
         
-        # Auto-detect source language if not provided
+        # Auto-detect source language if not provided (reuses the pooled
+        # connection, so this no longer costs a second handshake)
         if not source_lang:
             detection = await self.detect_language(text)
             source_lang = detection["language"]
             logger.info(f"Auto-detected language: {detection['language_name']} ({source_lang})")
         
-        async with httpx.AsyncClient() as client:
-            try:
-                payload = {
-                    "source_language": source_lang,
-                    "target_language": target_lang,
-                    "text": text
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/tasks/nllb_translate",
-                    json=payload,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                result = response.json()
-
-                # Parse response - Sunbird can return {"output": "..."} or {"text": "..."}
-                translated = result.get("output") or result.get("text") or text
-
-                return {
-                    "translated_text": translated,
-                    "source_language": source_lang,
-                    "target_language": target_lang,
-                    "source_language_name": self.UGANDAN_LANGUAGES.get(source_lang, "Unknown"),
-                    "target_language_name": self.UGANDAN_LANGUAGES.get(target_lang, "Unknown")
-                }
-                
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Sunbird AI translation error: {e.response.text}")
-                raise Exception(f"Translation failed: {e.response.text}")
-            except Exception as e:
-                logger.error(f"Translation service error: {str(e)}")
-                raise
+        # Canned greetings, tips and list lines are usually already translated
+        remembered = await self.memory.lookup(source_lang, target_lang, text)
+        if remembered is not None:
+            return self._translation_result(remembered, source_lang, target_lang)
+
+        try:
+            payload = {
+                "source_language": source_lang,
+                "target_language": target_lang,
+                "text": text
+            }
+            
+            response = await self.client.post("/tasks/nllb_translate", json=payload)
+            
+            response.raise_for_status()
+            result = response.json()
+
+            # Parse response - Sunbird can return {"output": "..."} or {"text": "..."}
+            translated = result.get("output") or result.get("text") or text
+            if isinstance(translated, str) and translated.strip() and translated != text:
+                await self.memory.remember(source_lang, target_lang, text, translated)
+
+            return self._translation_result(translated, source_lang, target_lang)
+            
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Sunbird AI translation error: {e.response.text}")
+            raise Exception(f"Translation failed: {e.response.text}")
+        except Exception as e:
+            logger.error(f"Translation service error: {str(e)}")
+            raise
     
+    def _translation_result(self, translated: str, source_lang: str, target_lang: str) -> Dict[str, Any]:
+        return {
+            "translated_text": translated,
+            "source_language": source_lang,
+            "target_language": target_lang,
+            "source_language_name": self.UGANDAN_LANGUAGES.get(source_lang, "Unknown"),
+            "target_language_name": self.UGANDAN_LANGUAGES.get(target_lang, "Unknown")
+        }
+
     async def get_supported_languages(self) -> List[Dict[str, str]]:
      
         return [
@@ -0,0 +1,257 @@
+"""
+Translation memory for Sunbird AI translations.
+
+Entries are keyed by (source language, target language, normalized text).
+An in-process LRU sits in front of an optional persistent tier (SQLite or
+Redis), so canned greetings, health tips and shopping-list lines are
+translated once. Long responses are also matched line by line and sentence
+by sentence, so a reply assembled from known pieces needs no API call.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from api.services.cache import LRUCache
+from api.services.dedup import normalize_text
+from api.routers.metrics import translation_memory_lookups
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_MEMORY_SIZE = int(os.getenv("TRANSLATION_MEMORY_SIZE", "4096"))
+# none | sqlite | redis
+TRANSLATION_MEMORY_BACKEND = os.getenv("TRANSLATION_MEMORY_BACKEND", "none").lower()
+TRANSLATION_MEMORY_PATH = os.getenv("TRANSLATION_MEMORY_PATH", "./translation_memory.db")
+TRANSLATION_MEMORY_TTL = int(os.getenv("TRANSLATION_MEMORY_TTL", str(30 * 24 * 3600)))
+# Seconds between deletions of expired SQLite entries
+SQLITE_PURGE_INTERVAL = 3600
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_lines(text: str) -> List[str]:
+    return text.split("\n")
+
+
+def split_sentences(line: str) -> List[str]:
+    return [s for s in _SENTENCE_END_RE.split(line.strip()) if s]
+
+
+def _has_words(text: str) -> bool:
+    return any(c.isalpha() for c in text)
+
+
+class SQLiteTranslationStore:
+    """
+    Persistent tier in a local SQLite file (stdlib only); calls run in a thread.
+    Entries older than ttl seconds are not served (like Redis expiry) and are
+    deleted at most every SQLITE_PURGE_INTERVAL seconds.
+    """
+
+    def __init__(self, path: str, ttl: int = TRANSLATION_MEMORY_TTL):
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations "
+                "(key TEXT PRIMARY KEY, translated TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        self.purge()
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl if self.ttl > 0 else float("-inf")
+
+    def purge(self) -> int:
+        """Delete expired entries; returns how many"""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM translations WHERE created_at < ?", (self._cutoff(),)).rowcount
+            self._conn.commit()
+            self._purged_at = time.monotonic()
+        return deleted
+
+    def _get_many(self, keys: List[str]) -> Dict[str, str]:
+        with self._lock:
+            placeholders = ",".join("?" * len(keys))
+            rows = self._conn.execute(
+                f"SELECT key, translated FROM translations WHERE key IN ({placeholders}) AND created_at >= ?",
+                [*keys, self._cutoff()]
+            ).fetchall()
+        return dict(rows)
+
+    def _set_many(self, items: Dict[str, str]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, translated, created_at) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()]
+            )
+            self._conn.commit()
+        if time.monotonic() - self._purged_at > SQLITE_PURGE_INTERVAL:
+            self.purge()
+
+    async def get_many(self, keys: List[str]) -> Dict[str, str]:
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def set_many(self, items: Dict[str, str]):
+        await asyncio.to_thread(self._set_many, items)
+
+
+class RedisTranslationStore:
+    """Persistent tier shared between workers, via redis.asyncio"""
+
+    def __init__(self, url: str, ttl: int = TRANSLATION_MEMORY_TTL, prefix: str = "tm:"):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get_many(self, keys: List[str]) -> Dict[str, str]:
+        values = await self._redis.mget([self.prefix + key for key in keys])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, items: Dict[str, str]):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(self.prefix + key, value, ex=self.ttl)
+            await pipe.execute()
+
+
+class TranslationMemory:
+    """
+    Two-tier translation cache.
+
+    Args:
+        maxsize: Entries kept in the in-process LRU
+        store: Optional persistent tier (SQLiteTranslationStore / RedisTranslationStore)
+    """
+
+    def __init__(self, maxsize: int = 4096, store=None):
+        # Same lifetime as the persistent tiers, so one worker can't outlive their expiry
+        self._lru = LRUCache(maxsize=maxsize, ttl=TRANSLATION_MEMORY_TTL if TRANSLATION_MEMORY_TTL > 0 else None)
+        self.store = store
+
+    @staticmethod
+    def key(source_lang: str, target_lang: str, text: str) -> str:
+        raw = f"{source_lang}\x00{target_lang}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get_many(self, source_lang: str, target_lang: str, texts: Iterable[str]) -> Dict[str, str]:
+        """Cached translations for the texts that have one ({text: translation})"""
+        keyed: Dict[str, List[str]] = {}
+        for text in texts:
+            keyed.setdefault(self.key(source_lang, target_lang, text), []).append(text)
+
+        found = {}
+        missing = []
+        for key, variants in keyed.items():
+            value = self._lru.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found.update(dict.fromkeys(variants, value))
+
+        if missing and self.store is not None:
+            try:
+                stored = await self.store.get_many(missing)
+            except Exception as e:
+                logger.warning(f"Translation memory store lookup failed: {e}")
+                stored = {}
+            for key, value in stored.items():
+                self._lru.set(key, value)
+                found.update(dict.fromkeys(keyed[key], value))
+        return found
+
+    async def set_many(self, source_lang: str, target_lang: str, pairs: Dict[str, str]):
+        """Remember {text: translation} pairs in both tiers"""
+        items = {self.key(source_lang, target_lang, text): value for text, value in pairs.items()}
+        for key, value in items.items():
+            self._lru.set(key, value)
+        if items and self.store is not None:
+            try:
+                await self.store.set_many(items)
+            except Exception as e:
+                logger.warning(f"Translation memory store write failed: {e}")
+
+    async def lookup(self, source_lang: str, target_lang: str, text: str) -> Optional[str]:
+        """
+        Translate text from memory alone: the whole text, or every line
+        (falling back to every sentence of a line) from earlier translations.
+        Returns None if any piece is unknown.
+        """
+        lines = split_lines(text)
+        pieces = {text}
+        for line in lines:
+            if _has_words(line):
+                pieces.add(line.strip())
+                pieces.update(split_sentences(line))
+        found = await self.get_many(source_lang, target_lang, pieces)
+
+        if text in found:
+            translation_memory_lookups.labels(result="text").inc()
+            return found[text]
+
+        translated_lines = []
+        for line in lines:
+            if not _has_words(line):
+                translated_lines.append(line)
+                continue
+            indent = line[:len(line) - len(line.lstrip())]
+            if line.strip() in found:
+                translated_lines.append(indent + found[line.strip()])
+                continue
+            sentences = split_sentences(line)
+            if not all(s in found for s in sentences):
+                translation_memory_lookups.labels(result="miss").inc()
+                return None
+            translated_lines.append(indent + " ".join(found[s] for s in sentences))
+
+        translation_memory_lookups.labels(result="segments").inc()
+        return "\n".join(translated_lines)
+
+    async def remember(self, source_lang: str, target_lang: str, text: str, translated: str):
+        """
+        Store a translation and, where the output lines up with the input
+        (same number of lines, and of sentences within a line), its lines
+        and sentences too.
+        """
+        pairs = {text: translated}
+        source_lines, target_lines = split_lines(text), split_lines(translated)
+        if len(source_lines) > 1 and len(source_lines) == len(target_lines):
+            for source_line, target_line in zip(source_lines, target_lines):
+                if not _has_words(source_line) or not target_line.strip():
+                    continue
+                pairs[source_line.strip()] = target_line.strip()
+                source_sentences, target_sentences = split_sentences(source_line), split_sentences(target_line)
+                if len(source_sentences) > 1 and len(source_sentences) == len(target_sentences):
+                    pairs.update(zip(source_sentences, target_sentences))
+        await self.set_many(source_lang, target_lang, pairs)
+
+
+def _create_store():
+    try:
+        if TRANSLATION_MEMORY_BACKEND == "sqlite":
+            return SQLiteTranslationStore(TRANSLATION_MEMORY_PATH)
+        if TRANSLATION_MEMORY_BACKEND == "redis":
+            return RedisTranslationStore(os.getenv("REDIS_URL", "redis://localhost:6379"))
+    except Exception as e:
+        logger.warning(f"Translation memory '{TRANSLATION_MEMORY_BACKEND}' tier unavailable, using memory only: {e}")
+    return None
+
+
+# Singleton pattern with lazy loading
+_translation_memory_instance = None
+
+def get_translation_memory() -> TranslationMemory:
+    """Get or create the translation memory singleton instance"""
+    global _translation_memory_instance
+    if _translation_memory_instance is None:
+        _translation_memory_instance = TranslationMemory(TRANSLATION_MEMORY_SIZE, _create_store())
+    return _translation_memory_instance
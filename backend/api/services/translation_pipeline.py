@@ -0,0 +1,142 @@
+"""
+Segmented translation of long markdown responses.
+
+A meal plan (7 days x 3 meals, shopping list, tips) sent as one blob is a
+single slow Sunbird AI call. Here the text is split into short segments
+(one per line, or per sentence on long lines), markup and quantities such
+as "~1800 kcal" are kept out of the segments, and the segments are
+translated concurrently and put back in their original places.
+"""
+import asyncio
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from api.routers.metrics import translation_segments
+from api.services.sunbird import SunbirdService, sunbird_service
+from api.services.translation_memory import split_sentences
+
+logger = logging.getLogger(__name__)
+
+# Segments in flight per response; stays below SUNBIRD_MAX_CONNECTIONS
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "8"))
+# Extra attempts per segment before it is left untranslated
+TRANSLATION_SEGMENT_RETRIES = int(os.getenv("TRANSLATION_SEGMENT_RETRIES", "2"))
+TRANSLATION_RETRY_BACKOFF = float(os.getenv("TRANSLATION_RETRY_BACKOFF", "0.25"))
+
+_QUANTITY = r"[~≈]?\d[\d,.]*\s*(?:kcal|cal|kg|mg|ml|g|l|%)?"
+# List markers, headings, quotes and emphasis before the text
+_LEADING_RE = re.compile(r"^(?:\s+|#{1,6}\s|[-*+]\s|\d+[.)]\s|>\s?|[*_`|])*")
+# Emphasis, colons and quantities after the text
+_TRAILING_RE = re.compile(rf"(?:\s+|[*_`|:]|\(?{_QUANTITY}\)?)*$")
+# Energy values inside a line, e.g. "Posho (350 kcal) with beans"
+_INLINE_ENERGY_RE = re.compile(r"\s*\(?[~≈]?\d[\d,.]*\s*k?cal\)?\s*")
+
+Segment = Tuple[str, bool]
+
+
+class TranslationFailedError(Exception):
+    """No segment of the response could be translated"""
+
+
+def _has_words(text: str) -> bool:
+    return any(c.isalpha() for c in text)
+
+
+def _split_line(line: str) -> List[Segment]:
+    if not _has_words(line):
+        return [(line, False)]
+
+    lead = _LEADING_RE.match(line).end()
+    trail = lead + _TRAILING_RE.search(line[lead:]).start()
+    core = line[lead:trail]
+    if not _has_words(core):
+        return [(line, False)]
+
+    segments: List[Segment] = [(line[:lead], False)]
+    position = 0
+    for match in _INLINE_ENERGY_RE.finditer(core):
+        segments.extend(_split_text(core[position:match.start()]))
+        segments.append((match.group(), False))
+        position = match.end()
+    segments.extend(_split_text(core[position:]))
+    segments.append((line[trail:], False))
+    return [s for s in segments if s[0]]
+
+
+def _split_text(text: str) -> List[Segment]:
+    if not _has_words(text):
+        return [(text, False)]
+    sentences = split_sentences(text)
+    segments: List[Segment] = []
+    for i, sentence in enumerate(sentences):
+        if i:
+            segments.append((" ", False))
+        segments.append((sentence, True))
+    return segments
+
+
+def segment_markdown(text: str) -> List[Segment]:
+    """
+    Split markdown into (text, translatable) segments. Joining the texts
+    gives back the input (apart from whitespace between sentences).
+    """
+    segments: List[Segment] = []
+    for i, line in enumerate(text.split("\n")):
+        if i:
+            segments.append(("\n", False))
+        segments.extend(_split_line(line))
+    return segments
+
+
+async def translate_markdown(
+    text: str,
+    source_lang: str,
+    target_lang: str,
+    service: Optional[SunbirdService] = None,
+    concurrency: int = TRANSLATION_CONCURRENCY,
+    retries: int = TRANSLATION_SEGMENT_RETRIES
+) -> str:
+    """
+    Translate a markdown response segment by segment.
+
+    Identical segments (repeated "Breakfast:" labels, tips) are translated
+    once. Each segment is retried with backoff; a segment that still fails
+    stays in the source language rather than failing the whole response.
+    Every segment goes through SunbirdService.translate, so each one is
+    looked up in and added to the translation memory.
+
+    Raises:
+        TranslationFailedError: Every segment failed (nothing was translated)
+    """
+    service = service or sunbird_service
+    if not service.api_key:
+        # Mock mode: one mock translation instead of one per segment
+        return (await service.translate(text, source_lang=source_lang, target_lang=target_lang))["translated_text"]
+
+    segments = segment_markdown(text)
+    pending = list(dict.fromkeys(s for s, translatable in segments if translatable))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    failures: List[Exception] = []
+
+    async def translate_segment(segment: str) -> str:
+        async with semaphore:
+            for attempt in range(retries + 1):
+                try:
+                    result = await service.translate(segment, source_lang=source_lang, target_lang=target_lang)
+                    translation_segments.labels(result="retried" if attempt else "ok").inc()
+                    return result["translated_text"]
+                except Exception as e:
+                    if attempt == retries:
+                        logger.warning(f"Segment translation failed after {attempt + 1} attempts: {e}")
+                        translation_segments.labels(result="failed").inc()
+                        failures.append(e)
+                        return segment
+                    await asyncio.sleep(TRANSLATION_RETRY_BACKOFF * 2 ** attempt)
+
+    translated: Dict[str, str] = dict(zip(pending, await asyncio.gather(*(translate_segment(s) for s in pending))))
+    if pending and len(failures) == len(pending):
+        raise TranslationFailedError(f"All {len(pending)} segments failed; last error: {failures[-1]}")
+    return "".join(translated[s] if translatable else s for s, translatable in segments)
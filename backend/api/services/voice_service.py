@@ -1,40 +1,179 @@
 """
-Voice/Speech Recognition Service using Groq Whisper API
+Voice/Speech Recognition Service (Groq Whisper API or local faster-whisper)
 """
+import asyncio
+import logging
 import os
-from typing import Optional, Dict
-from groq import Groq
-import tempfile
+from collections import Counter
+from typing import Any, AsyncIterator, Optional, Dict, List, Tuple
+import numpy as np
+from api.routers.metrics import voice_audio_bytes, voice_trimmed_seconds
+from api.services.audio_processing import (
+    TARGET_RATE,
+    VOICE_PREPROCESS,
+    TrimmedTimeline,
+    encode_audio,
+    encode_prepared,
+    file_extension,
+    prepare_samples,
+    split_on_silence,
+)
+from api.services.stt_backends import GroqWhisperBackend, LocalWhisperBackend, TranscriptionBusyError
+
+logger = logging.getLogger(__name__)
+
+# Groq rejects files over 25 MB; larger uploads are refused before they are read in full
+VOICE_MAX_UPLOAD_BYTES = int(os.getenv("VOICE_MAX_UPLOAD_MB", "25")) * 1024 * 1024
+# groq | local | auto (Groq, falling back to the local model when it fails or has no key)
+STT_BACKEND = os.getenv("STT_BACKEND", "groq").lower()
+# Audio longer than 1.5 chunks is split at pauses and the chunks transcribed concurrently
+VOICE_CHUNK_SECONDS = float(os.getenv("VOICE_CHUNK_SECONDS", "30"))
+VOICE_CHUNK_OVERLAP_SECONDS = float(os.getenv("VOICE_CHUNK_OVERLAP_SECONDS", "1.0"))
+VOICE_CHUNK_CONCURRENCY = int(os.getenv("VOICE_CHUNK_CONCURRENCY", "4"))
+
+
+def _normalized_words(words: List[str]) -> List[str]:
+    return [w.strip(".,!?;:\"'").lower() for w in words]
+
+
+def _drop_repeated_words(previous: str, text: str, max_words: int = 8) -> str:
+    """Remove words at the start of text that repeat the end of previous (chunk overlap)"""
+    prev_words, words = previous.split(), text.split()
+    tail, head = _normalized_words(prev_words[-max_words:]), _normalized_words(words[:max_words])
+    for k in range(min(len(tail), len(head)), 0, -1):
+        if tail[-k:] == head[:k]:
+            return " ".join(words[k:])
+    return text
+
+
+def stitch_chunks(pieces: List[Tuple[float, float, float, Dict]]) -> Tuple[str, Optional[List[Dict]]]:
+    """
+    Join chunk transcripts in order.
+
+    Args:
+        pieces: (chunk start, own start, own end, result) per chunk, in
+            seconds on the full timeline; own start/end is the part of the
+            timeline the chunk is responsible for (without the overlap)
+
+    Returns:
+        (text, segments on the full timeline or None if no chunk had any).
+        A segment is kept by the chunk that owns its midpoint, and words
+        repeated across a cut are dropped.
+    """
+    parts, segments, has_segments = [], [], False
+    for offset, own_start, own_end, result in pieces:
+        if result.get("segments") is not None:
+            has_segments = True
+            kept = []
+            for segment in result["segments"]:
+                start, end = segment["start"] + offset, segment["end"] + offset
+                if own_start <= (start + end) / 2 < own_end:
+                    kept.append({"start": round(start, 2), "end": round(end, 2), "text": segment["text"]})
+            if kept and parts:
+                kept[0]["text"] = _drop_repeated_words(parts[-1], kept[0]["text"])
+            kept = [segment for segment in kept if segment["text"]]
+            segments.extend(kept)
+            text = " ".join(segment["text"] for segment in kept)
+        else:
+            text = result["text"].strip()
+            if parts:
+                text = _drop_repeated_words(parts[-1], text)
+        if text:
+            parts.append(text)
+    return " ".join(parts), (segments if has_segments else None)
+
+
+def _to_original_segments(segments: Optional[List[Dict]], timeline: TrimmedTimeline) -> Optional[List[Dict]]:
+    """Segments timed on the trimmed audio -> timed on the uploaded recording"""
+    if segments is None:
+        return None
+    return [
+        {**segment,
+         "start": round(timeline.to_original(segment["start"]), 2),
+         "end": round(timeline.to_original(segment["end"], end=True), 2)}
+        for segment in segments
+    ]
 
 
 class VoiceService:
     """
-    Service for speech-to-text using Groq's Whisper API.
+    Service for speech-to-text using Groq's Whisper API or a local model.
     Supports multiple audio formats: mp3, mp4, mpeg, mpga, m4a, wav, webm
     """
 
     def __init__(self):
         self.groq_api_key = os.getenv("GROQ_API_KEY")
-        if not self.groq_api_key:
+        if not self.groq_api_key and STT_BACKEND == "groq":
             raise ValueError("GROQ_API_KEY not found in environment variables")
 
-        self.client = Groq(api_key=self.groq_api_key)
+        self.backends = {"local": LocalWhisperBackend()}
+        if self.groq_api_key:
+            self.backends["groq"] = GroqWhisperBackend(self.groq_api_key)
 
         # Supported audio formats by Groq Whisper
         self.supported_formats = {
             'mp3', 'mp4', 'mpeg', 'mpga', 'm4a', 'wav', 'webm', 'ogg'
         }
 
+    @property
+    def available_backends(self) -> List[str]:
+        return [name for name, backend in self.backends.items() if backend.available]
+
+    def _select_backends(self, backend: Optional[str]) -> List:
+        requested = (backend or STT_BACKEND).lower()
+        if requested == "auto":
+            names = ["groq", "local"]
+        elif requested in ("groq", "local"):
+            names = [requested]
+        else:
+            raise ValueError(f"Unknown speech-to-text backend: {requested}. Use groq, local or auto")
+
+        selected = [self.backends[name] for name in names if name in self.available_backends]
+        if not selected:
+            raise ValueError(f"Speech-to-text backend '{requested}' is not available")
+        return selected
+
+    async def warm_up(self):
+        """Load the local model ahead of the first request when it may be used"""
+        if STT_BACKEND in ("local", "auto") and "local" in self.available_backends:
+            await self.backends["local"].warm_up()
+
+    def _validate(self, audio_file: bytes, filename: str):
+        file_extension = filename.split('.')[-1].lower()
+        if file_extension not in self.supported_formats:
+            raise ValueError(
+                f"Unsupported audio format: {file_extension}. "
+                f"Supported formats: {', '.join(self.supported_formats)}"
+            )
+        if not audio_file:
+            raise ValueError("Audio file is empty")
+
+    async def _transcribe_with(self, backends: List, audio: bytes, filename: str, *args) -> Dict:
+        """Try each backend in turn; the first success wins"""
+        error = None
+        for stt in backends:
+            try:
+                result = await stt.transcribe(audio, filename, *args)
+                return {**result, "backend": stt.name}
+            except Exception as e:
+                logger.warning(f"{stt.name} transcription failed: {e}")
+                error = e
+
+        if isinstance(error, TranscriptionBusyError):
+            raise error
+        raise Exception(f"Transcription failed: {str(error)}")
+
     async def transcribe_audio(
         self,
         audio_file: bytes,
         filename: str,
         language: Optional[str] = None,
         prompt: Optional[str] = None,
-        temperature: float = 0.0
+        temperature: float = 0.0,
+        backend: Optional[str] = None
     ) -> Dict:
         """
-        Transcribe audio to text using Groq Whisper API.
+        Transcribe audio to text.
 
         Args:
             audio_file: Audio file bytes
@@ -42,63 +181,138 @@ class VoiceService:
             language: Optional ISO-639-1 language code (e.g., 'en', 'lg', 'sw')
             prompt: Optional text to guide the model's style
             temperature: Sampling temperature (0-1). Lower is more deterministic.
+            backend: groq, local or auto (default: STT_BACKEND)
 
         Returns:
-            Dict with transcription text and metadata
+            Dict with transcription text, metadata, timestamped segments, the
+            backend used and preprocessing stats. Segment times and duration
+            are seconds on the uploaded recording, even though silence is
+            trimmed before transcription.
 
         Raises:
-            ValueError: If audio format is not supported
+            ValueError: If audio format is not supported, the file is empty or
+                the backend is unavailable
+            TranscriptionBusyError: If the local transcription queue is full
             Exception: If transcription fails
         """
-        # Validate file format
-        file_extension = filename.split('.')[-1].lower()
-        if file_extension not in self.supported_formats:
-            raise ValueError(
-                f"Unsupported audio format: {file_extension}. "
-                f"Supported formats: {', '.join(self.supported_formats)}"
+        async for event, data in self.transcribe_stream(audio_file, filename, language, prompt, temperature, backend):
+            if event == "done":
+                return data
+
+    async def transcribe_stream(
+        self,
+        audio_file: bytes,
+        filename: str,
+        language: Optional[str] = None,
+        prompt: Optional[str] = None,
+        temperature: float = 0.0,
+        backend: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Transcribe audio, yielding (event, data) pairs as results arrive:
+
+        - ("start", {"chunks", "duration"}): long audio only, before the chunks run
+        - ("partial", {"index", "start", "end", "text"}): a chunk finished
+          (chunks finish in any order; start/end are seconds on the upload)
+        - ("done", result): the full result, as returned by transcribe_audio
+
+        Short audio yields "done" only. Same arguments and errors as transcribe_audio.
+        """
+        self._validate(audio_file, filename)
+        backends = self._select_backends(backend)
+        args = (language, prompt, temperature)
+
+        samples, preprocessing, timeline = None, None, TrimmedTimeline(None)
+        if VOICE_PREPROCESS:
+            # Mono 16 kHz without leading/trailing silence: smaller upload, less audio to decode
+            samples, preprocessing, timeline = await asyncio.to_thread(prepare_samples, audio_file, filename)
+
+        if samples is not None and len(samples) > VOICE_CHUNK_SECONDS * 1.5 * TARGET_RATE:
+            async for event in self._transcribe_chunks(samples, timeline, preprocessing, backends, args):
+                yield event
+            return
+
+        if VOICE_PREPROCESS:
+            audio_file, filename, preprocessing = await asyncio.to_thread(
+                encode_prepared, audio_file, filename, samples, preprocessing
             )
+            self._record_preprocessing(preprocessing)
+
+        result = await self._transcribe_with(backends, audio_file, filename, *args)
+        if preprocessing and preprocessing["applied"]:
+            # The trimmed audio was transcribed: report times on the upload
+            result = {**result, "segments": _to_original_segments(result.get("segments"), timeline),
+                      "duration": preprocessing["duration_in"]}
+        yield "done", {**result, "preprocessing": preprocessing}
+
+    async def _transcribe_chunks(
+        self,
+        samples: np.ndarray,
+        timeline: TrimmedTimeline,
+        preprocessing: Dict,
+        backends: List,
+        args: Tuple
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Split long audio at pauses and transcribe the chunks concurrently.
+        Chunks are cut from the trimmed samples; reported times are mapped
+        back to the upload with timeline.
+        """
+        chunks = split_on_silence(samples, VOICE_CHUNK_SECONDS, VOICE_CHUNK_OVERLAP_SECONDS)
+        duration = preprocessing["duration_in"]
+        yield "start", {"chunks": len(chunks), "duration": round(duration, 2)}
+
+        limiter = asyncio.Semaphore(VOICE_CHUNK_CONCURRENCY)
 
+        async def transcribe_chunk(index: int, start: int, end: int):
+            async with limiter:
+                audio, codec = await asyncio.to_thread(encode_audio, samples[start:end])
+                result = await self._transcribe_with(backends, audio, f"chunk{index}.{file_extension(codec)}", *args)
+            return index, len(audio), codec, result
+
+        tasks = [asyncio.create_task(transcribe_chunk(i, start, end)) for i, (start, end, _, _) in enumerate(chunks)]
+        results = {}
         try:
-            # Create a temporary file to save the audio
-            # Groq API requires a file-like object
-            with tempfile.NamedTemporaryFile(
-                delete=False,
-                suffix=f".{file_extension}"
-            ) as temp_audio:
-                temp_audio.write(audio_file)
-                temp_audio_path = temp_audio.name
-
-            # Open and transcribe
-            with open(temp_audio_path, "rb") as audio:
-                transcription = self.client.audio.transcriptions.create(
-                    file=(filename, audio.read()),
-                    model="whisper-large-v3-turbo",
-                    language=language,
-                    prompt=prompt,
-                    temperature=temperature,
-                    response_format="verbose_json"  # Get detailed response with metadata
-                )
-
-            # Clean up temp file
-            os.unlink(temp_audio_path)
-
-            # Extract results
-            result = {
-                "text": transcription.text,
-                "language": getattr(transcription, 'language', language),
-                "duration": getattr(transcription, 'duration', None),
-            }
-
-            return result
-
-        except Exception as e:
-            # Clean up temp file if it exists
-            if 'temp_audio_path' in locals():
-                try:
-                    os.unlink(temp_audio_path)
-                except:
-                    pass
-            raise Exception(f"Transcription failed: {str(e)}")
+            for next_done in asyncio.as_completed(tasks):
+                index, size, codec, result = await next_done
+                results[index] = (size, codec, result)
+                start, end, _, _ = chunks[index]
+                yield "partial", {
+                    "index": index,
+                    "start": round(timeline.to_original(start / TARGET_RATE), 2),
+                    "end": round(timeline.to_original(end / TARGET_RATE, end=True), 2),
+                    "text": result["text"].strip()
+                }
+        finally:
+            # A failed chunk or a disconnected client stops the rest
+            for task in tasks:
+                task.cancel()
+
+        text, segments = stitch_chunks([
+            (start / TARGET_RATE, own_start / TARGET_RATE, own_end / TARGET_RATE, results[i][2])
+            for i, (start, _, own_start, own_end) in enumerate(chunks)
+        ])
+        preprocessing.update(applied=True, bytes_out=sum(size for size, _, _ in results.values()),
+                             codec=results[0][1])
+        self._record_preprocessing(preprocessing)
+
+        languages = Counter(result.get("language") for _, _, result in results.values() if result.get("language"))
+        yield "done", {
+            "text": text,
+            "language": languages.most_common(1)[0][0] if languages else args[0],
+            "duration": round(duration, 2),
+            "segments": _to_original_segments(segments, timeline),
+            "backend": results[0][2]["backend"],
+            "chunks": len(chunks),
+            "preprocessing": preprocessing,
+        }
+
+    @staticmethod
+    def _record_preprocessing(preprocessing: Dict):
+        voice_audio_bytes.labels(direction="in").inc(preprocessing["bytes_in"])
+        voice_audio_bytes.labels(direction="out").inc(preprocessing["bytes_out"])
+        voice_trimmed_seconds.observe(preprocessing["trimmed_seconds"])
+        logger.info(f"Audio preprocessing: {preprocessing}")
 
     async def transcribe_with_translation(
         self,
@@ -0,0 +1,125 @@
+"""
+Incremental voice activity detection for streamed audio.
+
+Used by the /voice/stream WebSocket: PCM16 frames are fed in as they
+arrive, and utterances are cut out as soon as the speaker pauses, so each
+one can be transcribed while the caregiver keeps talking.
+"""
+import os
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from api.services.audio_processing import FRAME_SECONDS, TARGET_RATE, resample
+
+# Silence that ends an utterance
+VOICE_STREAM_END_SILENCE = float(os.getenv("VOICE_STREAM_END_SILENCE", "0.7"))
+# Speech between partial transcripts of the utterance in progress
+VOICE_STREAM_PARTIAL_SECONDS = float(os.getenv("VOICE_STREAM_PARTIAL_SECONDS", "2.0"))
+# Utterances longer than this are cut even without a pause
+VOICE_STREAM_MAX_UTTERANCE_SECONDS = float(os.getenv("VOICE_STREAM_MAX_UTTERANCE_SECONDS", "20"))
+
+# Speech must be this far above the tracked noise floor (and above an absolute floor)
+VAD_MARGIN_DB = 12.0
+VAD_MIN_DB = -50.0
+# Audio kept from before speech starts, so the first syllable isn't clipped
+PRE_ROLL_SECONDS = 0.3
+
+
+class StreamingVAD:
+    """
+    Cuts a live PCM16 mono stream into utterances.
+
+    feed() returns events for the audio received so far:
+    - ("partial", samples, None): the utterance in progress, every partial_seconds of it
+    - ("final", samples, (start, end)): a complete utterance, once end_silence
+      of silence follows it; start/end are seconds from the start of the stream
+
+    Samples are float32 at 16 kHz.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = TARGET_RATE,
+        end_silence: float = VOICE_STREAM_END_SILENCE,
+        partial_seconds: float = VOICE_STREAM_PARTIAL_SECONDS,
+        max_utterance: float = VOICE_STREAM_MAX_UTTERANCE_SECONDS
+    ):
+        self.sample_rate = sample_rate
+        self.frame = int(sample_rate * FRAME_SECONDS)
+        self.end_silence_frames = int(end_silence / FRAME_SECONDS)
+        self.partial_frames = int(partial_seconds / FRAME_SECONDS)
+        self.max_frames = int(max_utterance / FRAME_SECONDS)
+
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pre_roll = deque(maxlen=int(PRE_ROLL_SECONDS / FRAME_SECONDS))
+        self._utterance: List[np.ndarray] = []
+        self._silence_run = 0
+        self._since_partial = 0
+        self._noise_floor = -60.0
+        self._frames_seen = 0
+        self._utterance_start = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return bool(self._utterance)
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        energy = 10 * np.log10(np.mean(frame ** 2) + 1e-10)
+        speech = energy > max(self._noise_floor + VAD_MARGIN_DB, VAD_MIN_DB)
+        if not speech:
+            # Follow the background level: down immediately, up slowly
+            self._noise_floor = min(energy, 0.95 * self._noise_floor + 0.05 * energy)
+        return speech
+
+    def _samples(self, frames: List[np.ndarray]) -> np.ndarray:
+        return resample(np.concatenate(frames), self.sample_rate)
+
+    def _finish(self) -> Tuple[str, np.ndarray, Tuple[float, float]]:
+        # Drop the trailing silence that ended the utterance
+        frames = self._utterance[:len(self._utterance) - self._silence_run] or self._utterance
+        end = self._frames_seen - self._silence_run
+        span = (round(self._utterance_start * FRAME_SECONDS, 2), round(end * FRAME_SECONDS, 2))
+        self._utterance, self._silence_run, self._since_partial = [], 0, 0
+        return "final", self._samples(frames), span
+
+    def feed(self, pcm: bytes) -> List[Tuple[str, np.ndarray, Optional[Tuple[float, float]]]]:
+        """Add little-endian 16-bit mono PCM and return any partial/final events"""
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype="<i2").astype(np.float32) / 32768
+        self._pending = np.concatenate([self._pending, samples])
+
+        events = []
+        n_frames = len(self._pending) // self.frame
+        for i in range(n_frames):
+            frame = self._pending[i * self.frame:(i + 1) * self.frame]
+            self._frames_seen += 1
+            speech = self._is_speech(frame)
+
+            if not self._utterance:
+                if speech:
+                    self._utterance = list(self._pre_roll) + [frame]
+                    self._utterance_start = self._frames_seen - len(self._utterance)
+                    self._pre_roll.clear()
+                else:
+                    self._pre_roll.append(frame)
+                continue
+
+            self._utterance.append(frame)
+            self._silence_run = 0 if speech else self._silence_run + 1
+            self._since_partial += 1
+            if self._silence_run >= self.end_silence_frames or len(self._utterance) >= self.max_frames:
+                events.append(self._finish())
+            elif speech and self._since_partial >= self.partial_frames:
+                self._since_partial = 0
+                events.append(("partial", self._samples(self._utterance), None))
+
+        self._pending = self._pending[n_frames * self.frame:]
+        return events
+
+    def flush(self) -> Optional[Tuple[str, np.ndarray, Tuple[float, float]]]:
+        """End of stream: the utterance in progress as a final event, if any"""
+        if not self._utterance:
+            return None
+        self._silence_run = 0
+        return self._finish()
@@ -0,0 +1,134 @@
+"""
+Benchmark concurrent /chat/message throughput.
+
+The LLM call is replaced by a fixed sleep (simulating Groq latency) so the
+numbers reflect how well the handler overlaps requests, not model speed.
+Knowledge-base retrieval runs for real against a synthetic collection.
+Event-loop lag (how late a 10 ms timer fires) is reported alongside
+throughput: it is what every other request on the worker pays while a
+blocking call holds the loop.
+
+Usage:
+    python scripts/bench_chat_concurrency.py                # executor-backed RAG (current)
+    python scripts/bench_chat_concurrency.py --blocking     # vector store called inline (old behaviour)
+    python scripts/bench_chat_concurrency.py --requests 200 --concurrency 32 --chunks 3000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Isolated database, no Hugging Face download
+_tmp = tempfile.mkdtemp(prefix="bench_chat_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("GROQ_API_KEY", "bench-key")
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+
+from api.main import app
+from api.core.deps import get_current_user
+from api.models.database import Base, engine
+from api.models.user import UserDB
+from api.services import rag_service as rag_module
+from api.services.llm_service import LLMService
+
+FOODS = ["matooke", "nakati", "posho", "cassava", "beans", "millet", "groundnuts",
+         "sukuma", "fish", "sweet potatoes", "pumpkin", "avocado", "jackfruit"]
+TOPICS = ["diabetes", "hypertension", "calcium", "iron", "protein", "fibre",
+          "portion size", "hydration", "breakfast", "dinner", "chewing", "appetite"]
+
+
+def build_knowledge_base(n_chunks: int) -> rag_module.RAGService:
+    service = rag_module.RAGService()
+    service.persist_directory = os.path.join(_tmp, "chroma")
+    rng = random.Random(0)
+    texts = [
+        f"Note {i}: {rng.choice(FOODS)} with {rng.choice(FOODS)} helps elderly people managing "
+        f"{rng.choice(TOPICS)}. Serve {rng.randint(50, 300)} g and watch {rng.choice(TOPICS)}."
+        for i in range(n_chunks)
+    ]
+    service.add_documents(texts=texts)
+    return service
+
+
+async def run(args):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT OR IGNORE INTO users (id, email, hashed_password, is_active) "
+                             "VALUES (1, 'bench@example.com', 'x', 1)")
+
+    service = build_knowledge_base(args.chunks)
+    rag_module._rag_service_instance = service
+
+    if args.blocking:
+        async def run_inline(func, *a, **kw):
+            return func(*a, **kw)
+        service._run_blocking = run_inline
+
+    async def fake_generate(self, messages, **kwargs):
+        await asyncio.sleep(args.llm_latency)
+        return "Here is some advice."
+    LLMService.generate_response = fake_generate
+
+    user = UserDB(id=1, email="bench@example.com", is_active=True)
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    rng = random.Random(1)
+    queries = [f"What {rng.choice(FOODS)} is best for {rng.choice(TOPICS)} number {i}?"
+               for i in range(args.requests)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    lags = []
+    done = asyncio.Event()
+
+    async def probe_loop_lag():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(query):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/chat/message", json={"message": query, "language": "eng"})
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        probe = asyncio.create_task(probe_loop_lag())
+        start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in queries))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+
+    latencies.sort()
+    lags.sort()
+    mode = "blocking (inline)" if args.blocking else "executor"
+    print(f"mode={mode} chunks={args.chunks} requests={args.requests} concurrency={args.concurrency}")
+    print(f"throughput: {args.requests / elapsed:.1f} req/s")
+    print(f"latency p50: {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+          f"p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f} ms")
+    print(f"event-loop lag p50: {lags[len(lags) // 2] * 1000:.1f} ms, "
+          f"p99: {lags[int(len(lags) * 0.99) - 1] * 1000:.1f} ms, max: {lags[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocking", action="store_true", help="Call the vector store inline on the event loop")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--chunks", type=int, default=2000, help="Synthetic knowledge-base size")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Simulated LLM latency (s)")
+    logging.disable(logging.WARNING)
+    asyncio.run(run(parser.parse_args()))
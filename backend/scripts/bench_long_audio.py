@@ -0,0 +1,84 @@
+"""
+Benchmark long voice-note transcription: one call for the whole file
+(VOICE_CHUNK_SECONDS larger than the audio) versus pause-aligned chunks
+transcribed concurrently.
+
+The backend is simulated: each call sleeps for overhead + RTF x audio
+duration, like a remote Whisper deployment that scales with request
+length. Preprocessing, chunking, encoding and stitching run for real on
+a synthetic recording (tone bursts separated by pauses).
+
+Usage:
+    python scripts/bench_long_audio.py
+    python scripts/bench_long_audio.py --minutes 5 --rtf 0.15 --concurrency 8
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+import wave
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("GROQ_API_KEY", "bench-key")
+os.environ["VOICE_PREPROCESS_CODEC"] = "wav"
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+
+def synthetic_recording(seconds: float, rate: int = 16000) -> bytes:
+    t = np.arange(int(seconds * rate)) / rate
+    rng = np.random.RandomState(0)
+    samples = np.where((t % 5.0) < 4.2, 0.3 * np.sin(2 * np.pi * 190 * t), 0.0) + 0.002 * rng.randn(len(t))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes((samples * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+async def run(args):
+    from api.services import voice_service as voice_module
+
+    async def fake_whisper(file, **kwargs):
+        with wave.open(io.BytesIO(file[1]), "rb") as audio:
+            duration = audio.getnframes() / audio.getframerate()
+        await asyncio.sleep(args.overhead + args.rtf * duration)
+        return Mock(text=f"words for {duration:.0f} seconds", language="en", duration=duration, segments=None)
+
+    voice_module.VOICE_CHUNK_CONCURRENCY = args.concurrency
+    service = voice_module.VoiceService()
+    groq = service.backends["groq"]
+    groq.client = Mock()
+    groq.client.audio.transcriptions.create = AsyncMock(side_effect=fake_whisper)
+    groq._limiter = asyncio.Semaphore(args.concurrency)
+
+    recording = synthetic_recording(args.minutes * 60)
+    print(f"recording: {args.minutes} min, simulated backend: {args.overhead * 1000:.0f} ms + RTF {args.rtf}")
+
+    for name, chunk_seconds in (("single call", 10 ** 6), (f"{args.chunk_seconds:.0f} s chunks", args.chunk_seconds)):
+        voice_module.VOICE_CHUNK_SECONDS = chunk_seconds
+        start = time.perf_counter()
+        first_partial = None
+        async for event, data in service.transcribe_stream(recording, "note.wav"):
+            if event == "partial" and first_partial is None:
+                first_partial = time.perf_counter() - start
+        total = time.perf_counter() - start
+        partial = f"  first partial: {first_partial:.2f} s" if first_partial else ""
+        print(f"{name:16s} total: {total:.2f} s{partial}  chunks: {data.get('chunks') or 1}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=4)
+    parser.add_argument("--chunk-seconds", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rtf", type=float, default=0.05, help="Simulated backend real-time factor")
+    parser.add_argument("--overhead", type=float, default=0.3, help="Simulated per-request overhead (s)")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+Benchmark meal plan optimization on the food composition table.
+
+Foods are read from food_composition_clean.csv the way import_foods.py
+stores them, so no database is needed. Reports the time per 7-day plan
+(21 meals) and the daily kcal and sodium each plan reaches.
+
+Usage:
+    python scripts/bench_meal_plan.py
+    python scripts/bench_meal_plan.py --calories 1600 --conditions diabetes hypertension --runs 200
+"""
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api.services.meal_optimizer import MealPlanOptimizer
+from scripts.import_foods import estimate_glycemic_index
+
+
+def load_foods(path: Path):
+    foods = {}
+    with open(path, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            number = lambda column: float(row[column] or 0)
+            foods[row["food_name_english"]] = {
+                "name": row["food_name_english"],
+                "local_name": row["food_name_luganda"],
+                "category": row["food_category"],
+                "calories": number("energy_kcal_per_100g"),
+                "protein": number("protein_g_per_100g"),
+                "carbs": number("carbohydrate_g_per_100g"),
+                "fats": number("fat_g_per_100g"),
+                "sodium": number("sodium_mg_per_100g"),
+                "glycemic_index": estimate_glycemic_index(
+                    row["food_category"], number("fiber_g_per_100g"), number("carbohydrate_g_per_100g")
+                ),
+            }
+    return list(foods.values())
+
+
+def main(args):
+    foods = load_foods(Path(__file__).parent.parent / "food_composition_clean.csv")
+    print(f"{len(foods)} foods, target {args.calories} kcal, conditions: {args.conditions or 'none'}")
+
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        plan = MealPlanOptimizer(foods, args.conditions, args.foods).plan(args.calories)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"median {timings[len(timings) // 2] * 1000:.1f} ms, p95 {timings[int(len(timings) * 0.95)] * 1000:.1f} ms per plan")
+
+    for day, meals in plan["meal_plan"].items():
+        totals = meals["totals"]
+        print(f"{day:10s} {totals['calories']:5d} kcal {totals['sodium']:5d} mg sodium  lunch: {meals['lunch']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calories", type=int, default=1800)
+    parser.add_argument("--conditions", nargs="*", default=[])
+    parser.add_argument("--foods", nargs="*", default=[], help="Preferred foods")
+    parser.add_argument("--runs", type=int, default=100)
+    main(parser.parse_args())
@@ -0,0 +1,104 @@
+"""
+Benchmark speech-to-text real-time factor (processing time / audio
+duration) per backend and audio format. RTF below 1 means faster than
+real time.
+
+Pass recordings in the formats clients upload (wav, m4a, webm, ogg, mp3).
+Without files, a synthetic 10 s WAV (tones and noise, no speech) is used,
+which measures decoding and model cost but not accuracy. With
+--preprocess, each file is also run after audio preprocessing (mono
+16 kHz, silence trimmed, re-encoded); compare the median time column, as
+RTF is then relative to the trimmed duration.
+
+Requires faster-whisper for the local backend (pip install faster-whisper)
+and GROQ_API_KEY for the groq backend.
+
+Usage:
+    python scripts/bench_stt.py
+    python scripts/bench_stt.py --files samples/*.wav samples/*.m4a --backends local groq
+    python scripts/bench_stt.py --files samples/*.wav --preprocess
+    LOCAL_WHISPER_MODEL=small LOCAL_WHISPER_COMPUTE_TYPE=int8 python scripts/bench_stt.py --files clip.webm
+"""
+import argparse
+import asyncio
+import io
+import math
+import os
+import random
+import struct
+import sys
+import time
+import wave
+from pathlib import Path
+
+os.environ.setdefault("HF_HUB_OFFLINE", "0")
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def synthetic_wav(seconds: float = 10.0, rate: int = 16000) -> bytes:
+    rng = random.Random(0)
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        sample = 0.3 * math.sin(2 * math.pi * (180 + 40 * math.sin(t)) * t) + 0.05 * rng.uniform(-1, 1)
+        frames += struct.pack("<h", int(sample * 32767))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+async def run(args):
+    from api.services.stt_backends import GroqWhisperBackend, LocalWhisperBackend
+
+    backends = {}
+    if "local" in args.backends:
+        local = LocalWhisperBackend()
+        if not local.available:
+            print("local: faster-whisper is not installed, skipping")
+        else:
+            started = time.perf_counter()
+            await local.warm_up()
+            print(f"local: model '{local.model_size}' ({local.compute_type}) warm-up {time.perf_counter() - started:.1f}s")
+            backends["local"] = local
+    if "groq" in args.backends:
+        if os.getenv("GROQ_API_KEY"):
+            backends["groq"] = GroqWhisperBackend(os.environ["GROQ_API_KEY"])
+        else:
+            print("groq: GROQ_API_KEY is not set, skipping")
+
+    samples = [(Path(f).name, Path(f).read_bytes()) for f in args.files] or [("synthetic.wav", synthetic_wav())]
+    if args.preprocess:
+        from api.services.audio_processing import preprocess_audio
+
+        for filename, audio in list(samples):
+            processed, processed_name, stats = preprocess_audio(audio, filename)
+            print(f"preprocessed {filename}: {stats}")
+            samples.append((f"{processed_name} (pre)", processed))
+
+    print(f"{'backend':8s} {'file':24s} {'KB':>7s} {'audio s':>8s} {'median s':>9s} {'RTF':>6s}")
+    for name, backend in backends.items():
+        for filename, audio in samples:
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                result = await backend.transcribe(audio, filename.split(" ")[0], language=args.language)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            median = timings[len(timings) // 2]
+            duration = result.get("duration") or float("nan")
+            print(f"{name:8s} {filename:24s} {len(audio) / 1024:7.0f} {duration:8.1f} {median:9.2f} "
+                  f"{median / duration:6.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*", default=[])
+    parser.add_argument("--backends", nargs="+", default=["local"], choices=["local", "groq"])
+    parser.add_argument("--language", default=None, help="ISO-639-1 code; default: detect")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--preprocess", action="store_true", help="Also time each file after preprocessing")
+    asyncio.run(run(parser.parse_args()))
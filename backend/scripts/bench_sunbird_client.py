@@ -0,0 +1,100 @@
+"""
+Benchmark Sunbird AI call latency: a new httpx client per call (old
+behaviour) versus the pooled SunbirdService client.
+
+Starts scripts/sunbird_stub.py in-process on a free port, so it needs no
+network access or API key. The stub speaks plain HTTP, so the measured
+saving is the TCP connect and client setup only. Against api.sunbird.ai,
+every new client also pays a TLS handshake (typically one or two extra
+round trips), so the real saving is larger.
+
+Usage:
+    python scripts/bench_sunbird_client.py
+    python scripts/bench_sunbird_client.py --calls 200 --concurrency 8 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("SUNBIRD_API_KEY", "bench-key")
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import httpx
+import uvicorn
+
+from sunbird_stub import create_app
+
+
+def start_stub(latency: float, per_char: float = 0.0) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(latency, per_char), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def per_call_client(base_url: str, headers: dict, text: str):
+    # What SunbirdService.translate used to do: detect, then translate, each on a new client
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{base_url}/tasks/language_id", json={"text": text}, headers=headers)
+        source = response.json()["language"]
+    async with httpx.AsyncClient() as client:
+        await client.post(f"{base_url}/tasks/nllb_translate", headers=headers,
+                          json={"source_language": source, "target_language": "lug", "text": text})
+
+
+async def measure(call, calls: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await call(f"Eat beans and nakati today ({i})")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return calls / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def run(args):
+    base_url = start_stub(args.latency)
+    os.environ["SUNBIRD_BASE_URL"] = base_url
+
+    from api.services.sunbird import SunbirdService
+    service = SunbirdService()
+    await service.start()
+
+    modes = [
+        ("new client per call", lambda text: per_call_client(base_url, service.headers, text)),
+        ("pooled client", lambda text: service.translate(text, target_lang="lug")),
+    ]
+    print(f"stub latency={args.latency * 1000:.0f} ms calls={args.calls} concurrency={args.concurrency} "
+          f"(each call = detect + translate)")
+    for name, call in modes:
+        await measure(call, 10, args.concurrency)  # warm up
+        throughput, p50, p99 = await measure(call, args.calls, args.concurrency)
+        print(f"{name:20s} {throughput:6.1f} calls/s  p50: {p50 * 1000:.1f} ms  p99: {p99 * 1000:.1f} ms")
+
+    await service.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub processing delay per request (s)")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""
+Benchmark translating a full 7-day meal-plan reply: one blob (old
+behaviour) versus concurrent segments (translate_markdown).
+
+Starts scripts/sunbird_stub.py in-process, with a translation delay that
+grows with the length of the text, as NLLB generation time does. Each run
+uses an empty translation memory, so every segment is a real call.
+
+Usage:
+    python scripts/bench_translation.py
+    python scripts/bench_translation.py --latency 0.3 --per-char 0.003 --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("SUNBIRD_API_KEY", "bench-key")
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_sunbird_client import start_stub
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def meal_plan_reply() -> str:
+    from api.services.chat_service import format_meal_plan_response
+
+    return format_meal_plan_response({
+        "patient_name": "Jane",
+        "caloric_needs": 1750,
+        "meal_plan": {
+            day: {
+                "breakfast": f"Millet porridge with milk and a banana ({day})",
+                "lunch": f"Matooke with beans and steamed nakati ({day})",
+                "dinner": f"Sweet potatoes with fish and greens ({day})",
+            }
+            for day in DAYS
+        },
+        "shopping_list": ["Millet flour", "Milk", "Bananas", "Matooke", "Beans", "Nakati",
+                          "Sweet potatoes", "Tilapia", "Sukuma wiki"],
+        "tips": ["Serve small portions more often through the day.",
+                 "Offer water with every meal. Older adults feel less thirst.",
+                 "Steam greens rather than frying them to keep vitamins."],
+    })
+
+
+async def run(args):
+    base_url = start_stub(args.latency, args.per_char)
+    os.environ["SUNBIRD_BASE_URL"] = base_url
+
+    from api.services.sunbird import SunbirdService
+    from api.services.translation_memory import TranslationMemory
+    from api.services.translation_pipeline import segment_markdown, translate_markdown
+
+    text = meal_plan_reply()
+    segments = [s for s, translatable in segment_markdown(text) if translatable]
+    print(f"reply: {len(text)} chars, {len(segments)} segments ({len(set(segments))} unique), "
+          f"stub latency={args.latency * 1000:.0f} ms + {args.per_char * 1000:.1f} ms/char")
+
+    async def blob(service):
+        await service.translate(text, source_lang="eng", target_lang="lug")
+
+    async def segmented(service):
+        await translate_markdown(text, "eng", "lug", service=service, concurrency=args.concurrency)
+
+    for name, call in (("one blob", blob), (f"segments (concurrency={args.concurrency})", segmented)):
+        timings = []
+        for _ in range(args.runs):
+            service = SunbirdService(memory=TranslationMemory())
+            await service.start()
+            start = time.perf_counter()
+            await call(service)
+            timings.append(time.perf_counter() - start)
+            await service.aclose()
+        timings.sort()
+        print(f"{name:28s} median: {timings[len(timings) // 2] * 1000:.0f} ms  max: {timings[-1] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fixed stub delay per request (s)")
+    parser.add_argument("--per-char", type=float, default=0.002, help="Stub delay per character (s)")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,30 @@
+"""
+Move knowledge-base chunks stored before per-user partitions existed into
+the shared namespace.
+
+Run once against a persistent Chroma store (CHROMA_PERSIST_DIR, default
+./chroma_db) after upgrading; later runs find nothing to update.
+
+Usage:
+    python scripts/migrate_rag_namespaces.py
+    CHROMA_PERSIST_DIR=/data/chroma_db python scripts/migrate_rag_namespaces.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api.services.rag_service import RAGService
+
+
+def main():
+    service = RAGService()
+    if service.is_production:
+        print("The production store is in memory; nothing to migrate")
+        return
+    updated = service.backfill_namespaces()
+    print(f"{updated} chunks moved to the shared namespace in {service.persist_directory}")
+
+
+if __name__ == "__main__":
+    main()
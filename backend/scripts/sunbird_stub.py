@@ -0,0 +1,46 @@
+"""
+Local stand-in for the Sunbird AI API, for latency tests without network
+access or an API key.
+
+Implements /tasks/language_id and /tasks/nllb_translate with an
+artificial processing delay: a fixed part, plus a per-character part for
+translations (generation time grows with the length of the text). Translations are the input text tagged with
+the target language, so callers can check what was sent.
+
+Usage:
+    python scripts/sunbird_stub.py --port 8765 --latency 0.05
+    python scripts/sunbird_stub.py --latency 0.2 --per-char 0.002
+    SUNBIRD_BASE_URL=http://127.0.0.1:8765 uvicorn api.main:app
+"""
+import argparse
+import asyncio
+
+from fastapi import FastAPI
+
+
+def create_app(latency: float = 0.05, per_char: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Sunbird AI stub")
+
+    @app.post("/tasks/language_id")
+    async def language_id(payload: dict):
+        await asyncio.sleep(latency)
+        return {"language": "eng", "confidence": 0.99}
+
+    @app.post("/tasks/nllb_translate")
+    async def nllb_translate(payload: dict):
+        await asyncio.sleep(latency + per_char * len(payload.get("text", "")))
+        return {"output": f"[{payload.get('target_language')}] {payload.get('text', '')}"}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="Artificial processing delay (s)")
+    parser.add_argument("--per-char", type=float, default=0.0, help="Extra translation delay per character (s)")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.per_char), host=args.host, port=args.port, log_level="warning")
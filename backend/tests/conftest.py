@@ -8,6 +8,7 @@ from sqlalchemy.orm import sessionmaker
 from pathlib import Path
 import sys
 import os
+import tempfile
 
 # Set test environment variables before importing app
 os.environ["DATABASE_URL"] = "sqlite:///./test.db"
@@ -18,6 +19,8 @@ os.environ["HUGGINGFACE_TOKEN"] = "test-hf-token"
 os.environ["TAVILY_API_KEY"] = "test-tavily-key"
 os.environ["SUPABASE_URL"] = "https://test.supabase.co"
 os.environ["SUPABASE_KEY"] = "test-supabase-key"
+# Keep the knowledge base out of the bundled chroma_db/
+os.environ["CHROMA_PERSIST_DIR"] = tempfile.mkdtemp(prefix="test_chroma_")
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -38,9 +41,12 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 @pytest.fixture(scope="function")
 def test_db():
     """Create test database"""
+    from api.services.food_catalog import get_food_catalog
+
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    get_food_catalog().invalidate()
 
 
 @pytest.fixture(scope="function")
@@ -1,6 +1,7 @@
 """
 Tests for AI service endpoints (translation, RAG, etc.)
 """
+import json
 import pytest
 
 
@@ -41,28 +42,236 @@ def test_get_languages_endpoint(client):
 
 
 @pytest.mark.unit
-def test_rag_query_endpoint(client):
+def test_rag_query_endpoint(client, test_db, auth_headers):
     """Test RAG query endpoint"""
     rag_data = {
         "query": "What are the best foods for elderly nutrition?",
         "search_web": False
     }
 
-    response = client.post("/ai/rag", json=rag_data)
+    response = client.post("/ai/rag", json=rag_data, headers=auth_headers)
 
     # Should respond (may fail if dependencies not configured)
     assert response.status_code in [200, 400, 500]
 
 
 @pytest.mark.unit
-def test_rag_with_web_search(client):
+def test_rag_with_web_search(client, test_db, auth_headers):
     """Test RAG query with web search enabled"""
     rag_data = {
         "query": "Latest nutrition guidelines for elderly",
         "search_web": True
     }
 
-    response = client.post("/ai/rag", json=rag_data)
+    response = client.post("/ai/rag", json=rag_data, headers=auth_headers)
 
     # Should respond
     assert response.status_code in [200, 400, 500]
+
+
+@pytest.mark.unit
+def test_rag_query_requires_auth(client):
+    """Test RAG queries are tied to a user (they search that user's uploads)"""
+    response = client.post("/ai/rag", json={"query": "matooke"})
+
+    assert response.status_code == 401
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_sunbird_reuses_pooled_client():
+    """Test detection and translation share one pooled client"""
+    import httpx
+    from api.services.sunbird import SunbirdService
+    from api.services.translation_memory import TranslationMemory
+
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        if request.url.path == "/tasks/language_id":
+            return httpx.Response(200, json={"language": "lug", "confidence": 0.9})
+        return httpx.Response(200, json={"output": "Eat beans"})
+
+    service = SunbirdService(transport=httpx.MockTransport(handler), memory=TranslationMemory())
+    client = service.client
+
+    result = await service.translate("Lya bijanjaalo", target_lang="eng")
+    await service.translate("Lya enva", source_lang="lug", target_lang="eng")
+
+    assert result["translated_text"] == "Eat beans"
+    assert result["source_language"] == "lug"
+    assert paths == ["/tasks/language_id", "/tasks/nllb_translate", "/tasks/nllb_translate"]
+    assert service.client is client
+
+    await service.aclose()
+    assert client.is_closed
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_translation_memory_skips_repeat_calls():
+    """Test repeated text and replies built from known lines are served from memory"""
+    import httpx
+    from api.services.sunbird import SunbirdService
+    from api.services.translation_memory import TranslationMemory
+
+    requests = []
+    outputs = {
+        "Good morning!": "Wasuze otya!",
+        "Good morning!\n- Drink water.": "Wasuze otya!\n- Nywa amazzi.",
+    }
+
+    def handler(request):
+        text = json.loads(request.content)["text"]
+        requests.append(text)
+        return httpx.Response(200, json={"output": outputs[text]})
+
+    service = SunbirdService(transport=httpx.MockTransport(handler), memory=TranslationMemory())
+
+    await service.translate("Good morning!\n- Drink water.", source_lang="eng", target_lang="lug")
+    again = await service.translate("good  morning!\n- Drink water.", source_lang="eng", target_lang="lug")
+    line = await service.translate("- Drink water.", source_lang="eng", target_lang="lug")
+    reordered = await service.translate("- Drink water.\nGood morning!", source_lang="eng", target_lang="lug")
+
+    assert again["translated_text"] == "Wasuze otya!\n- Nywa amazzi."
+    assert line["translated_text"] == "- Nywa amazzi."
+    assert reordered["translated_text"] == "- Nywa amazzi.\nWasuze otya!"
+    assert len(requests) == 1
+
+    await service.aclose()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_translation_memory_sqlite_tier(tmp_path):
+    """Test translations survive a restart through the SQLite tier"""
+    from api.services.translation_memory import SQLiteTranslationStore, TranslationMemory
+
+    path = str(tmp_path / "tm.db")
+    await TranslationMemory(store=SQLiteTranslationStore(path)).remember("eng", "lug", "Eat beans.", "Lya bijanjaalo.")
+
+    restarted = TranslationMemory(store=SQLiteTranslationStore(path))
+
+    assert await restarted.lookup("eng", "lug", "Eat beans.") == "Lya bijanjaalo."
+    assert await restarted.lookup("eng", "nyn", "Eat beans.") is None
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_translation_memory_sqlite_entries_expire(tmp_path):
+    """Test SQLite entries older than the TTL are not served and get purged"""
+    from api.services.translation_memory import SQLiteTranslationStore, TranslationMemory
+
+    store = SQLiteTranslationStore(str(tmp_path / "tm.db"), ttl=60)
+    await TranslationMemory(store=store).remember("eng", "lug", "Eat beans.", "Lya bijanjaalo.")
+    store._conn.execute("UPDATE translations SET created_at = created_at - 120")
+    store._conn.commit()
+
+    assert await TranslationMemory(store=store).lookup("eng", "lug", "Eat beans.") is None
+    assert store.purge() == 1
+
+
+@pytest.mark.unit
+def test_segment_markdown_skips_markup_and_quantities():
+    """Test only words are sent for translation and the text reassembles exactly"""
+    from api.services.translation_pipeline import segment_markdown
+
+    text = ("**Monday:**\n- Breakfast: Millet porridge (250 kcal) with milk\n"
+            "Daily Caloric Target: ~1800 kcal\n\n---\nEat slowly. Drink water.")
+    segments = segment_markdown(text)
+
+    assert "".join(s for s, _ in segments) == text
+    assert [s for s, translatable in segments if translatable] == [
+        "Monday", "Breakfast: Millet porridge", "with milk", "Daily Caloric Target", "Eat slowly.", "Drink water."
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_translate_markdown_retries_segments(monkeypatch):
+    """Test segments are translated once each, retried on failure and kept in order"""
+    import httpx
+    from api.services import translation_pipeline
+    from api.services.sunbird import SunbirdService
+    from api.services.translation_memory import TranslationMemory
+
+    monkeypatch.setattr(translation_pipeline, "TRANSLATION_RETRY_BACKOFF", 0)
+    calls = []
+
+    def handler(request):
+        text = json.loads(request.content)["text"]
+        calls.append(text)
+        if text == "Lunch" and calls.count(text) == 1:
+            return httpx.Response(503, text="busy")
+        return httpx.Response(200, json={"output": text.upper()})
+
+    service = SunbirdService(transport=httpx.MockTransport(handler), memory=TranslationMemory())
+    result = await translation_pipeline.translate_markdown(
+        "**Monday:**\n- Breakfast\n- Lunch\n\n**Tuesday:**\n- Breakfast\n- Lunch",
+        "eng", "lug", service=service, concurrency=2
+    )
+
+    assert result == "**MONDAY:**\n- BREAKFAST\n- LUNCH\n\n**TUESDAY:**\n- BREAKFAST\n- LUNCH"
+    assert sorted(calls) == ["Breakfast", "Lunch", "Lunch", "Monday", "Tuesday"]
+
+    await service.aclose()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_translate_markdown_raises_when_nothing_translated(monkeypatch):
+    """Test a response whose every segment fails is reported, not returned as English"""
+    import httpx
+    from api.services import translation_pipeline
+    from api.services.sunbird import SunbirdService
+    from api.services.translation_memory import TranslationMemory
+
+    monkeypatch.setattr(translation_pipeline, "TRANSLATION_RETRY_BACKOFF", 0)
+    service = SunbirdService(transport=httpx.MockTransport(lambda request: httpx.Response(503, text="down")),
+                             memory=TranslationMemory())
+
+    with pytest.raises(translation_pipeline.TranslationFailedError):
+        await translation_pipeline.translate_markdown("- Breakfast\n- Lunch", "eng", "lug", service=service, retries=0)
+
+    await service.aclose()
+
+
+@pytest.mark.unit
+def test_rag_searches_own_and_shared_documents(client, test_db, auth_headers):
+    """Test /ai/rag answers from the caller's partition and the shared one"""
+    from unittest.mock import AsyncMock, patch
+    from api.services.rag_service import SHARED_NAMESPACE
+
+    service = AsyncMock()
+    service.answer_query.return_value = {"answer": "Steam it.", "sources": []}
+    with patch("api.routers.ai.get_rag_service", return_value=service):
+        response = client.post("/ai/rag", json={"query": "matooke", "use_search": False}, headers=auth_headers)
+
+    assert response.status_code == 200
+    namespaces = service.answer_query.call_args.kwargs["namespaces"]
+    assert SHARED_NAMESPACE in namespaces
+    assert any(namespace.startswith("user:") for namespace in namespaces)
+
+
+@pytest.mark.unit
+def test_shared_upload_restricted_to_curators(client, test_db, auth_headers, sample_user_data, monkeypatch):
+    """Test only RAG_SHARED_UPLOADERS may add documents to the shared namespace"""
+    from unittest.mock import AsyncMock, patch
+    from api.services import rag_service as rag_module
+
+    service = AsyncMock()
+    service.aadd_documents.return_value = {"added": 1, "duplicates": 0, "near_duplicates": 0}
+    upload = {"file": ("guide.txt", b"Millet porridge is a good breakfast.", "text/plain")}
+
+    with patch("api.routers.ai.get_rag_service", return_value=service):
+        response = client.post("/ai/rag/upload", files=upload, data={"shared": "true"}, headers=auth_headers)
+        assert response.status_code == 403
+        service.aadd_documents.assert_not_called()
+
+        monkeypatch.setattr(rag_module, "RAG_SHARED_UPLOADERS", {sample_user_data["email"].lower()})
+        response = client.post("/ai/rag/upload", files=upload, data={"shared": "true"}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.json()["shared"] is True
+    assert service.aadd_documents.call_args.kwargs["namespace"] == rag_module.SHARED_NAMESPACE
@@ -58,3 +58,406 @@ def test_chat_with_profile(client):
 
     # Should respond
     assert response.status_code in [200, 401, 500]
+
+
+@pytest.mark.unit
+def test_chat_stream_sends_tokens_and_saves_reply(client, db_session, monkeypatch):
+    """Test the SSE endpoint streams tokens and stores the assembled reply"""
+    import json
+    from api.core.deps import get_current_user
+    from api.models.chat import MessageDB
+    from api.models.user import UserDB
+    from api.services.llm_service import LLMService
+
+    async def fake_stream(self, messages, **kwargs):
+        for token in ["Eat ", "more ", "beans."]:
+            yield token
+
+    monkeypatch.setattr(LLMService, "stream_response", fake_stream)
+    client.app.dependency_overrides[get_current_user] = lambda: UserDB(id=1, email="stream@example.com")
+    try:
+        response = client.post("/chat/message/stream", json={"message": "What helps with iron?", "language": "eng"})
+    finally:
+        client.app.dependency_overrides.pop(get_current_user)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for frame in response.text.strip().split("\n\n"):
+        event, data = frame.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+
+    assert events[0][0] == "start"
+    assert [data["token"] for name, data in events if name == "token"] == ["Eat ", "more ", "beans."]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["response"] == "Eat more beans."
+
+    conversation_id = events[0][1]["conversation_id"]
+    saved = db_session.query(MessageDB).filter(MessageDB.conversation_id == conversation_id).all()
+    assert [(m.role, m.content) for m in saved] == [("user", "What helps with iron?"), ("assistant", "Eat more beans.")]
+
+
+@pytest.mark.unit
+def test_llm_clients_pooled_and_share_connections():
+    """Test overridden parameters reuse pooled clients over one HTTP pool"""
+    from api.services.llm_clients import get_chat_model
+    from api.services.llm_service import LLMService
+
+    service = LLMService()
+    cool = service._llm_for(temperature=0.2)
+
+    assert service._llm_for(temperature=0.2) is cool
+    assert get_chat_model(service.api_key, temperature=0.2, max_tokens=1024) is cool
+    assert service._llm_for(max_tokens=256) is not cool
+    assert service._llm_for(max_tokens=256).http_async_client is cool.http_async_client
+
+
+@pytest.mark.unit
+def test_llm_response_cache_exact_and_semantic():
+    """Test repeated prompts hit the cache, and similar questions hit the semantic tier"""
+    from api.services.llm_cache import LLMResponseCache
+    from api.routers.metrics import llm_cache_tokens_saved
+
+    vectors = {"what is good for diabetes?": [1.0, 0.0], "what is good for diabetics?": [0.99, 0.05],
+               "how do i cook matooke?": [0.0, 1.0]}
+    cache = LLMResponseCache(embed=lambda text: vectors[text])
+    params = {"temperature": 0, "max_tokens": 1024}
+    system = {"role": "system", "content": "You are Mzee Chakula."}
+
+    def ask(question):
+        return [system, {"role": "user", "content": question}]
+
+    cache.set("llama", params, ask("What is good for diabetes?"), "Beans and greens.", tokens=120)
+    saved_before = llm_cache_tokens_saved._value.get()
+
+    assert cache.get("llama", params, ask("what is  good for DIABETES?")) == "Beans and greens."
+    assert cache.get("llama", params, ask("What is good for diabetics?")) == "Beans and greens."
+    assert cache.get("llama", params, ask("How do I cook matooke?")) is None
+    assert cache.get("llama", {"temperature": 0, "max_tokens": 256}, ask("What is good for diabetes?")) is None
+    assert llm_cache_tokens_saved._value.get() == saved_before + 240
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_semantic_llm_cache_embeds_off_the_event_loop():
+    """Test async lookups run the query embedding in a worker thread"""
+    import threading
+    from api.services.llm_cache import LLMResponseCache
+
+    threads = []
+
+    def embed(text):
+        threads.append(threading.get_ident())
+        return [1.0, 0.0]
+
+    cache = LLMResponseCache(embed=embed)
+    params = {"temperature": 0, "max_tokens": 1024}
+    messages = [{"role": "user", "content": "What is good for diabetes?"}]
+
+    await cache.aset("llama", params, messages, "Beans and greens.")
+    assert await cache.aget("llama", params, [{"role": "user", "content": "What is good for diabetics?"}]) \
+        == "Beans and greens."
+    assert len(threads) == 2 and threading.get_ident() not in threads
+
+
+@pytest.mark.unit
+def test_llm_response_cache_skips_sampled_calls():
+    """Test calls with temperature > 0 are only cached when the caller opts in"""
+    from api.services.llm_cache import LLMResponseCache
+
+    cache = LLMResponseCache()
+    sampled = {"temperature": 0.7, "max_tokens": 1024}
+    messages = [{"role": "user", "content": "Tell me a story about matooke"}]
+
+    cache.set("llama", sampled, messages, "Once upon a time...")
+    assert cache.get("llama", sampled, messages) is None
+    assert cache.get("llama", sampled, messages, allow_sampled=True) is None
+
+    cache.set("llama", sampled, messages, "Once upon a time...", allow_sampled=True)
+    assert cache.get("llama", sampled, messages) is None
+    assert cache.get("llama", sampled, messages, allow_sampled=True) == "Once upon a time..."
+    assert cache.get("llama", {"temperature": 0.2, "max_tokens": 1024}, messages, allow_sampled=True) is None
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_sampled_chat_completions_not_cached():
+    """Test chat completions at the default temperature always reach the model"""
+    from unittest.mock import AsyncMock, Mock, patch
+    from api.services.llm_cache import LLMResponseCache
+    from api.services.llm_service import LLMService
+
+    service = LLMService()
+    service.cache = LLMResponseCache()
+    llm = Mock(model_name="llama", temperature=0.7, max_tokens=1024)
+    llm.ainvoke = AsyncMock(side_effect=[Mock(content="First"), Mock(content="Second")])
+
+    with patch.object(service, "_llm_for", return_value=llm):
+        first = await service.generate_response([{"role": "user", "content": "Hello"}])
+        second = await service.generate_response([{"role": "user", "content": "Hello"}])
+
+    assert (first, second) == ("First", "Second")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_context_window_summarizes_older_turns(db_session, monkeypatch):
+    """Test older turns are folded into the conversation summary in batches"""
+    from api.models.chat import ConversationDB
+    from api.services.context_manager import ContextManager
+    from api.services.llm_service import LLMService
+
+    folded = []
+
+    async def fake_summary(self, messages, **kwargs):
+        folded.append(messages[0]["content"])
+        return "Grandma Nakato is 78 and diabetic."
+
+    monkeypatch.setattr(LLMService, "generate_response", fake_summary)
+    conversation = ConversationDB(id="ctx-1", user_id=1, title="test")
+    db_session.add(conversation)
+    db_session.commit()
+
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(10)]
+    manager = ContextManager(history_turns=2, summary_batch=4)
+
+    window = await manager.window(history, conversation)
+
+    assert len(folded) == 1
+    assert conversation.summarized_count == 6
+    assert window[0]["role"] == "system" and "Nakato" in window[0]["content"]
+    assert [m["content"] for m in window[1:]] == [f"message {i}" for i in range(6, 10)]
+
+    # Two more messages age out: below the batch size, so no new summary call
+    window = await manager.window(history + history[:2], conversation)
+    assert len(folded) == 1
+    assert len(window) == 1 + 6
+
+
+@pytest.mark.unit
+def test_fit_to_budget_drops_oldest_history():
+    """Test the prompt budget drops old history before touching the question"""
+    from api.services.context_manager import ContextManager, count_message_tokens
+
+    messages = [{"role": "system", "content": "rules " * 50}]
+    messages += [{"role": "user", "content": f"old message {i} " * 40} for i in range(5)]
+    messages.append({"role": "user", "content": "What should grandma eat for breakfast?"})
+
+    fitted = ContextManager(token_budget=400).fit_to_budget(messages)
+
+    assert count_message_tokens(fitted) <= 400
+    assert fitted[0]["role"] == "system"
+    assert fitted[-1]["content"] == "What should grandma eat for breakfast?"
+    assert "old message 4" in fitted[-2]["content"]
+
+
+@pytest.mark.unit
+def test_conversation_messages_paged(client, db_session):
+    """Test stored messages are paged newest-first and returned oldest-first per page"""
+    from datetime import datetime, timedelta
+    from api.core.deps import get_current_user
+    from api.models.chat import ConversationDB, MessageDB
+    from api.models.user import UserDB
+
+    db_session.add(ConversationDB(id="paged-1", user_id=1, title="test"))
+    start = datetime(2026, 1, 1)
+    for i in range(5):
+        db_session.add(MessageDB(conversation_id="paged-1", role="user", content=f"message {i}",
+                                 timestamp=start + timedelta(minutes=i)))
+    db_session.commit()
+
+    client.app.dependency_overrides[get_current_user] = lambda: UserDB(id=1, email="pages@example.com")
+    try:
+        first = client.get("/chat/conversations/paged-1/messages", params={"limit": 3}).json()
+        second = client.get("/chat/conversations/paged-1/messages",
+                            params={"limit": 3, "before": first["next_before"]}).json()
+        missing = client.get("/chat/conversations/someone-else/messages")
+    finally:
+        client.app.dependency_overrides.pop(get_current_user)
+
+    assert [m["content"] for m in first["messages"]] == ["message 2", "message 3", "message 4"]
+    assert [m["content"] for m in second["messages"]] == ["message 0", "message 1"]
+    assert second["next_before"] is None
+    assert missing.status_code == 404
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_history_loaded_from_database(db_session):
+    """Test the loader returns the stored tail the summary does not cover"""
+    from api.models.chat import ConversationDB, MessageDB
+    from api.services.context_manager import ContextManager
+
+    conversation = ConversationDB(id="loader-1", user_id=1, title="test", summarized_count=2)
+    db_session.add(conversation)
+    messages = [MessageDB(conversation_id="loader-1", role="user", content=f"message {i}") for i in range(6)]
+    db_session.add_all(messages)
+    db_session.commit()
+
+    offset, history = ContextManager(history_turns=1, summary_batch=1).load_history(
+        db_session, conversation, exclude_id=messages[-1].id
+    )
+
+    assert offset == 2
+    assert [m["content"] for m in history] == ["message 2", "message 3", "message 4"]
+
+
+@pytest.mark.unit
+def test_chat_turn_single_commit_and_failure_keeps_question(client, db_session, monkeypatch):
+    """Test a turn commits once, and a failed LLM call still saves the user message"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from api.core.deps import get_current_user
+    from api.models.chat import MessageDB
+    from api.models.user import UserDB
+    from api.services.llm_service import LLMService
+
+    commits = []
+
+    def count_commit(session):
+        commits.append(session)
+
+    async def reply(self, messages, **kwargs):
+        return "Millet porridge is a good start."
+
+    async def fail(self, messages, **kwargs):
+        raise RuntimeError("Groq unavailable")
+
+    event.listen(Session, "after_commit", count_commit)
+    client.app.dependency_overrides[get_current_user] = lambda: UserDB(id=1, email="commit@example.com")
+    try:
+        monkeypatch.setattr(LLMService, "generate_response", reply)
+        ok = client.post("/chat/message", json={"message": "Breakfast ideas for grandpa?", "language": "eng"})
+        commits_per_turn = len(commits)
+
+        monkeypatch.setattr(LLMService, "generate_response", fail)
+        failed = client.post("/chat/message", json={"message": "And for lunch today?", "language": "eng",
+                                                    "conversation_id": ok.json()["conversation_id"]})
+    finally:
+        event.remove(Session, "after_commit", count_commit)
+        client.app.dependency_overrides.pop(get_current_user)
+
+    assert ok.status_code == 200
+    assert commits_per_turn == 1
+    assert failed.status_code == 500
+
+    saved = db_session.query(MessageDB).filter(
+        MessageDB.conversation_id == ok.json()["conversation_id"]
+    ).order_by(MessageDB.id).all()
+    assert [m.role for m in saved] == ["user", "assistant", "user"]
+    assert saved[-1].content == "And for lunch today?"
+
+
+@pytest.mark.unit
+def test_chat_stage_timing_and_retrieval_timeout(client, test_db, monkeypatch):
+    """Test stages are reported in Server-Timing and slow retrieval is skipped"""
+    import asyncio
+    from api.core.deps import get_current_user
+    from api.models.user import UserDB
+    from api.services import chat_service
+    from api.services.llm_service import LLMService
+
+    prompts = []
+
+    async def slow_search(request, current_user):
+        await asyncio.sleep(1)
+        return "---UPLOADED DOCUMENT CONTEXT---"
+
+    async def reply(self, messages, **kwargs):
+        prompts.append(messages[-1]["content"])
+        return "Try millet porridge."
+
+    monkeypatch.setattr(chat_service, "_search_documents", slow_search)
+    monkeypatch.setattr(chat_service, "CHAT_RETRIEVAL_TIMEOUT", 0.05)
+    monkeypatch.setattr(LLMService, "generate_response", reply)
+    client.app.dependency_overrides[get_current_user] = lambda: UserDB(id=1, email="timing@example.com")
+    try:
+        response = client.post("/chat/message", json={"message": "Breakfast for grandma?", "language": "eng"})
+    finally:
+        client.app.dependency_overrides.pop(get_current_user)
+
+    assert response.status_code == 200
+    stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert {"context", "retrieval", "meal_plan", "llm", "translate", "persist"} <= set(stages)
+    assert prompts == ["Breakfast for grandma?"]
+
+
+@pytest.mark.unit
+def test_startup_adds_summary_columns_to_existing_database(tmp_path):
+    """Test a database created before the summary columns and history index is upgraded at startup"""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import sessionmaker
+    from api.models.database import Base, add_missing_columns, create_missing_indexes
+    from api.models.chat import ConversationDB
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, hashed_password VARCHAR, "
+                                "full_name VARCHAR, is_active BOOLEAN)"))
+        connection.execute(text("CREATE TABLE conversations (id VARCHAR PRIMARY KEY, title VARCHAR, "
+                                "created_at DATETIME, user_id INTEGER REFERENCES users(id))"))
+        connection.execute(text("INSERT INTO conversations (id, title, user_id) VALUES ('old-1', 'Before', 1)"))
+        connection.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id VARCHAR "
+                                "REFERENCES conversations(id), role VARCHAR, content TEXT, timestamp DATETIME)"))
+    Base.metadata.create_all(bind=engine)
+
+    added = add_missing_columns(engine, Base.metadata)
+
+    assert set(added) == {"conversations.summary", "conversations.summarized_count"}
+    assert add_missing_columns(engine, Base.metadata) == []
+    assert "ix_messages_conversation_timestamp" in create_missing_indexes(engine, Base.metadata)
+    assert create_missing_indexes(engine, Base.metadata) == []
+    session = sessionmaker(bind=engine)()
+    conversation = session.query(ConversationDB).filter(ConversationDB.id == "old-1").one()
+    assert (conversation.summary, conversation.summarized_count) == (None, 0)
+    conversation.summary = "Asked about matooke."
+    session.commit()
+    session.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_english_replies_are_not_translated(monkeypatch):
+    """Test any English language code skips Sunbird, while other languages are translated"""
+    from unittest.mock import AsyncMock
+    from api.services import chat_service
+
+    translate = AsyncMock(return_value="Mwasuze mutya")
+    monkeypatch.setattr(chat_service, "translate_markdown", translate)
+
+    for language in (None, "en", "eng", "EN"):
+        assert await chat_service.translate_response("Good evening", language) == "Good evening"
+    translate.assert_not_awaited()
+
+    assert await chat_service.translate_response("Good evening", "lg") == "Mwasuze mutya"
+    assert translate.await_args.kwargs["target_lang"] == "lug"
+
+
+@pytest.mark.unit
+def test_opening_chat_questions_served_from_cache(client, test_db):
+    """Test identical opening questions share a cached answer, while follow-ups reach the model"""
+    import uuid
+    from unittest.mock import AsyncMock, Mock, patch
+    from langchain_groq import ChatGroq
+    from api.core.deps import get_current_user
+    from api.models.user import UserDB
+
+    question = f"What foods help with diabetes? {uuid.uuid4().hex}"
+    reply = Mock(content="Beans and greens.", usage_metadata={})
+
+    client.app.dependency_overrides[get_current_user] = lambda: UserDB(id=1, email="faq@example.com")
+    try:
+        with patch.object(ChatGroq, "ainvoke", AsyncMock(return_value=reply)) as ainvoke:
+            first = client.post("/chat/message", json={"message": question, "language": "eng"})
+            second = client.post("/chat/message", json={"message": question, "language": "eng"})
+            opening_calls = ainvoke.await_count
+            client.post("/chat/message", json={"message": question, "language": "eng",
+                                               "conversation_id": first.json()["conversation_id"]})
+    finally:
+        client.app.dependency_overrides.pop(get_current_user)
+
+    assert first.json()["response"] == second.json()["response"] == "Beans and greens."
+    assert first.json()["conversation_id"] != second.json()["conversation_id"]
+    assert opening_calls == 1
+    assert ainvoke.await_count == 2
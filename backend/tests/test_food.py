@@ -352,3 +352,43 @@ def test_list_foods_pagination(client, test_db, auth_headers):
     # Get second page
     response2 = client.get("/foods/?skip=5&limit=5", headers=auth_headers)
     assert response2.status_code == 200
+
+
+@pytest.mark.unit
+def test_search_reflects_created_and_deleted_foods(client, test_db, auth_headers):
+    """Test the in-memory catalog is refreshed when foods change"""
+    food = {"name": "Matooke (green banana)", "local_name": "Matooke", "category": "Staples",
+            "calories": 122.0, "protein": 1.3, "carbs": 31.0, "fats": 0.4}
+    food_id = client.post("/foods/", json=food, headers=auth_headers).json()["id"]
+
+    response = client.get("/foods/search?query=matooke", headers=auth_headers)
+    assert [item["id"] for item in response.json()] == [food_id]
+
+    client.delete(f"/foods/{food_id}", headers=auth_headers)
+    response = client.get("/foods/search?query=matooke", headers=auth_headers)
+    assert response.json() == []
+
+
+@pytest.mark.unit
+def test_food_snapshot_filters_and_indexes():
+    """Test columnar filtering and name/local name lookups"""
+    from api.services.food_catalog import FoodSnapshot
+
+    def row(id, name, local_name, category, diabetic, sodium):
+        return {"id": id, "name": name, "local_name": local_name, "category": category, "calories": 100.0,
+                "protein": 1.0, "carbs": 10.0, "fats": 1.0, "fiber": None, "sodium": sodium, "potassium": None,
+                "glycemic_index": None, "is_diabetic_friendly": diabetic, "is_hypertension_friendly": True}
+
+    snapshot = FoodSnapshot([
+        row(1, "Posho (maize meal)", "Posho", "Staples", False, 1.0),
+        row(2, "Dodo (amaranth)", "Dodo", "Vegetables", True, None),
+        row(3, "Posho (maize meal) (roasted)", "Posho", "Staples", True, 2.0),
+    ])
+
+    assert list(snapshot.filter(query="POSHO")) == [0, 2]
+    assert list(snapshot.filter(category="Staples", diabetic_friendly=True)) == [2]
+    assert snapshot.find("posho")["id"] == 1
+    assert snapshot.find("dodo (amaranth)")["id"] == 2
+    assert snapshot.find("cassava") is None
+    assert snapshot.categories() == ["Staples", "Vegetables"]
+    assert snapshot.columns["sodium"][1] != snapshot.columns["sodium"][1]  # NaN where unknown
@@ -254,3 +254,248 @@ def test_meal_plan_multiple_conditions(client, test_db, auth_headers):
     
     # Should handle multiple conditions
     assert response.status_code in [200, 500]
+
+
+def _optimizer_foods():
+    from api.services.meal_plan_service import MealPlanService
+
+    foods = MealPlanService(model_loader=Mock())._fallback_food_rows()
+    foods.append({'name': 'Salted fish', 'category': 'protein', 'calories': 180, 'protein': 30,
+                  'carbs': 0, 'fats': 6, 'sodium': 3000, 'glycemic_index': 0})
+    return foods
+
+
+@pytest.mark.unit
+def test_optimizer_hits_calorie_target():
+    """Test each day's portions add up to the caloric target in the usual plan format"""
+    from api.services.meal_optimizer import MealPlanOptimizer
+
+    plan = MealPlanOptimizer(_optimizer_foods()).plan(1800)
+
+    assert list(plan['meal_plan']) == ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    for meals in plan['meal_plan'].values():
+        assert all(isinstance(meals[meal], str) and meals[meal] for meal in ('breakfast', 'lunch', 'dinner'))
+        assert abs(meals['totals']['calories'] - 1800) <= 0.05 * 1800
+    assert sum(plan['quantities'].values()) > 0
+
+
+@pytest.mark.unit
+def test_optimizer_respects_conditions_and_varies_meals():
+    """Test sodium stays under the hypertension limit and meals rotate across the week"""
+    from api.services.meal_optimizer import MealPlanOptimizer, SODIUM_LIMIT_HYPERTENSION
+
+    plan = MealPlanOptimizer(_optimizer_foods(), ['hypertension', 'diabetes'], ['matooke']).plan(1600)
+
+    days = plan['meal_plan'].values()
+    assert all(meals['totals']['sodium'] <= SODIUM_LIMIT_HYPERTENSION for meals in days)
+    assert 'Salted fish' not in plan['quantities']
+    assert 'matooke' in plan['quantities']
+    assert len({meals['lunch'] for meals in days}) > 1
+
+
+@pytest.mark.unit
+def test_optimizer_is_fast_for_a_large_catalogue():
+    """Test a plan over a few hundred foods solves well under 100 ms"""
+    import random
+    import time
+    from api.services.meal_optimizer import MealPlanOptimizer
+
+    rng = random.Random(0)
+    foods = [
+        {'name': f'{category} {i}', 'category': category, 'calories': rng.uniform(20, 400),
+         'protein': rng.uniform(0, 25), 'carbs': rng.uniform(0, 60), 'fats': rng.uniform(0, 20),
+         'sodium': rng.uniform(0, 400), 'glycemic_index': rng.randint(10, 90)}
+        for category in ('Staples', 'Proteins', 'Vegetables', 'Fruits') for i in range(100)
+    ]
+
+    started = time.perf_counter()
+    MealPlanOptimizer(foods, ['diabetes']).plan(1800)
+    assert time.perf_counter() - started < 0.1
+
+
+def _stub_loader():
+    return Mock(models={}, get_available_models=Mock(return_value={}), predict=Mock(return_value={'success': False}),
+                predict_batch=Mock(return_value={'success': False}))
+
+
+@pytest.mark.unit
+def test_identical_plans_are_cached_per_patient():
+    """Test identical inputs reuse one generation but each patient gets their own plan id"""
+    from api.services.meal_plan_service import MealPlanService
+
+    service = MealPlanService(model_loader=_stub_loader())
+    with patch.object(service, '_generate', wraps=service._generate) as generate:
+        first = service.generate_meal_plan(80, ['Diabetes'], ['beans', 'matooke'], name='Jjaja', owner=1)
+        second = service.generate_meal_plan(80, ['diabetes'], ['Matooke', 'beans'], name='Mzee', owner=2)
+        service.generate_meal_plan(81, ['diabetes'], ['matooke', 'beans'], owner=2)
+
+    assert generate.call_count == 2
+    assert first['meal_plan'] == second['meal_plan']
+    assert (first['patient_name'], second['patient_name']) == ('Jjaja', 'Mzee')
+    assert first['plan_id'] != second['plan_id']
+    assert service.get_plan(first['plan_id'], owner=1)['patient_name'] == 'Jjaja'
+    assert service.get_plan(first['plan_id'], owner=2) is None
+
+
+@pytest.mark.unit
+def test_plan_cache_follows_food_catalog_reloads(db_session, monkeypatch):
+    """Test a TTL reload that picks up another process's food writes invalidates cached plans"""
+    from api.models.food import FoodDB
+    from api.services.food_catalog import get_food_catalog
+    from api.services.meal_plan_service import MealPlanService
+
+    catalog = get_food_catalog()
+    catalog.invalidate()
+    monkeypatch.setattr(catalog, "ttl", 60)
+
+    def expire():
+        catalog._loaded_at -= 61
+
+    db_session.add(FoodDB(name="Matooke", category="Staples", calories=122))
+    db_session.commit()
+
+    service = MealPlanService(db=db_session, model_loader=_stub_loader())
+    with patch.object(service, '_generate', wraps=service._generate) as generate:
+        service.generate_meal_plan(80, ['diabetes'], ['matooke'])
+        expire()  # reloaded, same foods: still cached
+        service.generate_meal_plan(80, ['diabetes'], ['matooke'])
+        assert generate.call_count == 1
+
+        # Written without invalidating this process's catalogue, seen after the TTL
+        db_session.add(FoodDB(name="Beans", category="Proteins", calories=127))
+        db_session.commit()
+        expire()
+        service.generate_meal_plan(80, ['diabetes'], ['matooke'])
+
+    assert generate.call_count == 2
+
+
+@pytest.mark.unit
+def test_concurrent_identical_plans_share_one_generation():
+    """Test requests arriving while the same plan is being generated wait for it"""
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from api.services.meal_plan_service import MealPlanService
+
+    service = MealPlanService(model_loader=_stub_loader())
+    real_generate = service._generate
+    calls = []
+    started = threading.Event()
+
+    def slow_generate(*args):
+        calls.append(args)
+        started.set()
+        time.sleep(0.2)
+        return real_generate(*args)
+
+    with patch.object(service, '_generate', side_effect=slow_generate), ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(service.generate_meal_plan, 75, ['hypertension'], [])]
+        started.wait()
+        futures += [pool.submit(service.generate_meal_plan, 75, ['hypertension'], []) for _ in range(3)]
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(result['success'] for result in results)
+    assert len({result['plan_id'] for result in results}) == 4
+
+
+@pytest.mark.unit
+def test_download_cached_plan_pdf(client, test_db, auth_headers):
+    """Test a generated plan can be downloaded as PDF by id"""
+    request_data = {"name": "PDF By Id", "age": 70, "health_conditions": [], "preferred_foods": []}
+
+    response = client.post("/meal-plan/generate", json=request_data, headers=auth_headers)
+    assert response.status_code == 200
+    plan_id = response.json()["plan_id"]
+
+    pdf = client.get(f"/meal-plan/{plan_id}/pdf", headers=auth_headers)
+    assert pdf.status_code == 200
+    assert pdf.headers["content-type"] == "application/pdf"
+    assert "PDF_By_Id" in pdf.headers["content-disposition"]
+
+    assert client.get("/meal-plan/unknown/pdf", headers=auth_headers).status_code == 404
+
+
+@pytest.mark.unit
+def test_batch_predicts_calories_once_and_shares_plans():
+    """Test a batch makes one model prediction and identical residents share one generation"""
+    from api.services.meal_plan_service import MealPlanService
+
+    loader = _stub_loader()
+    loader.predict_batch.return_value = {'success': True, 'predictions': [1650.4, 1900.0, 1650.4]}
+    service = MealPlanService(model_loader=loader)
+    residents = [
+        {'name': 'Jjaja', 'age': 82, 'health_conditions': ['diabetes'], 'preferred_foods': ['beans']},
+        {'name': 'Mzee', 'age': 71, 'health_conditions': [], 'preferred_foods': []},
+        {'name': 'Nakato', 'age': 82, 'health_conditions': ['Diabetes'], 'preferred_foods': ['Beans']},
+    ]
+
+    with patch.object(service, '_generate', wraps=service._generate) as generate:
+        results = service.generate_meal_plans(residents, owner=1)
+
+    loader.predict_batch.assert_called_once()
+    assert len(loader.predict_batch.call_args[0][0]) == 3
+    loader.predict.assert_not_called()
+    assert generate.call_count == 2
+    assert [r['patient_name'] for r in results] == ['Jjaja', 'Mzee', 'Nakato']
+    assert [r['caloric_needs'] for r in results] == [1650, 1900, 1650]
+    assert results[0]['meal_plan'] == results[2]['meal_plan']
+    assert service.get_plan(results[1]['plan_id'], owner=1)['patient_name'] == 'Mzee'
+
+
+@pytest.mark.unit
+def test_fallback_caloric_needs_by_age():
+    """Test the fallback estimate for a batch matches the single-patient one"""
+    from api.services.meal_plan_service import MealPlanService
+
+    service = MealPlanService(model_loader=_stub_loader())
+    assert service._calculate_caloric_needs_batch([65, 70, 79, 80, 95], [[]] * 5) == [2000, 1800, 1800, 1600, 1600]
+    assert service._calculate_caloric_needs(85, ['diabetes']) == 1600
+
+
+@pytest.mark.unit
+def test_batch_endpoint_json_and_zip(client, test_db, auth_headers):
+    """Test the batch endpoint returns every resident's plan, or a ZIP with one PDF each"""
+    import io
+    import zipfile
+
+    residents = [
+        {"name": "Resident One", "age": 81, "health_conditions": ["hypertension"], "preferred_foods": []},
+        {"name": "Resident/Two", "age": 74, "health_conditions": [], "preferred_foods": ["beans"]},
+    ]
+
+    response = client.post("/meal-plan/generate/batch", json={"residents": residents}, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2 and data["errors"] == []
+    assert [plan["patient_name"] for plan in data["plans"]] == ["Resident One", "Resident/Two"]
+
+    response = client.post("/meal-plan/generate/batch", json={"residents": residents, "format": "zip"},
+                           headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+        assert names == ["meal_plan_000_Resident_One.pdf", "meal_plan_001_Resident_Two.pdf"]
+        assert archive.read(names[0]).startswith(b"%PDF")
+
+    assert client.post("/meal-plan/generate/batch", json={"residents": []}, headers=auth_headers).status_code == 422
+    assert client.post("/meal-plan/generate/batch", json={"residents": residents}).status_code == 401
+
+
+@pytest.mark.unit
+def test_batch_pdfs_render_in_order():
+    """Test batch PDFs come back in plan order and match single renders"""
+    from api.services.pdf_service import PDFService
+
+    plan = {'patient_name': 'Batch', 'caloric_needs': 1800, 'meal_plan': {}, 'shopping_list': [], 'tips': [],
+            'generated_at': '2026-01-01T00:00:00'}
+    plans = [{**plan, 'patient_name': f'Resident {i}'} for i in range(3)]
+
+    service = PDFService()
+    pdfs = service.generate_meal_plan_pdfs(plans)
+
+    assert len(pdfs) == 3
+    assert all(pdf.startswith(b'%PDF') for pdf in pdfs)
+    assert [len(pdf) for pdf in pdfs] == [len(service.generate_meal_plan_pdf(p).getvalue()) for p in plans]
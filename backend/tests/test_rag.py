@@ -0,0 +1,288 @@
+"""
+Tests for the RAG knowledge base (deduplication, retrieval)
+"""
+import uuid
+import pytest
+
+from api.services.dedup import chunk_id, simhash, hamming_distance, SimHashIndex
+from api.services.bm25_index import BM25Index, reciprocal_rank_fusion
+from api.services.rag_service import RAGService, SHARED_NAMESPACE, user_namespace
+
+
+class HashingEmbeddings:
+    """Fixed-dimension embeddings, so tests don't depend on TF-IDF refits"""
+
+    def __init__(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        self._vectorizer = HashingVectorizer(n_features=64)
+
+    def embed_documents(self, texts):
+        return self._vectorizer.transform(texts).toarray().tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def rag_service():
+    """RAG service backed by a throwaway in-memory collection"""
+    import chromadb
+    from langchain_chroma import Chroma
+
+    service = RAGService()
+    service._embeddings = HashingEmbeddings()
+    service._vector_store = Chroma(
+        client=chromadb.EphemeralClient(),
+        collection_name=f"test_{uuid.uuid4().hex}",
+        embedding_function=service.embeddings
+    )
+    service._bm25_index = BM25Index()
+    return service
+
+
+@pytest.mark.unit
+def test_chunk_id_ignores_case_and_whitespace():
+    """Test chunk ids are derived from normalized text"""
+    assert chunk_id("Matooke is  rich in\npotassium", "shared") == chunk_id("matooke is rich in potassium", "shared")
+    assert chunk_id("matooke", "shared") != chunk_id("cassava", "shared")
+    assert chunk_id("matooke", "user:1") != chunk_id("matooke", "user:2")
+
+
+@pytest.mark.unit
+def test_simhash_detects_light_edits():
+    """Test lightly edited text stays within near-duplicate distance"""
+    original = ("Elderly people with diabetes should choose beans, nakati and fish "
+                "over refined staples, and eat smaller portions more frequently through the day "
+                "while drinking plenty of clean water")
+    edited = original.replace("plenty of", "lots of")
+    unrelated = ("Groundnut sauce is a common accompaniment to matooke in central Uganda "
+                 "and provides protein and healthy fats for older adults who eat little meat")
+
+    index = SimHashIndex()
+    index.add(simhash(original))
+
+    assert hamming_distance(simhash(original), simhash(edited)) <= 7
+    assert index.find_near_duplicate(simhash(edited)) is not None
+    assert index.find_near_duplicate(simhash(unrelated)) is None
+
+
+@pytest.mark.unit
+def test_add_documents_skips_reuploads(rag_service):
+    """Test uploading the same chunks twice does not grow the collection"""
+    chunks = ["Matooke is a staple food in Uganda.", "Nakati is a leafy green vegetable."]
+    metadata = [{"source": "foods.txt", "chunk_index": i} for i in range(len(chunks))]
+
+    first = rag_service.add_documents(texts=chunks, metadatas=metadata)
+    second = rag_service.add_documents(texts=chunks, metadatas=metadata)
+
+    assert first["added"] == 2
+    assert second["added"] == 0
+    assert second["duplicates"] == 2
+    assert len(rag_service.vector_store.get()["ids"]) == 2
+
+
+@pytest.mark.unit
+def test_bm25_exact_term_match():
+    """Test BM25 ranks the chunk containing a rare food name first"""
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c"],
+        [
+            "Beans and fish are good protein sources for older adults.",
+            "Nakati is a bitter leafy green rich in iron.",
+            "Leafy greens should be steamed rather than fried.",
+        ]
+    )
+
+    results = index.search("how do I cook nakati", k=2)
+
+    assert results[0][0] == "b"
+
+
+@pytest.mark.unit
+def test_bm25_readd_replaces_postings():
+    """Test re-adding a chunk id does not double count it"""
+    index = BM25Index()
+    index.add(["a"], ["matooke with beans"])
+    index.add(["a"], ["matooke with beans"])
+
+    assert len(index) == 1
+    assert index.postings["matooke"] == {SHARED_NAMESPACE: {"a": 1}}
+    assert index.doc_freq["matooke"] == 1
+
+    index.add(["a"], ["matooke with beans"], [{"namespace": "user:7"}])
+    assert index.postings["matooke"] == {"user:7": {"a": 1}}
+    assert index.doc_freq["matooke"] == 1
+
+
+@pytest.mark.unit
+def test_bm25_scoped_search_only_visits_its_namespaces():
+    """Test a namespaced search scores only those namespaces' chunks, with corpus-wide idf"""
+    index = BM25Index()
+    others = [f"other-{i}" for i in range(500)]
+    index.add(others, ["matooke and beans for lunch"] * 500,
+              [{"namespace": f"user:{1000 + i}"} for i in range(500)])
+    index.add(["mine", "curated"], ["matooke porridge", "matooke with greens"],
+              [{"namespace": "user:7"}, {"namespace": SHARED_NAMESPACE}])
+    unscoped = dict(index.search("matooke", k=600))
+
+    class CountingDict(dict):
+        lookups = 0
+
+        def __getitem__(self, key):
+            CountingDict.lookups += 1
+            return super().__getitem__(key)
+
+    index.documents = CountingDict(index.documents)
+    results = index.search("matooke", k=5, namespaces=["user:7", SHARED_NAMESPACE])
+
+    assert {doc_id for doc_id, _ in results} == {"mine", "curated"}
+    assert CountingDict.lookups == 2
+    assert all(score == pytest.approx(unscoped[doc_id]) for doc_id, score in results)
+
+
+@pytest.mark.unit
+def test_reciprocal_rank_fusion_prefers_agreement():
+    """Test ids ranked by both retrievers come out on top"""
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]])
+
+    assert fused[0][0] == "y"
+    assert {doc_id for doc_id, _ in fused} == {"x", "y", "z", "w"}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_search_knowledge_base_hybrid(rag_service):
+    """Test hybrid search returns keyword matches with fused scores"""
+    rag_service.add_documents(texts=[
+        "Matooke is steamed green banana, a staple in central Uganda.",
+        "Older adults need calcium from milk, fish and greens.",
+        "Sweet potatoes are rich in vitamin A and potassium.",
+    ])
+
+    results = await rag_service.search_knowledge_base("matooke", k=2)
+
+    assert results
+    assert "Matooke" in results[0]["content"]
+    assert results[0]["rrf_score"] > 0
+    assert "score" not in results[0]
+
+
+@pytest.mark.unit
+def test_should_search_skips_confirmations(rag_service):
+    """Test retrieval is skipped for short confirmations and an empty collection"""
+    assert rag_service.should_search("What should a diabetic eat?") is False  # empty collection
+
+    rag_service.add_documents(texts=["Beans are a good source of protein."])
+
+    assert rag_service.should_search("Yes please!") is False
+    assert rag_service.should_search("ok") is False
+    assert rag_service.should_search("What should a diabetic eat?") is True
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_search_results_cached_until_upload(rag_service):
+    """Test repeated queries hit the cache and uploads invalidate it"""
+    rag_service.add_documents(texts=["Nakati is a leafy green vegetable."])
+
+    first = await rag_service.search_knowledge_base("nakati", k=3)
+    hits_before = rag_service._query_cache.hits
+    second = await rag_service.search_knowledge_base("  Nakati ", k=3)
+
+    assert second == first
+    assert rag_service._query_cache.hits == hits_before + 1
+
+    version = rag_service.collection_version
+    rag_service.add_documents(texts=["Nakati can be steamed with tomatoes and onions."])
+
+    assert rag_service.collection_version == version + 1
+    third = await rag_service.search_knowledge_base("nakati", k=3)
+    assert len(third) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_search_scoped_to_user_partition(rag_service):
+    """Test a user's search sees their uploads and shared documents, not other users'"""
+    rag_service.add_documents(texts=["Shared guide: matooke is a Ugandan staple."])
+    rag_service.add_documents(texts=["Grandma's matooke recipe with groundnut sauce."], namespace=user_namespace(1))
+    rag_service.add_documents(texts=["Grandpa's matooke is steamed in banana leaves."], namespace=user_namespace(2))
+
+    namespaces = [user_namespace(1), SHARED_NAMESPACE]
+    results = await rag_service.search_knowledge_base("matooke", k=5, namespaces=namespaces)
+    contents = [r["content"] for r in results]
+
+    assert len(contents) == 2
+    assert not any("Grandpa" in c for c in contents)
+    assert {r["metadata"]["namespace"] for r in results} == set(namespaces)
+
+
+@pytest.mark.unit
+def test_backfill_namespaces_is_explicit(rag_service):
+    """Test legacy chunks keep their metadata until the migration is run"""
+    rag_service.vector_store._collection.add(ids=["legacy"], documents=["Old matooke notes"],
+                                             metadatas=[{"source": "old.txt"}], embeddings=[[0.0] * 64])
+
+    assert "namespace" not in rag_service.vector_store.get(ids=["legacy"])["metadatas"][0]
+    assert rag_service.backfill_namespaces() == 1
+    assert rag_service.vector_store.get(ids=["legacy"])["metadatas"][0] == {"source": "old.txt", "namespace": SHARED_NAMESPACE}
+    assert rag_service.backfill_namespaces() == 0
+
+
+@pytest.mark.unit
+def test_same_text_uploaded_by_two_users(rag_service):
+    """Test identical chunks in different partitions are not treated as duplicates"""
+    text = ["Millet porridge is a good breakfast for older adults."]
+
+    assert rag_service.add_documents(texts=text, namespace=user_namespace(1))["added"] == 1
+    assert rag_service.add_documents(texts=text, namespace=user_namespace(2))["added"] == 1
+    assert rag_service.should_search("millet porridge", [user_namespace(3)]) is False
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_search_does_not_block_event_loop(rag_service):
+    """Test the synchronous vector-store work runs off the event loop"""
+    import asyncio
+    import time
+
+    rag_service.add_documents(texts=["Posho is made from maize flour."])
+
+    def slow_search(*args):
+        time.sleep(0.2)
+        return []
+    rag_service._search = slow_search
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    await asyncio.gather(rag_service.search_knowledge_base("posho"), ticker())
+
+    assert ticks == 10
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_repeated_rag_answers_served_from_cache(rag_service):
+    """Test answer_query runs deterministically, so a repeated question is answered from the LLM cache"""
+    from unittest.mock import AsyncMock, Mock, patch
+    from langchain_groq import ChatGroq
+    from api.routers.metrics import llm_cache_lookups
+
+    rag_service.add_documents(["Millet porridge is a gentle breakfast for elders."], namespace=SHARED_NAMESPACE)
+    question = f"Is millet porridge a good breakfast? {uuid.uuid4().hex}"
+    hits_before = llm_cache_lookups.labels(result="exact")._value.get()
+
+    with patch.object(ChatGroq, "ainvoke", AsyncMock(return_value=Mock(content="Yes.", usage_metadata={}))) as ainvoke:
+        first = await rag_service.answer_query(question, use_search=False)
+        second = await rag_service.answer_query(question, use_search=False)
+
+    assert first["answer"] == second["answer"] == "Yes."
+    assert ainvoke.await_count == 1
+    assert llm_cache_lookups.labels(result="exact")._value.get() == hits_before + 1
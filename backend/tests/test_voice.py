@@ -253,3 +253,468 @@ def test_transcribe_and_translate_full_workflow(client):
         # May have translation if service is available
         if "translated_text" in result:
             assert isinstance(result["translated_text"], str)
+
+
+@pytest.mark.unit
+def test_transcribe_and_translate_detects_once(client, monkeypatch):
+    """Test the Sunbird detection is reused as the translation source and cached by transcript"""
+    import json
+    import httpx
+    from api.services import voice_service as voice_module
+    from api.services.sunbird import SunbirdService
+    from api.services.translation_memory import TranslationMemory
+
+    calls = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        calls.append((request.url.path, payload.get("source_language")))
+        if request.url.path == "/tasks/language_id":
+            return httpx.Response(200, json={"language": "lug", "confidence": 0.9})
+        return httpx.Response(200, json={"output": "Good evening"})
+
+    fake = Mock()
+    fake.audio.transcriptions.create = AsyncMock(
+        return_value=Mock(text="Mwasuze mutya", language="swahili", duration=1.0, segments=None)
+    )
+    monkeypatch.setattr(voice_module.get_voice_service().backends["groq"], "client", fake)
+    monkeypatch.setattr("api.routers.voice.sunbird_service",
+                        SunbirdService(transport=httpx.MockTransport(handler), memory=TranslationMemory()))
+
+    files = {"audio": ("test.mp3", io.BytesIO(b"fake audio data"), "audio/mpeg")}
+    first = client.post("/voice/transcribe-and-translate", files=files, data={"translate_to": "eng"})
+    files = {"audio": ("test.mp3", io.BytesIO(b"fake audio data"), "audio/mpeg")}
+    second = client.post("/voice/transcribe-and-translate", files=files,
+                         data={"translate_to": "eng", "detect_language": "false"})
+
+    assert first.status_code == 200
+    assert first.json()["detected_language"] == "lug"
+    assert first.json()["translated_text"] == "Good evening"
+    assert second.json()["translated_text"] == "Good evening"
+    # One detection, one translation (the repeat is served from translation memory)
+    assert calls == [("/tasks/language_id", None), ("/tasks/nllb_translate", "lug")]
+
+
+@pytest.mark.unit
+def test_sunbird_language_codes():
+    """Test Whisper and ISO-639-1 language names map to Sunbird codes"""
+    from api.services.sunbird import SunbirdService
+
+    assert SunbirdService.to_sunbird_code("lg") == "lug"
+    assert SunbirdService.to_sunbird_code("swahili") == "swh"
+    assert SunbirdService.to_sunbird_code("ENG") == "eng"
+    assert SunbirdService.to_sunbird_code("klingon") is None
+    assert SunbirdService.to_sunbird_code(None) is None
+
+
+@pytest.mark.unit
+def test_transcribe_rejects_oversized_upload(client, monkeypatch):
+    """Test uploads over the size limit are refused with 413"""
+    monkeypatch.setattr("api.routers.voice.VOICE_MAX_UPLOAD_BYTES", 1024)
+    files = {"audio": ("large.mp3", io.BytesIO(b"x" * 2048), "audio/mpeg")}
+
+    response = client.post("/voice/transcribe", files=files)
+
+    assert response.status_code == 413
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_transcribe_audio_passes_bytes_to_async_client():
+    """Test audio bytes go straight to the async SDK, with bounded concurrency"""
+    import asyncio
+    from api.services import stt_backends
+    from api.services.voice_service import VoiceService
+
+    in_flight = peak = 0
+
+    async def create(**kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return Mock(text="Hello", language="en", duration=1.0, segments=None)
+
+    service = VoiceService()
+    groq = service.backends["groq"]
+    groq.client = Mock()
+    groq.client.audio.transcriptions.create = AsyncMock(side_effect=create)
+
+    with patch.object(stt_backends, "VOICE_MAX_CONCURRENCY", 2):
+        results = await asyncio.gather(*(service.transcribe_audio(b"RIFF", "a.wav") for _ in range(5)))
+
+    assert [r["text"] for r in results] == ["Hello"] * 5
+    assert results[0]["backend"] == "groq"
+    assert groq.client.audio.transcriptions.create.call_args.kwargs["file"] == ("a.wav", b"RIFF")
+    assert peak == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_auto_backend_falls_back_to_local():
+    """Test the local model takes over when the Groq call fails"""
+    from api.services.voice_service import VoiceService
+
+    service = VoiceService()
+    service.backends["groq"].client = Mock()
+    service.backends["groq"].client.audio.transcriptions.create = AsyncMock(side_effect=ConnectionError("offline"))
+    local = service.backends["local"]
+
+    with patch.object(type(local), "available", True), \
+            patch.object(local, "_transcribe", return_value={"text": "Mwasuze mutya", "language": "sw", "duration": 2.0}):
+        result = await service.transcribe_audio(b"RIFF", "a.wav", backend="auto")
+
+        with pytest.raises(Exception):
+            await service.transcribe_audio(b"RIFF", "a.wav", backend="groq")
+
+    assert result["text"] == "Mwasuze mutya"
+    assert result["backend"] == "local"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_local_backend_queue_is_bounded():
+    """Test local transcriptions beyond the queue limit are refused instead of piling up"""
+    import asyncio
+    import time
+    from api.services.stt_backends import LocalWhisperBackend, TranscriptionBusyError
+
+    backend = LocalWhisperBackend(workers=1, max_queue=1)
+
+    def slow_transcribe(*args):
+        time.sleep(0.1)
+        return {"text": "ok", "language": "en", "duration": 1.0}
+    backend._transcribe = slow_transcribe
+
+    results = await asyncio.gather(
+        *(backend.transcribe(b"RIFF", "a.wav") for _ in range(3)), return_exceptions=True
+    )
+
+    assert [r["text"] for r in results if isinstance(r, dict)] == ["ok", "ok"]
+    assert sum(isinstance(r, TranscriptionBusyError) for r in results) == 1
+
+
+def _wav_bytes(samples, rate, channels):
+    import wave
+    import numpy as np
+
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+def test_preprocess_audio_downmixes_resamples_and_trims():
+    """Test a stereo 44.1 kHz WAV becomes a smaller mono 16 kHz WAV without the silence"""
+    import numpy as np
+    from api.services.audio_processing import decode_wav, preprocess_audio
+
+    rate = 44100
+    t = np.arange(rate * 5) / rate
+    tone = np.where((t >= 2.0) & (t < 3.0), 0.4 * np.sin(2 * np.pi * 220 * t), 0.0)
+    tone += 0.001 * np.random.RandomState(0).randn(len(t))
+    data = _wav_bytes(np.repeat(tone, 2), rate, channels=2)
+
+    processed, filename, stats = preprocess_audio(data, "clip.wav")
+    samples, processed_rate = decode_wav(processed)
+
+    assert stats["applied"] is True
+    assert stats["bytes_out"] == len(processed) < len(data) / 5
+    assert filename.endswith((".wav", ".ogg"))
+    if filename.endswith(".wav"):
+        assert processed_rate == 16000 and samples.shape[1] == 1
+    assert 1.0 <= stats["duration_out"] <= 1.6
+    assert stats["trimmed_seconds"] == pytest.approx(5.0 - stats["duration_out"], abs=0.01)
+
+
+@pytest.mark.unit
+def test_preprocess_audio_passes_through_undecodable_input():
+    """Test formats that can't be decoded here are sent unchanged"""
+    from api.services.audio_processing import preprocess_audio
+
+    with patch("api.services.audio_processing.FFMPEG", None):
+        processed, filename, stats = preprocess_audio(b"fake m4a data", "clip.m4a")
+
+    assert (processed, filename) == (b"fake m4a data", "clip.m4a")
+    assert stats["applied"] is False
+
+
+@pytest.mark.unit
+def test_stitch_chunks_drops_overlap_duplicates():
+    """Test chunk transcripts are joined on one timeline without repeating the overlap"""
+    from api.services.voice_service import stitch_chunks
+
+    first = {"text": "Grandma eats beans daily", "segments": [
+        {"start": 0.0, "end": 4.0, "text": "Grandma eats beans"},
+        {"start": 9.5, "end": 10.8, "text": "daily"},
+    ]}
+    second = {"text": "daily and drinks milk", "segments": [
+        {"start": 0.5, "end": 1.8, "text": "daily"},
+        {"start": 1.8, "end": 4.0, "text": "and drinks milk"},
+    ]}
+    text, segments = stitch_chunks([(0.0, 0.0, 10.0, first), (9.0, 10.0, 14.0, second)])
+
+    assert text == "Grandma eats beans daily and drinks milk"
+    assert [s["start"] for s in segments] == [0.0, 9.5, 10.8]
+
+    text, segments = stitch_chunks([
+        (0.0, 0.0, 10.0, {"text": "Eat small meals often."}),
+        (9.0, 10.0, 20.0, {"text": "meals often. Drink water."}),
+    ])
+    assert text == "Eat small meals often. Drink water."
+    assert segments is None
+
+
+@pytest.mark.unit
+def test_split_on_silence_advances_with_short_chunks():
+    """Test chunks shorter than the search window still split the audio in forward cuts"""
+    import numpy as np
+    from api.services.audio_processing import split_on_silence
+
+    samples = 0.01 * np.random.RandomState(3).randn(16000 * 20).astype(np.float32)
+    chunks = split_on_silence(samples, chunk_seconds=2, overlap_seconds=0.5)
+
+    owned = [(own_start, own_end) for _, _, own_start, own_end in chunks]
+    assert owned[0][0] == 0 and owned[-1][1] == len(samples)
+    assert all(start < end for start, end in owned)
+    assert all(prev_end == start for (_, prev_end), (start, _) in zip(owned, owned[1:]))
+    assert max(end - start for start, end in owned) <= 16000 * 2.5
+    with pytest.raises(ValueError):
+        split_on_silence(samples, chunk_seconds=0, overlap_seconds=0.5)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_segment_times_are_on_the_uploaded_recording():
+    """Test segments timed on the trimmed audio are reported on the original timeline"""
+    import numpy as np
+    from api.services import voice_service as voice_module
+    from api.services.audio_processing import decode_audio
+
+    rate = 16000
+    pattern = [(2.0, False), (1.0, True), (4.0, False), (1.0, True), (1.0, False)]
+    samples = np.frombuffer(_pcm16(pattern), dtype="<i2").astype(np.float32) / 32768
+
+    async def create(file, **kwargs):
+        # Time the second tone on the (trimmed) audio actually sent
+        sent = decode_audio(file[1])
+        loud = np.flatnonzero(np.abs(sent) > 0.1)
+        second = loud[np.argmax(np.diff(loud) > rate * 0.3) + 1] / rate
+        return Mock(text="one two", language="en", duration=len(sent) / rate,
+                    segments=[{"start": 0.2, "end": 1.2, "text": "one"},
+                              {"start": second, "end": second + 1.0, "text": "two"}])
+
+    service = voice_module.VoiceService()
+    service.backends["groq"].client = Mock()
+    service.backends["groq"].client.audio.transcriptions.create = AsyncMock(side_effect=create)
+
+    result = await service.transcribe_audio(_wav_bytes(samples, rate, channels=1), "note.wav")
+
+    assert result["preprocessing"]["trimmed_seconds"] > 4
+    assert result["duration"] == pytest.approx(9.0, abs=0.01)
+    assert result["segments"][0]["start"] == pytest.approx(2.0, abs=0.05)
+    assert result["segments"][1]["start"] == pytest.approx(7.0, abs=0.05)
+    assert result["segments"][1]["end"] == pytest.approx(8.0, abs=0.05)
+
+
+def _speech_like_wav(seconds, rate=16000):
+    """Tone bursts with short pauses, so the VAD has places to cut"""
+    import numpy as np
+
+    t = np.arange(int(seconds * rate)) / rate
+    bursts = (t % 4.0) < 3.2
+    samples = np.where(bursts, 0.3 * np.sin(2 * np.pi * 200 * t), 0.0) + 0.001 * np.random.RandomState(1).randn(len(t))
+    return _wav_bytes(samples, rate, channels=1)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_long_audio_transcribed_in_concurrent_chunks():
+    """Test long audio is chunked, transcribed in parallel and stitched in order"""
+    import asyncio
+    from api.services import voice_service as voice_module
+
+    in_flight = peak = 0
+
+    async def create(file, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        index = int(file[0].split(".")[0].removeprefix("chunk"))
+        await asyncio.sleep(0.05 if index == 0 else 0.01)
+        in_flight -= 1
+        return Mock(text=f"part {index}", language="en", duration=10.0, segments=None)
+
+    service = voice_module.VoiceService()
+    service.backends["groq"].client = Mock()
+    service.backends["groq"].client.audio.transcriptions.create = AsyncMock(side_effect=create)
+
+    with patch.object(voice_module, "VOICE_CHUNK_SECONDS", 10):
+        events = [e async for e in service.transcribe_stream(_speech_like_wav(40), "note.wav")]
+
+    names = [name for name, _ in events]
+    done = events[-1][1]
+    chunks = events[0][1]["chunks"]
+
+    assert names == ["start"] + ["partial"] * chunks + ["done"]
+    assert chunks >= 3
+    assert events[-2][1]["index"] == 0  # slowest chunk arrives last, but is stitched first
+    assert done["text"] == " ".join(f"part {i}" for i in range(chunks))
+    assert done["chunks"] == chunks
+    assert peak > 1
+    # Pauses were shortened before chunking; times are still on the upload
+    assert done["duration"] == events[0][1]["duration"] == pytest.approx(40.0, abs=0.01)
+    assert max(data["end"] for name, data in events if name == "partial") > 39
+
+
+@pytest.mark.unit
+def test_transcribe_stream_endpoint_sends_partials(client, monkeypatch):
+    """Test the SSE endpoint streams chunk results, then the full transcript"""
+    import json
+    from api.services import voice_service as voice_module
+
+    service = voice_module.get_voice_service()
+    fake = Mock()
+    fake.audio.transcriptions.create = AsyncMock(
+        return_value=Mock(text="Lya enva", language="lg", duration=10.0, segments=None)
+    )
+    monkeypatch.setattr(service.backends["groq"], "client", fake)
+    monkeypatch.setattr(voice_module, "VOICE_CHUNK_SECONDS", 10)
+
+    files = {"audio": ("note.wav", io.BytesIO(_speech_like_wav(40)), "audio/wav")}
+    response = client.post("/voice/transcribe/stream", files=files)
+
+    events = [
+        (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert response.status_code == 200
+    assert events[0][0] == "start"
+    assert [name for name, _ in events[1:-1]] == ["partial"] * events[0][1]["chunks"]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["text"].startswith("Lya enva")
+
+    bad = client.post("/voice/transcribe/stream", files={"audio": ("note.txt", io.BytesIO(b"x"), "text/plain")})
+    assert bad.status_code == 400
+
+
+def _pcm16(pattern, rate=16000):
+    """Little-endian PCM16 for a list of (seconds, is_tone) pieces"""
+    import numpy as np
+
+    pieces = []
+    for seconds, tone in pattern:
+        t = np.arange(int(seconds * rate)) / rate
+        pieces.append(0.3 * np.sin(2 * np.pi * 200 * t) if tone else 0.0005 * np.random.RandomState(2).randn(len(t)))
+    return (np.concatenate(pieces) * 32767).astype("<i2").tobytes()
+
+
+@pytest.mark.unit
+def test_streaming_vad_cuts_utterances_at_pauses():
+    """Test utterances are emitted as soon as a pause follows them, with partials for long ones"""
+    from api.services.voice_stream import StreamingVAD
+
+    pcm = _pcm16([(0.5, False), (1.0, True), (1.0, False), (2.5, True), (0.3, False)])
+    vad = StreamingVAD(end_silence=0.5, partial_seconds=1.5)
+
+    events = []
+    for i in range(0, len(pcm), 640):  # 20 ms packets
+        events.extend(vad.feed(pcm[i:i + 640]))
+    events.append(vad.flush())
+
+    assert [kind for kind, _, _ in events] == ["final", "partial", "final"]
+    start, end = events[0][2]
+    assert 0.1 <= start <= 0.5 and 1.4 <= end <= 1.6
+    assert events[-1][2][0] == pytest.approx(2.2, abs=0.35)
+    assert vad.flush() is None
+
+
+@pytest.mark.unit
+def test_voice_stream_websocket(client, monkeypatch):
+    """Test the WebSocket sends final transcripts and translations per utterance"""
+    from api.services import voice_service as voice_module
+    from api.services.sunbird import sunbird_service
+
+    fake = Mock()
+    fake.audio.transcriptions.create = AsyncMock(
+        return_value=Mock(text="Mwasuze mutya", language="lg", duration=1.0, segments=None)
+    )
+    monkeypatch.setattr(voice_module.get_voice_service().backends["groq"], "client", fake)
+    monkeypatch.setattr(sunbird_service, "translate", AsyncMock(return_value={"translated_text": "Good evening"}))
+
+    pcm = _pcm16([(0.3, False), (1.0, True), (1.0, False), (1.0, True)])
+    with client.websocket_connect("/voice/stream?translate_to=eng") as ws:
+        for i in range(0, len(pcm), 3200):
+            ws.send_bytes(pcm[i:i + 3200])
+        ws.send_text('{"type": "end"}')
+
+        messages = []
+        while not messages or messages[-1]["type"] != "end":
+            messages.append(ws.receive_json())
+
+    finals = [m for m in messages if m["type"] == "final"]
+    translations = [m for m in messages if m["type"] == "translation"]
+    assert [m["index"] for m in finals] == [0, 1]
+    assert finals[0]["text"] == "Mwasuze mutya"
+    assert [m["text"] for m in translations] == ["Good evening", "Good evening"]
+
+
+@pytest.mark.unit
+def test_voice_stream_websocket_chat_turns(client, auth_token, db_session, monkeypatch):
+    """Test chat mode answers each utterance in one conversation through the chat service"""
+    from api.models.chat import MessageDB
+    from api.services import chat_service
+    from api.services import voice_service as voice_module
+    from api.services.llm_service import LLMService
+
+    fake = Mock()
+    fake.audio.transcriptions.create = AsyncMock(
+        return_value=Mock(text="What should grandma eat?", language="en", duration=1.0, segments=None)
+    )
+    monkeypatch.setattr(voice_module.get_voice_service().backends["groq"], "client", fake)
+
+    async def reply(self, messages, **kwargs):
+        return "Try millet porridge."
+
+    monkeypatch.setattr(LLMService, "generate_response", reply)
+    translate = AsyncMock()
+    monkeypatch.setattr(chat_service, "translate_markdown", translate)
+
+    pcm = _pcm16([(0.3, False), (1.0, True), (1.0, False), (1.0, True)])
+    with client.websocket_connect(f"/voice/stream?chat=true&token={auth_token}") as ws:
+        for i in range(0, len(pcm), 3200):
+            ws.send_bytes(pcm[i:i + 3200])
+        ws.send_text('{"type": "end"}')
+
+        messages = []
+        while not messages or messages[-1]["type"] != "end":
+            messages.append(ws.receive_json())
+
+    chats = [m for m in messages if m["type"] == "chat"]
+    assert [m["response"] for m in chats] == ["Try millet porridge."] * 2
+    assert chats[0]["conversation_id"] == chats[1]["conversation_id"]
+    translate.assert_not_awaited()  # English replies are not sent to Sunbird
+
+    saved = db_session.query(MessageDB).filter(MessageDB.conversation_id == chats[0]["conversation_id"]).all()
+    assert [m.role for m in saved] == ["user", "assistant", "user", "assistant"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("query", ["chat=true", "chat=true&token=", "chat=true&token=not-a-jwt"])
+def test_voice_stream_websocket_chat_rejects_bad_tokens(client, test_db, query):
+    """Test chat mode without a valid token sends an error and closes with 1008"""
+    from starlette.websockets import WebSocketDisconnect
+
+    with client.websocket_connect(f"/voice/stream?{query}") as ws:
+        message = ws.receive_json()
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+
+    assert message["type"] == "error"
+    assert closed.value.code == 1008